@@ -0,0 +1,334 @@
+# coding=utf-8
+# """
+# Evaluate blendshape meshes offline (without Maya) from the exported .obj files,
+# including inbetween targets and combination (corrective) targets.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+from __future__ import print_function
+import os.path as osp
+import re
+import json
+import glob
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+
+from lmz_bs_category import check_combined_bs
+
+
+def load_obj_vertices(obj_filename):
+    """
+    Load vertex positions from an .obj file.
+
+    Args:
+        obj_filename: str
+            Path to the .obj file.
+
+    Returns:
+        np.ndarray of shape (num_verts, 3)
+    """
+    with open(obj_filename, 'r') as fp:
+        vert_lines = [line[2:] for line in fp if line.startswith('v ')]
+
+    verts = np.array(' '.join(vert_lines).split(), dtype=np.float64)
+
+    return verts.reshape(-1, 3)
+
+
+def load_blendshape_exports(export_dir, blendshape_keys_list=None, inbetween_dir=None):
+    """
+    Load the neutral, target and inbetween shapes exported by maya_export_blenshape_objs.py
+    and maya_export_blenshape_inbetween_objs.py.
+
+    Args:
+        export_dir: str
+            Directory of 00_neutral.obj and <key>.obj files.
+        blendshape_keys_list: list of str or None
+            List of blendshape keys. If None, use all the <key>.obj files in export_dir,
+            except the <key>_<weight>.obj inbetween files (0 < weight < 1) of a <key>.obj.
+        inbetween_dir: str or None
+            Directory of <key>_<weight>.obj files. If None, use export_dir.
+
+    Returns:
+        tuple of (np.ndarray, OrderedDict, dict)
+            neutral: vertex positions of the neutral shape;
+            target_dict: (k=blendshape key, v=vertex positions of the target shape);
+            inbetween_dict: (k=blendshape key, v=list of (weight, vertex positions)).
+    """
+    neutral = load_obj_vertices(osp.join(export_dir, '00_neutral.obj'))
+    inbetween_pattern = re.compile(r'^(.+)_(\d*\.?\d+)\.obj$')
+
+    if blendshape_keys_list is None:
+        obj_names = set(osp.basename(fn) for fn in glob.glob(osp.join(export_dir, '*.obj')))
+
+        # <key>_<weight>.obj files of a <key>.obj in the same directory are inbetweens, not targets
+        blendshape_keys_list = []
+        for fn in sorted(obj_names):
+            match = inbetween_pattern.match(fn)
+            if match is not None and match.group(1) + '.obj' in obj_names and 0. < float(match.group(2)) < 1.:
+                continue
+            if fn != '00_neutral.obj':
+                blendshape_keys_list.append(osp.splitext(fn)[0])
+
+    if inbetween_dir is None:
+        inbetween_dir = export_dir
+
+    target_dict = OrderedDict()
+    for k in blendshape_keys_list:
+        target_dict[k] = load_obj_vertices(osp.join(export_dir, k + '.obj'))
+
+    inbetween_dict = {}
+    for fn in sorted(glob.glob(osp.join(inbetween_dir, '*.obj'))):
+        match = inbetween_pattern.match(osp.basename(fn))
+        if match is None or match.group(1) not in target_dict:
+            continue
+
+        weight = float(match.group(2))
+        if weight <= 0. or weight >= 1.:
+            continue
+
+        inbetween_dict.setdefault(match.group(1), []).append((weight, load_obj_vertices(fn)))
+
+    for k in inbetween_dict:
+        inbetween_dict[k].sort(key=lambda x: x[0])
+
+    return neutral, target_dict, inbetween_dict
+
+
+def load_keyframe_weights(json_filenames, blendshape_keys_list):
+    """
+    Load weight vectors from the .json files exported by maya_export_keyframe_blendshape_weight_values*.py.
+
+    Args:
+        json_filenames: list of str
+            One .json file (dict of key: weight) per frame.
+        blendshape_keys_list: list of str
+            Column order of the weight matrix. Keys not in a file are set to 0.
+
+    Returns:
+        np.ndarray of shape (num_frames, num_keys)
+    """
+    key_index = dict((k, i) for i, k in enumerate(blendshape_keys_list))
+    weights = np.zeros((len(json_filenames), len(blendshape_keys_list)), dtype=np.float64)
+
+    for frame_idx, fn in enumerate(json_filenames):
+        with open(fn, 'r') as fp:
+            kv_dict = json.load(fp)
+
+        for k, v in kv_dict.items():
+            if k in key_index:
+                weights[frame_idx, key_index[k]] = v
+
+    return weights
+
+
+class BlendshapeEvaluator(object):
+    """
+    Evaluate meshes of a blendshape node for batches of weight vectors, as a sparse matrix product:
+        meshes = neutral + basis_weights(weights) x deltas
+
+    - A regular target contributes weight * delta.
+    - A target with inbetweens is interpolated piecewise-linearly between its shapes at
+      0, inbetween weights and 1 (linearly extrapolated outside [0, 1]).
+    - A combination (corrective) target (see lmz_bs_category.check_combined_bs()) is driven by
+      the product of the weights of its driver targets.
+    """
+
+    def __init__(self, neutral, target_dict, inbetween_dict=None,
+                 apply_combinations=True, delta_threshold=1e-6):
+        """
+        Args:
+            neutral: np.ndarray of shape (num_verts, 3)
+                Vertex positions of the neutral shape.
+            target_dict: OrderedDict
+                (k=blendshape key, v=vertex positions of the target shape at weight 1), see load_blendshape_exports().
+            inbetween_dict: dict or None
+                (k=blendshape key, v=list of (weight, vertex positions)), see load_blendshape_exports().
+            apply_combinations: bool
+                If True, the weights of combination targets are computed from their drivers,
+                and the input weights of them are ignored.
+            delta_threshold: float
+                Vertex displacements with abs value <= delta_threshold are treated as zeros.
+        """
+        if inbetween_dict is None:
+            inbetween_dict = {}
+
+        self.neutral = np.asarray(neutral, dtype=np.float64)
+        self.num_verts = self.neutral.shape[0]
+        self.blendshape_keys_list = list(target_dict.keys())
+        self.key_index = dict((k, i) for i, k in enumerate(self.blendshape_keys_list))
+
+        # Every column of the basis is driven by one input weight (or a product of weights).
+        # regular columns: (key index, column index)
+        # inbetween targets: (key index, knots, first column index)
+        # combination columns: (driver key indices, column index)
+        self.regular_columns = []
+        self.inbetween_targets = []
+        self.combination_columns = []
+
+        delta_list = []
+
+        for k, target in target_dict.items():
+            key_idx = self.key_index[k]
+            delta = np.asarray(target, dtype=np.float64) - self.neutral
+
+            combined_bs, driver_bs_list = check_combined_bs(k)
+            if apply_combinations and combined_bs:
+                driver_indices = [self.key_index.get(d) for d in driver_bs_list]
+                if None in driver_indices:
+                    print('===> drivers of combination target {} not found, treat it as a regular target'.format(k))
+                else:
+                    self.combination_columns.append((driver_indices, len(delta_list)))
+                    delta_list.append(delta)
+                    continue
+
+            if k in inbetween_dict and len(inbetween_dict[k]) > 0:
+                knots = [0.] + [w for w, _ in inbetween_dict[k]] + [1.]
+                self.inbetween_targets.append((key_idx, np.array(knots), len(delta_list)))
+                for _, shape in inbetween_dict[k]:
+                    delta_list.append(np.asarray(shape, dtype=np.float64) - self.neutral)
+                delta_list.append(delta)
+            else:
+                self.regular_columns.append((key_idx, len(delta_list)))
+                delta_list.append(delta)
+
+        self.num_columns = len(delta_list)
+
+        deltas = np.stack(delta_list).reshape(self.num_columns, -1) if delta_list \
+            else np.zeros((0, self.num_verts * 3))
+        deltas[np.abs(deltas) <= delta_threshold] = 0.
+        self.deltas = sp.csr_matrix(deltas)
+
+        # transposed deltas (3V x columns) in the output dtype, cached for evaluate()
+        self._deltas_t_dict = {}
+
+        print('===> {} keys, {} basis columns, {:.2%} non-zero deltas'.format(
+            len(self.blendshape_keys_list), self.num_columns,
+            self.deltas.nnz / float(max(1, np.prod(deltas.shape)))))
+
+    @classmethod
+    def from_export_dir(cls, export_dir, blendshape_keys_list=None, inbetween_dir=None, **kwargs):
+        """
+        Create an evaluator from the exported .obj files, see load_blendshape_exports().
+        """
+        neutral, target_dict, inbetween_dict = load_blendshape_exports(
+            export_dir, blendshape_keys_list, inbetween_dir)
+
+        return cls(neutral, target_dict, inbetween_dict, **kwargs)
+
+    def get_basis_weights(self, weights):
+        """
+        Map weight vectors to the weights of basis columns.
+
+        Args:
+            weights: np.ndarray of shape (num_frames, num_keys)
+
+        Returns:
+            np.ndarray of shape (num_frames, num_columns)
+        """
+        num_frames = weights.shape[0]
+        basis = np.zeros((num_frames, self.num_columns), dtype=np.float64)
+
+        if self.regular_columns:
+            key_indices, columns = zip(*self.regular_columns)
+            basis[:, list(columns)] = weights[:, list(key_indices)]
+
+        rows = np.arange(num_frames)
+        for key_idx, knots, first_column in self.inbetween_targets:
+            w = weights[:, key_idx]
+            num_segments = len(knots) - 1
+
+            # segment s interpolates between shape s (shape 0 is the neutral) and shape s+1,
+            # the first and last segments are extrapolated linearly
+            seg = np.clip(np.searchsorted(knots, w, side='right') - 1, 0, num_segments - 1)
+            alpha = (w - knots[seg]) / (knots[seg + 1] - knots[seg])
+
+            basis[rows, first_column + seg] += alpha
+            has_prev = seg > 0
+            basis[rows[has_prev], first_column + seg[has_prev] - 1] += 1. - alpha[has_prev]
+
+        for driver_indices, column in self.combination_columns:
+            basis[:, column] = np.prod(weights[:, driver_indices], axis=1)
+
+        return basis
+
+    def evaluate(self, weights, dtype=np.float32):
+        """
+        Evaluate meshes for a batch of weight vectors.
+
+        Args:
+            weights: np.ndarray of shape (num_frames, num_keys) or (num_keys, )
+                Columns in the order of self.blendshape_keys_list.
+            dtype: numpy dtype
+                dtype of the output.
+
+        Returns:
+            np.ndarray of shape (num_frames, num_verts, 3) or (num_verts, 3)
+                Not C-contiguous, use np.ascontiguousarray() if needed.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        single = weights.ndim == 1
+        if single:
+            weights = weights[np.newaxis, :]
+
+        basis = self.get_basis_weights(weights)
+
+        dtype = np.dtype(dtype)
+        if dtype not in self._deltas_t_dict:
+            self._deltas_t_dict[dtype] = self.deltas.T.tocsr().astype(dtype)
+
+        # (3V x columns) x (columns x frames) -> (3V x frames), sparse x dense, computed in the output dtype.
+        # The result is returned as a transposed view: reshaping it into C order would copy the
+        # whole take, which costs several times more than the product itself.
+        offsets = self._deltas_t_dict[dtype].dot(basis.T.astype(dtype))
+        offsets += self.neutral.reshape(-1, 1).astype(dtype)
+        meshes = offsets.T.reshape(-1, self.num_verts, 3)
+
+        return meshes[0] if single else meshes
+
+    def iter_evaluate(self, weights, batch_size=256, dtype=np.float32):
+        """
+        Evaluate meshes batch by batch for a long take, see evaluate().
+
+        Yields:
+            np.ndarray of shape (batch_size, num_verts, 3)
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        for start in range(0, weights.shape[0], batch_size):
+            yield self.evaluate(weights[start:start + batch_size], dtype)
+
+
+def compute_vertex_errors(meshes, reference_meshes):
+    """
+    Compute per-frame errors of evaluated meshes against reference meshes (e.g. exported by Maya).
+
+    Args:
+        meshes: np.ndarray of shape (num_frames, num_verts, 3)
+        reference_meshes: np.ndarray of shape (num_frames, num_verts, 3)
+
+    Returns:
+        dict
+            'rmse': np.ndarray of shape (num_frames, ), root mean squared vertex distance;
+            'max': np.ndarray of shape (num_frames, ), max vertex distance.
+    """
+    dists = np.linalg.norm(np.asarray(meshes, dtype=np.float64) - reference_meshes, axis=-1)
+
+    return {
+        'rmse': np.sqrt(np.mean(dists ** 2, axis=-1)),
+        'max': np.max(dists, axis=-1)
+    }
+
+
+if __name__ == '__main__':
+    export_dir = r'D:/zhaoyafei/lmz_head_mesh_blendshapes'
+    keyframe_dir = r'D:/zhaoyafei/maya_exports/keyframe_weights'
+
+    evaluator = BlendshapeEvaluator.from_export_dir(export_dir)
+
+    json_filenames = sorted(glob.glob(osp.join(keyframe_dir, '*.json')))
+    weights = load_keyframe_weights(json_filenames, evaluator.blendshape_keys_list)
+
+    meshes = evaluator.evaluate(weights)
+    print('===> evaluated meshes: ', meshes.shape)
@@ -0,0 +1,390 @@
+# coding=utf-8
+# """
+# Controller-to-blendshape response data: blendshape weights sampled on a dense grid of each
+# rig controller attribute (see export_controller_to_bs_response() in
+# maya_export_controller_to_bs_mapping_dict.py), stored as sparse arrays in an .npz file.
+
+# Arrays in the .npz file (C controllers, B blendshapes, S samples per controller):
+#     header: json string, with controllers, blendshapes, node names and sampling options;
+#     ranges: float32 (C, 2), min/max value of each controller;
+#     baseline: float32 (B, ), weights with all the controllers at 0;
+#     grid: float32 (C, S), sampled controller values (NaN padded), grid_sizes: int32 (C, );
+#     sample_ctrl, sample_idx, sample_bs, sample_value: COO entries (controller, grid index, blendshape,
+#         weight - baseline) of the non-zero responses;
+#     pair_ctrl, pair_bs: int32 (P, ), (controller, blendshape) pairs with non-zero responses;
+#     knot_ptr: int32 (P + 1, ), knot_x, knot_y: float32, piecewise-linear fit of each pair,
+#         knots of pair p are knot_x/knot_y[knot_ptr[p]:knot_ptr[p + 1]].
+
+# The .npz file is written without NumPy (Maya 2019 does not ship it), reading needs NumPy.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import sys
+import json
+import array
+import struct
+import zipfile
+
+try:
+    import numpy as np
+except ImportError:
+    # writing the .npz file in Maya does not need NumPy
+    np = None
+
+
+def _get_npy_bytes(typecode, shape, values):
+    """
+    Serialize an array into .npy format (version 1.0).
+
+    Args:
+        typecode: str
+            'f' (float32), 'i' (int32) or 'U' (unicode string, values is a str and shape is ()).
+        shape: tuple of int
+        values: array.array, list or str
+
+    Returns:
+        bytes
+    """
+    if typecode == 'U':
+        data = values.encode('utf-32-le')
+        descr = '<U{}'.format(max(1, len(values)))
+    else:
+        values = array.array(typecode, values)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        data = values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+        descr = {'f': '<f4', 'i': '<i4'}[typecode]
+
+    shape_str = '({},)'.format(shape[0]) if len(shape) == 1 else '({})'.format(', '.join(str(n) for n in shape))
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(descr, shape_str)
+
+    # magic (6) + version (2) + header length (2) + header, aligned to 64 bytes
+    header_len = len(header) + 1
+    header += ' ' * ((64 - (10 + header_len) % 64) % 64) + '\n'
+
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1') + data
+
+
+def write_npz(npz_filename, arrays):
+    """
+    Write arrays into an .npz file without NumPy.
+
+    Args:
+        npz_filename: str
+            Path to the .npz file.
+        arrays: dict
+            (k=array name, v=(typecode, shape, values)), see _get_npy_bytes().
+
+    Returns:
+        None.
+    """
+    zf = zipfile.ZipFile(npz_filename, 'w', zipfile.ZIP_DEFLATED)
+    for name, (typecode, shape, values) in arrays.items():
+        zf.writestr(name + '.npy', _get_npy_bytes(typecode, shape, values))
+    zf.close()
+
+
+def fit_piecewise_linear(xs, ys, tolerance=1e-3, keep_xs=(0., )):
+    """
+    Fit a piecewise-linear function to samples, with as few knots as possible
+    (Ramer-Douglas-Peucker on the vertical error).
+
+    Args:
+        xs: list of float
+            Sorted sample positions.
+        ys: list of float
+            Sample values.
+        tolerance: float
+            Max abs error of the fit at the samples.
+        keep_xs: tuple of float
+            Sample positions always kept as knots (if sampled), e.g. the rest value 0.
+
+    Returns:
+        list of int
+            Sorted indices of the samples kept as knots.
+    """
+    n = len(xs)
+    if n <= 2:
+        return list(range(n))
+
+    keep = set([0, n - 1])
+    for i, x in enumerate(xs):
+        if x in keep_xs:
+            keep.add(i)
+
+    segments = []
+    sorted_keep = sorted(keep)
+    for i, j in zip(sorted_keep[:-1], sorted_keep[1:]):
+        segments.append((i, j))
+
+    while segments:
+        i, j = segments.pop()
+        if j - i < 2:
+            continue
+
+        max_err = -1.
+        max_k = None
+        for k in range(i + 1, j):
+            alpha = (xs[k] - xs[i]) / float(xs[j] - xs[i])
+            err = abs(ys[k] - (ys[i] + alpha * (ys[j] - ys[i])))
+            if err > max_err:
+                max_err = err
+                max_k = k
+
+        if max_err > tolerance:
+            keep.add(max_k)
+            segments.append((i, max_k))
+            segments.append((max_k, j))
+
+    return sorted(keep)
+
+
+def get_controller_bs_response_arrays(header, ranges, baseline, grids, responses, tolerance=1e-3):
+    """
+    Fit the sampled responses, and get the arrays of the .npz file (without NumPy).
+
+    Args:
+        header: dict
+            Must have 'controllers' and 'blendshapes', saved as a json string.
+        ranges: list of (min, max)
+            Range of each controller.
+        baseline: list of float
+            Weights of all blendshapes with all the controllers at 0.
+        grids: list of list of float
+            Sorted sampled values of each controller.
+        responses: list of list of dict
+            responses[c][s] = {blendshape index: weight - baseline} at grid value grids[c][s],
+            only the non-zero entries.
+        tolerance: float
+            Max abs error of the piecewise-linear fit.
+
+    Returns:
+        tuple of (dict, dict)
+            arrays: (k=array name, v=(typecode, shape, values)), see write_npz();
+            non_linear: (k=controller, v=list of blendshapes with non-linear responses).
+    """
+    num_controllers = len(header['controllers'])
+    max_grid_size = max([len(grid) for grid in grids] + [1])
+
+    grid_values = array.array('f')
+    sample_ctrl, sample_idx, sample_bs, sample_value = (array.array('i'), array.array('i'),
+                                                        array.array('i'), array.array('f'))
+    pair_ctrl, pair_bs, knot_ptr = array.array('i'), array.array('i'), array.array('i', [0])
+    knot_x, knot_y = array.array('f'), array.array('f')
+    non_linear = {}
+
+    for c, (grid, ctrl_responses) in enumerate(zip(grids, responses)):
+        grid_values.extend(list(grid) + [float('nan')] * (max_grid_size - len(grid)))
+
+        driven_bs = set()
+        for s, bs_dict in enumerate(ctrl_responses):
+            for b in sorted(bs_dict.keys()):
+                sample_ctrl.append(c)
+                sample_idx.append(s)
+                sample_bs.append(b)
+                sample_value.append(bs_dict[b])
+                driven_bs.add(b)
+
+        # a linear response (on each side of 0) only needs knots at the ends and at 0
+        linear_xs = set([grid[0], grid[-1], 0.]) if grid else set()
+
+        for b in sorted(driven_bs):
+            ys = [bs_dict.get(b, 0.) for bs_dict in ctrl_responses]
+            knots = fit_piecewise_linear(grid, ys, tolerance)
+
+            pair_ctrl.append(c)
+            pair_bs.append(b)
+            knot_x.extend(grid[k] for k in knots)
+            knot_y.extend(ys[k] for k in knots)
+            knot_ptr.append(len(knot_x))
+
+            if any(grid[k] not in linear_xs for k in knots):
+                non_linear.setdefault(header['controllers'][c], []).append(header['blendshapes'][b])
+
+    arrays = {
+        'header': ('U', (), json.dumps(header)),
+        'ranges': ('f', (num_controllers, 2), [v for r in ranges for v in r]),
+        'baseline': ('f', (len(baseline), ), baseline),
+        'grid': ('f', (num_controllers, max_grid_size), grid_values),
+        'grid_sizes': ('i', (num_controllers, ), [len(grid) for grid in grids]),
+        'sample_ctrl': ('i', (len(sample_ctrl), ), sample_ctrl),
+        'sample_idx': ('i', (len(sample_idx), ), sample_idx),
+        'sample_bs': ('i', (len(sample_bs), ), sample_bs),
+        'sample_value': ('f', (len(sample_value), ), sample_value),
+        'pair_ctrl': ('i', (len(pair_ctrl), ), pair_ctrl),
+        'pair_bs': ('i', (len(pair_bs), ), pair_bs),
+        'knot_ptr': ('i', (len(knot_ptr), ), knot_ptr),
+        'knot_x': ('f', (len(knot_x), ), knot_x),
+        'knot_y': ('f', (len(knot_y), ), knot_y),
+    }
+
+    return arrays, non_linear
+
+
+def save_controller_bs_response(npz_filename, header, ranges, baseline, grids, responses,
+                                tolerance=1e-3):
+    """
+    Fit the sampled responses and save them into an .npz file (without NumPy),
+    see get_controller_bs_response_arrays() for the arguments.
+
+    Returns:
+        dict
+            Report: (k=controller, v=list of blendshapes with non-linear responses).
+    """
+    arrays, non_linear = get_controller_bs_response_arrays(header, ranges, baseline, grids, responses, tolerance)
+    write_npz(npz_filename, arrays)
+
+    return non_linear
+
+
+class ControllerBsResponse(object):
+    """
+    Query API of the controller-to-blendshape response data (needs NumPy and SciPy).
+
+    Responses of the controllers are treated as additive:
+        weights(controller values) = baseline + sum_c response_c(value_c)
+    where response_c is interpolated linearly on the sampled grid of controller c.
+    Cross-coupled controllers (see the report of export_controller_to_bs_response()) break this.
+    """
+
+    def __init__(self, npz_filename):
+        """
+        Args:
+            npz_filename: str or dict
+                Path to the .npz file written by save_controller_bs_response(),
+                or the arrays returned by get_controller_bs_response_arrays().
+        """
+        import scipy.sparse as sp
+
+        if isinstance(npz_filename, dict):
+            loaded = {}
+            for name, (typecode, shape, values) in npz_filename.items():
+                if typecode == 'U':
+                    loaded[name] = np.array(values)
+                else:
+                    loaded[name] = np.array(values, dtype={'f': np.float32, 'i': np.int32}[typecode]).reshape(shape)
+        else:
+            loaded = np.load(npz_filename)
+        self.header = json.loads(str(loaded['header']))
+        self.controllers = self.header['controllers']
+        self.blendshapes = self.header['blendshapes']
+        self.controller_index = dict((k, i) for i, k in enumerate(self.controllers))
+        self.blendshape_index = dict((k, i) for i, k in enumerate(self.blendshapes))
+
+        for name in ('ranges', 'baseline', 'grid', 'grid_sizes', 'sample_ctrl', 'sample_idx', 'sample_bs',
+                     'sample_value', 'pair_ctrl', 'pair_bs', 'knot_ptr', 'knot_x', 'knot_y'):
+            setattr(self, name, loaded[name])
+
+        num_controllers = len(self.controllers)
+        max_grid_size = self.grid.shape[1] if self.grid.ndim == 2 else 0
+
+        # grid point (c, s) is row c * max_grid_size + s of the sparse response matrix (rows x B)
+        self.max_grid_size = max_grid_size
+        rows = self.sample_ctrl.astype(np.int64) * max_grid_size + self.sample_idx
+        self.responses = sp.csr_matrix(
+            (self.sample_value.astype(np.float64), (rows, self.sample_bs)),
+            shape=(num_controllers * max_grid_size, len(self.blendshapes)))
+
+        # (controller x blendshape) pattern of driven pairs
+        self.pairs = sp.csr_matrix(
+            (np.arange(len(self.pair_ctrl)) + 1, (self.pair_ctrl, self.pair_bs)),
+            shape=(num_controllers, len(self.blendshapes)))
+
+    def get_driven_blendshapes(self, controller):
+        """
+        Get the blendshapes driven by a controller.
+        """
+        c = self.controller_index[controller]
+        row = self.pairs.getrow(c)
+
+        return [self.blendshapes[b] for b in row.indices]
+
+    def get_driving_controllers(self, blendshape):
+        """
+        Get the controllers driving a blendshape.
+        """
+        b = self.blendshape_index[blendshape]
+        col = self.pairs.getcol(b).tocoo()
+
+        return [self.controllers[c] for c in col.row]
+
+    def get_response_curve(self, controller, blendshape):
+        """
+        Get the piecewise-linear fit of the response of a blendshape weight to a controller.
+
+        Returns:
+            tuple of (np.ndarray, np.ndarray)
+                Knot positions (controller values) and values (weight - baseline), empty if not driven.
+        """
+        c = self.controller_index[controller]
+        b = self.blendshape_index[blendshape]
+        p = self.pairs[c, b] - 1
+        if p < 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        start, end = self.knot_ptr[p], self.knot_ptr[p + 1]
+        return self.knot_x[start:end], self.knot_y[start:end]
+
+    def get_interpolation_matrix(self, controller_values):
+        """
+        Get the sparse matrix interpolating the sampled grids at controller values.
+
+        Args:
+            controller_values: np.ndarray of shape (num_frames, num_controllers)
+                Values out of the sampled ranges are clamped.
+
+        Returns:
+            scipy.sparse.csr_matrix of shape (num_frames, num_controllers * max_grid_size)
+                Two non-zeros (weights of the neighbour grid points) per frame and controller.
+        """
+        import scipy.sparse as sp
+
+        num_frames, num_controllers = controller_values.shape
+        max_grid_size = self.max_grid_size
+        grid = self.grid.astype(np.float64)
+        grid_sizes = self.grid_sizes.astype(np.int64)
+        ctrl_idx = np.arange(num_controllers)
+
+        first = np.where(grid_sizes > 0, grid[:, 0], 0.)
+        last = np.where(grid_sizes > 0, grid[ctrl_idx, np.maximum(grid_sizes - 1, 0)], 0.)
+        x = np.clip(controller_values, first, last)
+
+        # segment index: number of grid points (but the first) <= x, the NaN padding never compares true
+        seg = np.sum(grid[np.newaxis, :, 1:] <= x[:, :, np.newaxis], axis=2)
+        seg = np.minimum(seg, np.maximum(grid_sizes - 2, 0))
+        next_seg = np.minimum(seg + 1, max_grid_size - 1)
+
+        has_segments = grid_sizes >= 2
+        lower = grid[ctrl_idx, seg]
+        upper = grid[ctrl_idx, next_seg]
+        alpha = np.where(has_segments, (x - lower) / np.where(has_segments, upper - lower, 1.), 0.)
+
+        offsets = ctrl_idx * max_grid_size
+        columns = np.stack([offsets + seg, offsets + next_seg], axis=2)
+        data = np.stack([np.where(grid_sizes > 0, 1. - alpha, 0.), alpha], axis=2)
+
+        indptr = np.arange(0, num_frames * num_controllers * 2 + 1, num_controllers * 2)
+
+        return sp.csr_matrix((data.ravel(), columns.ravel(), indptr),
+                             shape=(num_frames, num_controllers * self.max_grid_size))
+
+    def evaluate(self, controller_values):
+        """
+        Evaluate blendshape weights for a batch of controller vectors.
+
+        Args:
+            controller_values: np.ndarray of shape (num_frames, num_controllers) or (num_controllers, )
+                Columns in the order of self.controllers.
+
+        Returns:
+            np.ndarray of shape (num_frames, num_blendshapes) or (num_blendshapes, )
+        """
+        controller_values = np.asarray(controller_values, dtype=np.float64)
+        single = controller_values.ndim == 1
+        if single:
+            controller_values = controller_values[np.newaxis, :]
+
+        interp = self.get_interpolation_matrix(controller_values)
+        weights = interp.dot(self.responses).toarray() + self.baseline
+
+        return weights[0] if single else weights
@@ -0,0 +1,190 @@
+# coding=utf-8
+# """
+# Named per-frame arrays (e.g. joint matrices of all frames, num_frames x num_joints x 16)
+# saved in one .npz file, or in memory-mappable raw float32 files.
+
+# Formats:
+#     raw: <prefix>.<name>.f32 for every array, float32 (little endian), shape (num_frames, ) + frame shape,
+#          with header <prefix>.json (arrays and their frame shapes, num_frames, other items),
+#          written frame by frame without NumPy (e.g. in Maya 2019);
+#     npz: <prefix>.npz with all the arrays and the header, needs NumPy.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import sys
+import json
+import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    # the raw format does not need NumPy
+    np = None
+
+
+FRAME_ARRAYS_FORMATS = ('raw', 'npz')
+
+
+def _get_frame_size(frame_shape):
+    size = 1
+    for n in frame_shape:
+        size *= n
+
+    return size
+
+
+class FrameArraysWriter(object):
+    """
+    Append frames of named arrays to raw files (frame by frame) or an .npz file (written by close()).
+    """
+
+    def __init__(self, prefix, frame_shapes, header=None, matrix_format='raw'):
+        """
+        Args:
+            prefix: str
+                Path prefix of the files.
+            frame_shapes: OrderedDict
+                (k=array name, v=shape of a frame), e.g. {'world_matrix': (num_joints, 16)}.
+            header: dict or None
+                Other (json serializable) items saved into the header, e.g. joint names.
+            matrix_format: str
+                One of FRAME_ARRAYS_FORMATS.
+        """
+        if matrix_format not in FRAME_ARRAYS_FORMATS:
+            raise ValueError('unknown format: {}, expect one of {}'.format(matrix_format, FRAME_ARRAYS_FORMATS))
+
+        if matrix_format == 'npz' and np is None:
+            raise ImportError('matrix_format=npz requires NumPy, use "raw" instead')
+
+        self.prefix = prefix
+        self.matrix_format = matrix_format
+        self.frame_shapes = OrderedDict((k, tuple(v)) for k, v in frame_shapes.items())
+
+        self.header = dict(header or {})
+        self.header['arrays'] = OrderedDict((k, list(v)) for k, v in self.frame_shapes.items())
+        self.header['num_frames'] = 0
+
+        self.fps = OrderedDict()
+        self.values = OrderedDict()
+        for name in self.frame_shapes:
+            if matrix_format == 'raw':
+                self.fps[name] = open('{}.{}.f32'.format(prefix, name), 'wb')
+            else:
+                self.values[name] = array.array('f')
+
+        if matrix_format == 'raw':
+            self._write_raw_header()
+
+    def _write_raw_header(self):
+        fp = open(self.prefix + '.json', 'w')
+        json.dump(self.header, fp, indent=2)
+        fp.close()
+
+    def append_frame(self, frame_values):
+        """
+        Append a frame.
+
+        Args:
+            frame_values: dict
+                (k=array name, v=flat list of float values of the frame).
+
+        Returns:
+            None.
+        """
+        for name, frame_shape in self.frame_shapes.items():
+            values = array.array('f', frame_values[name])
+            if len(values) != _get_frame_size(frame_shape):
+                raise ValueError('expect {} values of {} per frame, got {}'.format(
+                    _get_frame_size(frame_shape), name, len(values)))
+
+            if self.matrix_format == 'raw':
+                if sys.byteorder != 'little':
+                    values.byteswap()
+                values.tofile(self.fps[name])
+            else:
+                self.values[name].extend(values)
+
+        self.header['num_frames'] += 1
+
+    def close(self):
+        """
+        Write the header, and the .npz file.
+        """
+        if self.matrix_format == 'raw':
+            for fp in self.fps.values():
+                fp.close()
+            self.fps.clear()
+            self._write_raw_header()
+            return
+
+        arrays = {}
+        for name, frame_shape in self.frame_shapes.items():
+            shape = (self.header['num_frames'], ) + frame_shape
+            arrays[name] = np.frombuffer(self.values[name], dtype=np.float32).reshape(shape)
+
+        tmp_filename = self.prefix + '.tmp.npz'
+        np.savez(tmp_filename, header=np.array(json.dumps(self.header)), **arrays)
+
+        npz_filename = self.prefix + '.npz'
+        if hasattr(os, 'replace'):
+            os.replace(tmp_filename, npz_filename)
+        else:
+            if osp.isfile(npz_filename):
+                os.remove(npz_filename)
+            os.rename(tmp_filename, npz_filename)
+
+
+def load_frame_arrays(prefix, mmap_mode='r'):
+    """
+    Load the arrays written by FrameArraysWriter.
+
+    Args:
+        prefix: str
+            Path prefix of the files, <prefix>.npz or <prefix>.json (raw) is loaded.
+        mmap_mode: str or None
+            For the raw format, 'r', 'r+', 'c' as in np.memmap(), or None to read into memory.
+
+    Returns:
+        tuple of (OrderedDict, dict)
+            arrays: (k=array name, v=np.ndarray of shape (num_frames, ) + frame shape, dtype float32);
+            header: see FrameArraysWriter.
+    """
+    if np is None:
+        raise ImportError('load_frame_arrays() requires NumPy')
+
+    if osp.isfile(prefix + '.npz'):
+        loaded = np.load(prefix + '.npz')
+        header = json.loads(str(loaded['header']))
+        arrays = OrderedDict((name, loaded[name]) for name in header['arrays'])
+
+        return arrays, header
+
+    fp = open(prefix + '.json', 'r')
+    header = json.load(fp, object_pairs_hook=OrderedDict)
+    fp.close()
+
+    # the header is updated by close(), an interrupted export keeps its complete frames
+    num_frames = None
+    for name, frame_shape in header['arrays'].items():
+        filename = '{}.{}.f32'.format(prefix, name)
+        frame_size = _get_frame_size(frame_shape)
+        if frame_size > 0:
+            n = os.path.getsize(filename) // (4 * frame_size)
+            num_frames = n if num_frames is None else min(num_frames, n)
+    if num_frames is None:
+        num_frames = header['num_frames']
+    header['num_frames'] = num_frames
+
+    arrays = OrderedDict()
+    for name, frame_shape in header['arrays'].items():
+        filename = '{}.{}.f32'.format(prefix, name)
+        shape = (num_frames, ) + tuple(frame_shape)
+        if mmap_mode is None or num_frames == 0:
+            arrays[name] = np.fromfile(filename, dtype='<f4', count=_get_frame_size(shape)).reshape(shape)
+        else:
+            arrays[name] = np.memmap(filename, dtype='<f4', mode=mmap_mode, shape=shape)
+
+    return arrays, header
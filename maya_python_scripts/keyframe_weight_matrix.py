@@ -0,0 +1,348 @@
+# coding=utf-8
+# """
+# Weight matrix file: blendshape weight values of all frames (num_frames x num_keys) in one file,
+# instead of one .json file per frame.
+
+# Formats:
+#     raw: <prefix>.weights.f32, float32 (little endian) array of shape (num_frames, num_keys),
+#          with header <prefix>.weights.json (keys, start_frame, frame_step, frame_names),
+#          can be memory-mapped, and written without NumPy (e.g. in Maya 2019);
+#     npz: <prefix>.weights.npz, dense float32 'weights' array and the header, needs NumPy;
+#     npz_sparse: <prefix>.weights.npz, CSR matrix (weights with abs value <= threshold are dropped),
+#          readable with scipy.sparse.load_npz() as well, needs NumPy.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import sys
+import json
+import array
+
+try:
+    import numpy as np
+except ImportError:
+    # the raw format does not need NumPy
+    np = None
+
+
+WEIGHT_MATRIX_FORMATS = ('raw', 'npz', 'npz_sparse')
+
+
+def get_weight_matrix_filename(prefix, matrix_format='raw'):
+    """
+    Get the filename of a weight matrix file.
+
+    Args:
+        prefix: str
+            Path prefix of the weight matrix file.
+        matrix_format: str
+            One of WEIGHT_MATRIX_FORMATS.
+
+    Returns:
+        str
+    """
+    if matrix_format == 'raw':
+        return prefix + '.weights.f32'
+    elif matrix_format in ('npz', 'npz_sparse'):
+        return prefix + '.weights.npz'
+    else:
+        raise ValueError('unknown weight matrix format: {}, expect one of {}'.format(
+            matrix_format, WEIGHT_MATRIX_FORMATS))
+
+
+def get_raw_header_filename(raw_filename):
+    return osp.splitext(raw_filename)[0] + '.json'
+
+
+def _to_little_endian_bytes(values):
+    values = array.array('f', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+
+    return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+
+class WeightMatrixWriter(object):
+    """
+    Append weight vectors of frames to a weight matrix file.
+    The raw format is written frame by frame, the npz formats are written by close().
+    """
+
+    def __init__(self, prefix, blendshape_keys_list, start_frame=0, frame_step=1,
+                 matrix_format='raw', threshold=1e-4):
+        """
+        Args:
+            prefix: str
+                Path prefix of the weight matrix file, see get_weight_matrix_filename().
+            blendshape_keys_list: list of str
+                Column names of the weight matrix.
+            start_frame: int or float
+                Frame number of the first frame.
+            frame_step: int or float
+                Frame number step between two frames.
+            matrix_format: str
+                One of WEIGHT_MATRIX_FORMATS.
+            threshold: float
+                For 'npz_sparse', weights with abs value <= threshold are not stored.
+        """
+        if matrix_format != 'raw' and np is None:
+            raise ImportError('matrix_format={} requires NumPy, use "raw" instead'.format(matrix_format))
+
+        self.filename = get_weight_matrix_filename(prefix, matrix_format)
+        self.matrix_format = matrix_format
+        self.threshold = threshold
+        self.header = {
+            'keys': list(blendshape_keys_list),
+            'num_frames': 0,
+            'start_frame': start_frame,
+            'frame_step': frame_step,
+            'frame_names': []
+        }
+
+        self.fp = None
+        if matrix_format == 'raw':
+            self.fp = open(self.filename, 'wb')
+            self._write_raw_header()
+        elif matrix_format == 'npz':
+            self.values = array.array('f')
+        else:
+            self.data = array.array('f')
+            self.indices = array.array('i')
+            self.indptr = array.array('i', [0])
+
+    @property
+    def num_keys(self):
+        return len(self.header['keys'])
+
+    def _write_raw_header(self):
+        fp = open(get_raw_header_filename(self.filename), 'w')
+        json.dump(self.header, fp, indent=2)
+        fp.close()
+
+    def append_frame(self, weight_values, frame_name=None):
+        """
+        Append a frame.
+
+        Args:
+            weight_values: list of float
+                Weight values of all the keys, in the order of blendshape_keys_list.
+            frame_name: str or None
+                Name of the frame, saved into the header if not None.
+
+        Returns:
+            None.
+        """
+        if len(weight_values) != self.num_keys:
+            raise ValueError('expect {} weight values per frame, got {}'.format(
+                self.num_keys, len(weight_values)))
+
+        if self.matrix_format == 'raw':
+            self.fp.write(_to_little_endian_bytes(weight_values))
+            # complete rows are readable while exporting
+            self.fp.flush()
+        elif self.matrix_format == 'npz':
+            self.values.extend(weight_values)
+        else:
+            for key_idx, v in enumerate(weight_values):
+                if abs(float(v)) > self.threshold:
+                    self.indices.append(key_idx)
+                    self.data.append(v)
+            self.indptr.append(len(self.indices))
+
+        self.header['num_frames'] += 1
+        if frame_name is not None:
+            self.header['frame_names'].append(frame_name)
+
+    def close(self):
+        """
+        Write the header, and the matrix of the npz formats.
+        """
+        if self.matrix_format == 'raw':
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+            self._write_raw_header()
+        else:
+            save_weight_matrix_npz(self.filename, self.header, self._get_matrix_arrays())
+
+    def _get_matrix_arrays(self):
+        shape = np.array([self.header['num_frames'], self.num_keys], dtype=np.int64)
+        if self.matrix_format == 'npz':
+            return {'weights': np.frombuffer(self.values, dtype=np.float32).reshape(shape)}
+        else:
+            return {
+                'format': np.array(b'csr'),
+                'shape': shape,
+                'data': np.frombuffer(self.data, dtype=np.float32),
+                'indices': np.frombuffer(self.indices, dtype=np.int32),
+                'indptr': np.frombuffer(self.indptr, dtype=np.int32)
+            }
+
+
+def save_weight_matrix_npz(npz_filename, header, matrix_arrays):
+    """
+    Save a weight matrix into an .npz file, with the header as a json string.
+
+    Args:
+        npz_filename: str
+            Path to the .npz file.
+        header: dict
+            Keys, start_frame, frame_step, frame_names, ...
+        matrix_arrays: dict
+            {'weights': dense array}, or arrays of a CSR matrix as in scipy.sparse.save_npz().
+
+    Returns:
+        None.
+    """
+    # write to a temporary file first, np.savez() appends '.npz' to names without it
+    tmp_filename = npz_filename[:-len('.npz')] + '.tmp.npz'
+    np.savez(tmp_filename, header=np.array(json.dumps(header)), **matrix_arrays)
+
+    if hasattr(os, 'replace'):
+        os.replace(tmp_filename, npz_filename)
+    else:
+        if osp.isfile(npz_filename):
+            os.remove(npz_filename)
+        os.rename(tmp_filename, npz_filename)
+
+
+def load_weight_matrix(filename, mmap_mode='r'):
+    """
+    Load a weight matrix file.
+
+    Args:
+        filename: str
+            Path to the .weights.f32 or .weights.npz file.
+        mmap_mode: str or None
+            For the raw format, 'r', 'r+', 'c' as in np.memmap(), or None to read into memory.
+
+    Returns:
+        tuple of (matrix, dict)
+            matrix: np.ndarray of shape (num_frames, num_keys), dtype float32,
+                or scipy.sparse.csr_matrix for 'npz_sparse';
+            header: with keys: keys, num_frames, start_frame, frame_step, frame_names.
+    """
+    if np is None:
+        raise ImportError('load_weight_matrix() requires NumPy')
+
+    if filename.endswith('.npz'):
+        loaded = np.load(filename)
+        header = json.loads(str(loaded['header']))
+        shape = tuple(loaded['shape']) if 'shape' in loaded else loaded['weights'].shape
+
+        if 'weights' in loaded:
+            matrix = loaded['weights']
+        else:
+            import scipy.sparse as sp
+            matrix = sp.csr_matrix((loaded['data'], loaded['indices'], loaded['indptr']), shape=shape)
+
+        return matrix, header
+
+    fp = open(get_raw_header_filename(filename), 'r')
+    header = json.load(fp)
+    fp.close()
+
+    num_keys = len(header['keys'])
+    # the header is updated by close(), an interrupted export keeps its complete rows
+    header['num_frames'] = os.path.getsize(filename) // (4 * num_keys) if num_keys > 0 else 0
+    header['frame_names'] = header['frame_names'][:header['num_frames']]
+    shape = (header['num_frames'], num_keys)
+
+    if mmap_mode is None or header['num_frames'] == 0:
+        matrix = np.fromfile(filename, dtype='<f4', count=shape[0] * shape[1]).reshape(shape)
+    else:
+        matrix = np.memmap(filename, dtype='<f4', mode=mmap_mode, shape=shape)
+
+    return matrix, header
+
+
+def merge_weight_matrices(filename_list, save_filename):
+    """
+    Concatenate weight matrix files of the same format and keys (e.g. written by shards
+    of a frame range) into one file, in the order of the input list.
+
+    Args:
+        filename_list: list of str
+            Paths to the weight matrix files (.weights.f32 or .weights.npz), in frame order.
+        save_filename: str
+            Path to the merged file.
+
+    Returns:
+        dict
+            Header of the merged file.
+    """
+    if not filename_list:
+        raise ValueError('no weight matrix files to merge')
+
+    if filename_list[0].endswith('.npz'):
+        import scipy.sparse as sp
+
+        matrix_list = []
+        header = None
+        for fn in filename_list:
+            matrix, shard_header = load_weight_matrix(fn)
+            if header is None:
+                header = shard_header
+            elif shard_header['keys'] != header['keys']:
+                raise ValueError('{} has different keys from {}'.format(fn, filename_list[0]))
+            else:
+                header['num_frames'] += shard_header['num_frames']
+                header['frame_names'].extend(shard_header['frame_names'])
+            matrix_list.append(matrix)
+
+        if sp.issparse(matrix_list[0]):
+            matrix = sp.vstack(matrix_list, format='csr')
+            matrix_arrays = {
+                'format': np.array(b'csr'),
+                'shape': np.array(matrix.shape, dtype=np.int64),
+                'data': matrix.data.astype(np.float32),
+                'indices': matrix.indices.astype(np.int32),
+                'indptr': matrix.indptr.astype(np.int32)
+            }
+        else:
+            matrix_arrays = {'weights': np.concatenate(matrix_list, axis=0).astype(np.float32)}
+
+        save_weight_matrix_npz(save_filename, header, matrix_arrays)
+
+        return header
+
+    # raw: concatenate bytes of complete rows, without NumPy
+    header = None
+    tmp_filename = save_filename + '.tmp'
+    fp = open(tmp_filename, 'wb')
+    for fn in filename_list:
+        header_fp = open(get_raw_header_filename(fn), 'r')
+        shard_header = json.load(header_fp)
+        header_fp.close()
+
+        row_nbytes = 4 * len(shard_header['keys'])
+        num_frames = os.path.getsize(fn) // row_nbytes if row_nbytes > 0 else 0
+
+        if header is None:
+            header = dict(shard_header, num_frames=0, frame_names=[])
+        elif shard_header['keys'] != header['keys']:
+            fp.close()
+            os.remove(tmp_filename)
+            raise ValueError('{} has different keys from {}'.format(fn, filename_list[0]))
+
+        src_fp = open(fn, 'rb')
+        fp.write(src_fp.read(num_frames * row_nbytes))
+        src_fp.close()
+
+        header['num_frames'] += num_frames
+        header['frame_names'].extend(shard_header['frame_names'][:num_frames])
+    fp.close()
+
+    if hasattr(os, 'replace'):
+        os.replace(tmp_filename, save_filename)
+    else:
+        if osp.isfile(save_filename):
+            os.remove(save_filename)
+        os.rename(tmp_filename, save_filename)
+
+    header_fp = open(get_raw_header_filename(save_filename), 'w')
+    json.dump(header, header_fp, indent=2)
+    header_fp.close()
+
+    return header
@@ -0,0 +1,424 @@
+# coding=utf-8
+# """
+# Sample animated attribute values for a whole frame range without scrubbing the timeline
+# (cmds.currentTime() evaluates and redraws the whole scene for every frame).
+
+# Each attribute (plug) is sampled in the cheapest way that gives the same values:
+#     static: an input not driven by any connection, read once;
+#     curve: driven directly by a time-input animCurve, evaluated with MFnAnimCurve.evaluate();
+#     context: driven by anything else (expressions, constraints, driven keys, anim layers, ...),
+#              read with MPlug in a DG context at each frame, one context for all of them (the timeline is not
+#              moved), or with getAttr -time for the attribute types without a reader (see get_plug_reader());
+#     scrub: in the history of a simulation node, which needs frames to be evaluated in order,
+#            read after cmds.currentTime() like before.
+# In 'auto' mode, too many context attributes are scrubbed instead (one evaluation of the scene per frame for all
+# of them, see AttrSampler()).
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+from pprint import pprint
+
+
+SAMPLING_MODES = ('auto', 'context', 'scrub')
+
+# in 'auto' mode, the context attributes are scrubbed if there are more of them
+CONTEXT_SCRUB_THRESHOLD = 200
+
+# nodes whose outputs depend on the previous frames
+SIMULATION_NODE_TYPES = set([
+    'nucleus', 'nCloth', 'nParticle', 'nRigid', 'hairSystem',
+    'particle', 'rigidSolver', 'rigidBody', 'fluidShape'
+])
+
+
+def get_plug(plug_name):
+    """
+    Get the MPlug of an attribute.
+
+    Args:
+        plug_name: str
+            Name of the attribute, e.g. 'pSphere1.translateX' or 'blendShape1.jawOpen'.
+
+    Returns:
+        maya.api.OpenMaya.MPlug
+    """
+    sel_list = om.MSelectionList()
+    sel_list.add(plug_name)
+
+    return sel_list.getPlug(0)
+
+
+def is_plug_driven(plug):
+    """
+    Check whether a plug, or its compound parent/array, is the destination of a connection.
+    """
+    while True:
+        if plug.isDestination:
+            return True
+
+        if plug.isChild:
+            plug = plug.parent()
+        elif plug.isElement:
+            plug = plug.array()
+        else:
+            return False
+
+
+def has_driven_children(plug):
+    """
+    Check whether any child of a compound plug, or any element of an array plug, is driven.
+    """
+    if plug.isArray:
+        return plug.numConnectedElements() > 0
+
+    if plug.isCompound:
+        for i in range(plug.numChildren()):
+            child = plug.child(i)
+            if child.isDestination or has_driven_children(child):
+                return True
+
+    return False
+
+
+def get_driving_anim_curve(plug):
+    """
+    Get the function set of the animCurve driving a plug directly, if any.
+    Only curves with time input (animCurveTA/TL/TU) whose input is not connected
+    (i.e. not driven keys, not time-warped) are returned.
+
+    Args:
+        plug: maya.api.OpenMaya.MPlug
+
+    Returns:
+        maya.api.OpenMayaAnim.MFnAnimCurve or None
+    """
+    source = plug.source()
+    if source.isNull or not source.node().hasFn(om.MFn.kAnimCurve):
+        return None
+
+    curve_fn = oma.MFnAnimCurve(source.node())
+    if curve_fn.animCurveType not in (oma.MFnAnimCurve.kAnimCurveTA,
+                                      oma.MFnAnimCurve.kAnimCurveTL,
+                                      oma.MFnAnimCurve.kAnimCurveTU):
+        return None
+
+    if curve_fn.findPlug('input', False).isDestination:
+        return None
+
+    return curve_fn
+
+
+def get_curve_value_converter(curve_fn):
+    """
+    Get the function converting values evaluated by MFnAnimCurve (internal units: radians, cm)
+    into the UI units returned by cmds.getAttr().
+    """
+    curve_type = curve_fn.animCurveType
+
+    if curve_type == oma.MFnAnimCurve.kAnimCurveTA:
+        ui_unit = om.MAngle.uiUnit()
+        return lambda v: om.MAngle(v).asUnits(ui_unit)
+    elif curve_type == oma.MFnAnimCurve.kAnimCurveTL:
+        ui_unit = om.MDistance.uiUnit()
+        return lambda v: om.MDistance(v).asUnits(ui_unit)
+    else:
+        return lambda v: v
+
+
+def has_simulation_in_history(node_name):
+    """
+    Check whether there is any simulation node in the history of a node.
+    """
+    history = cmds.listHistory(node_name) or []
+    for node in history:
+        if cmds.nodeType(node) in SIMULATION_NODE_TYPES:
+            return True
+
+    return False
+
+
+def get_scalar_plug_reader(attr):
+    """
+    Get the reader of a numeric, unit (angle/distance) or enum attribute, see get_plug_reader().
+    """
+    if attr.hasFn(om.MFn.kUnitAttribute):
+        unit_type = om.MFnUnitAttribute(attr).unitType()
+        if unit_type == om.MFnUnitAttribute.kAngle:
+            angle_unit = om.MAngle.uiUnit()
+            return lambda plug, args: om.MAngle(plug.asDouble(*args)).asUnits(angle_unit)
+        elif unit_type == om.MFnUnitAttribute.kDistance:
+            distance_unit = om.MDistance.uiUnit()
+            return lambda plug, args: om.MDistance(plug.asDouble(*args)).asUnits(distance_unit)
+        return None
+
+    if attr.hasFn(om.MFn.kEnumAttribute):
+        return lambda plug, args: plug.asInt(*args)
+
+    if attr.hasFn(om.MFn.kNumericAttribute):
+        numeric_type = om.MFnNumericAttribute(attr).numericType()
+        if numeric_type == om.MFnNumericData.kBoolean:
+            return lambda plug, args: plug.asBool(*args)
+        elif numeric_type in (om.MFnNumericData.kByte, om.MFnNumericData.kChar, om.MFnNumericData.kShort,
+                              om.MFnNumericData.kInt):
+            return lambda plug, args: plug.asInt(*args)
+        elif numeric_type in (om.MFnNumericData.kFloat, om.MFnNumericData.kDouble):
+            return lambda plug, args: plug.asDouble(*args)
+
+    return None
+
+
+def read_matrix_plug(plug, args):
+    """
+    Read a matrix plug into an MMatrix, see get_plug_reader().
+    """
+    return om.MFnMatrixData(plug.asMObject(*args)).matrix()
+
+
+def get_plug_reader(plug):
+    """
+    Get the function reading a plug in a DG context, see read_plugs_at_frame().
+
+    Args:
+        plug: maya.api.OpenMaya.MPlug
+            Plug to read.
+
+    Returns:
+        function or None
+            reader(plug, args) returns the value like cmds.getAttr() (UI units, compounds as lists,
+            matrices as lists of 16 values), args are passed to the MPlug getters (the context before Maya 2018).
+            None for the attribute types read with getAttr -time.
+    """
+    if plug.isArray:
+        return None
+
+    attr = plug.attribute()
+    if plug.isCompound:
+        child_readers = []
+        for i in range(plug.numChildren()):
+            child = plug.child(i)
+            child_reader = None if child.isCompound or child.isArray else get_scalar_plug_reader(child.attribute())
+            if child_reader is None:
+                return None
+            child_readers.append(child_reader)
+
+        return lambda p, args: [reader(p.child(i), args) for i, reader in enumerate(child_readers)]
+
+    is_matrix = attr.hasFn(om.MFn.kMatrixAttribute) or (
+        attr.hasFn(om.MFn.kTypedAttribute) and om.MFnTypedAttribute(attr).attrType() == om.MFnData.kMatrix)
+    if is_matrix:
+        def read_matrix_values(p, args):
+            matrix = read_matrix_plug(p, args)
+            return [matrix.getElement(row, col) for row in range(4) for col in range(4)]
+        return read_matrix_values
+
+    return get_scalar_plug_reader(attr)
+
+
+def read_plugs_at_frame(plugs, readers, frame):
+    """
+    Read plugs at a frame in one DG context, without moving the timeline.
+
+    Args:
+        plugs: list of maya.api.OpenMaya.MPlug
+            Plugs to read.
+        readers: list of function
+            Reader of each plug, see get_plug_reader().
+        frame: int or float
+            Frame number.
+
+    Returns:
+        list
+            Value of each plug.
+    """
+    context = om.MDGContext(om.MTime(frame, om.MTime.uiUnit()))
+
+    if hasattr(context, 'makeCurrent'):
+        # Maya 2018+: the plug getters read in the current context
+        previous = context.makeCurrent()
+        try:
+            return [reader(plug, ()) for plug, reader in zip(plugs, readers)]
+        finally:
+            previous.makeCurrent()
+
+    return [reader(plug, (context, )) for plug, reader in zip(plugs, readers)]
+
+
+def unwrap_attr_value(value):
+    """
+    cmds.getAttr() returns [(x, y, z)] for compound attributes, unwrap it into [x, y, z].
+    """
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], tuple):
+        return list(value[0])
+
+    return value
+
+
+class AttrSampler(object):
+    """
+    Sample a list of attributes for a frame range, see the module docstring for the sampling methods.
+    """
+
+    def __init__(self, plug_names, mode='auto', context_scrub_threshold=CONTEXT_SCRUB_THRESHOLD):
+        """
+        Args:
+            plug_names: list of str
+                Attributes to sample, e.g. ['pSphere1.translateX', 'blendShape1.jawOpen'].
+                Compound/matrix attributes (e.g. 'joint1.worldMatrix[0]') are sampled as lists.
+            mode: str
+                'auto': static/curve/context/scrub for each attribute;
+                'context': never scrub the timeline;
+                'scrub': scrub the timeline for all attributes (the old behavior).
+            context_scrub_threshold: int or None
+                In 'auto' mode, if more attributes than this need context evaluation, they are scrubbed instead:
+                every DG context evaluates their shared upstream again, a scrubbed frame evaluates it once.
+                None to never fall back.
+        """
+        if mode not in SAMPLING_MODES:
+            raise ValueError('unknown sampling mode: {}, expect one of {}'.format(mode, SAMPLING_MODES))
+
+        self.plug_names = list(plug_names)
+        self.methods = []
+        self.curve_fns = {}
+        # (k=index of a context attribute, v=(plug, reader)), the ones without a reader use getAttr -time
+        self.context_readers = {}
+
+        simulation_cache = {}
+
+        for idx, plug_name in enumerate(self.plug_names):
+            if mode == 'scrub':
+                self.methods.append('scrub')
+                continue
+
+            plug = get_plug(plug_name)
+
+            # outputs (e.g. worldMatrix) are computed from other attributes, they are never static
+            is_output = not om.MFnAttribute(plug.attribute()).writable
+            if not is_output and not is_plug_driven(plug) and not has_driven_children(plug):
+                self.methods.append('static')
+                continue
+
+            node_name = plug_name.split('.')[0]
+            if mode == 'auto':
+                if node_name not in simulation_cache:
+                    simulation_cache[node_name] = has_simulation_in_history(node_name)
+                if simulation_cache[node_name]:
+                    self.methods.append('scrub')
+                    continue
+
+            curve_fn = None
+            if not plug.isCompound and not plug.isArray:
+                curve_fn = get_driving_anim_curve(plug)
+
+            if curve_fn is not None:
+                self.curve_fns[idx] = (curve_fn, get_curve_value_converter(curve_fn))
+                self.methods.append('curve')
+            else:
+                reader = get_plug_reader(plug)
+                if reader is not None:
+                    self.context_readers[idx] = (plug, reader)
+                self.methods.append('context')
+
+        num_context = self.methods.count('context')
+        if mode == 'auto' and context_scrub_threshold is not None and num_context > context_scrub_threshold:
+            pprint('===> {} attributes need context evaluation (> {}), scrub the timeline for them'.format(
+                num_context, context_scrub_threshold))
+            self.methods = ['scrub' if m == 'context' else m for m in self.methods]
+            self.context_readers = {}
+
+        counts = dict((m, self.methods.count(m)) for m in set(self.methods))
+        pprint('===> sampling {} attributes: {}'.format(len(self.plug_names), counts))
+
+    def sample(self, start_frame, end_frame, frame_step=1):
+        """
+        Sample all the attributes for a frame range.
+
+        Args:
+            start_frame: int or float
+                Frame Number of the start frame;
+            end_frame: int or float
+                Frame Number of the end frame (included);
+            frame_step: int or float
+                Frame number step.
+
+        Returns:
+            tuple of (list of frame numbers, list of rows)
+                Each row holds the values of all the attributes at a frame, in the order of plug_names.
+        """
+        frames = []
+        frame = start_frame
+        while frame <= end_frame + 1e-6:
+            frames.append(frame)
+            frame += frame_step
+
+        time_unit = om.MTime.uiUnit()
+        times = [om.MTime(f, time_unit) for f in frames]
+        columns = []
+        scrub_indices = []
+        reader_indices = []
+
+        for idx, (plug_name, method) in enumerate(zip(self.plug_names, self.methods)):
+            if method == 'static':
+                value = unwrap_attr_value(cmds.getAttr(plug_name))
+                columns.append([value] * len(frames))
+            elif method == 'curve':
+                curve_fn, convert = self.curve_fns[idx]
+                columns.append([convert(curve_fn.evaluate(t)) for t in times])
+            elif method == 'context' and idx in self.context_readers:
+                columns.append([None] * len(frames))
+                reader_indices.append(idx)
+            elif method == 'context':
+                columns.append([unwrap_attr_value(cmds.getAttr(plug_name, time=f)) for f in frames])
+            else:
+                columns.append([None] * len(frames))
+                scrub_indices.append(idx)
+
+        if reader_indices:
+            plugs = [self.context_readers[idx][0] for idx in reader_indices]
+            readers = [self.context_readers[idx][1] for idx in reader_indices]
+            for frame_idx, f in enumerate(frames):
+                values = read_plugs_at_frame(plugs, readers, f)
+                for idx, value in zip(reader_indices, values):
+                    columns[idx][frame_idx] = value
+
+        if scrub_indices:
+            curr_time = cmds.currentTime(query=True)
+            for frame_idx, f in enumerate(frames):
+                cmds.currentTime(f)
+                for idx in scrub_indices:
+                    columns[idx][frame_idx] = unwrap_attr_value(cmds.getAttr(self.plug_names[idx]))
+            cmds.currentTime(curr_time)
+
+        rows = [list(row) for row in zip(*columns)] if columns else [[] for _ in frames]
+
+        return frames, rows
+
+
+def read_plug_matrices(plugs, frame):
+    """
+    Read matrix plugs (e.g. matrix, worldMatrix[0]) at a frame in a DG context,
+    without moving the timeline.
+
+    Args:
+        plugs: list of maya.api.OpenMaya.MPlug
+            Matrix plugs, see get_plug().
+        frame: int or float
+            Frame number.
+
+    Returns:
+        list of maya.api.OpenMaya.MMatrix
+    """
+    return read_plugs_at_frame(plugs, [read_matrix_plug] * len(plugs), frame)
+
+
+def sample_attrs(plug_names, start_frame, end_frame, frame_step=1, mode='auto',
+                 context_scrub_threshold=CONTEXT_SCRUB_THRESHOLD):
+    """
+    Sample a list of attributes for a frame range, see AttrSampler.
+
+    Returns:
+        tuple of (list of frame numbers, list of rows)
+    """
+    return AttrSampler(plug_names, mode, context_scrub_threshold).sample(start_frame, end_frame, frame_step)
@@ -9,6 +9,9 @@ import os.path as osp
 import json
 import maya.cmds as cmds
 import maya.mel as mel
+from maya_scene_reset import get_scene_state, reset_scene
+from maya_keyframe_range import get_keyframe_range
+from stage_profiler import StageProfiler, summarize_profile, print_profile_report
 from pprint import pprint
 
 
@@ -79,7 +82,8 @@ def load_animation_from_fbx(fbx_path):
             Path to .fbx file.
 
     Returns: 
-        No returns.
+        name_space: str
+            Namespace of the imported nodes.
     """
     base_name = osp.splitext(osp.basename(fbx_path))[0]
     name_space = base_name.replace(' ', '_')
@@ -92,6 +96,8 @@ def load_animation_from_fbx(fbx_path):
 
     cmds.currentTime(0)
 
+    return name_space
+
 
 def export_animation_into_fbx(
     root_node_name,
@@ -217,30 +223,53 @@ if __name__ == '__main__':
 
         fp.close()
 
+    # reset to the clean rig after every clip: 'delete' the imported nodes, or 'reopen' the scene
+    reset_mode = 'delete'
+    scene_state = get_scene_state()
+
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    # wall/CPU time, Maya command counts and memory of every stage of every clip
+    profile_filename = osp.join(save_dir, 'clip_profile.jsonl')
+    profiler = StageProfiler(profile_filename)
+    profiler.instrument(__name__, 'maya_scene_reset', 'maya_keyframe_range')
+
     for input_fbx in fbx_file_list:
         base_name = osp.splitext(osp.basename(input_fbx))[0]
         save_filename = base_name.replace(' ', '_') + '.fbx'
 
-        start_time = 0
-        # end_time = 240
+        profiler.start_clip(input_fbx)
+
+        with profiler.stage('load'):
+            name_space = load_animation_from_fbx(input_fbx)
 
-        load_animation_from_fbx(input_fbx)
+        with profiler.stage('keyframe_range'):
+            keyframe_range = get_keyframe_range(name_space, keyframe_node_name)
 
-        keyframe_count = get_keyframe_count_for_node(
-            keyframe_node_name,
-            trans_attr=True,
-            rotate_attr=False
-        )
-        end_time = keyframe_count - 1
+        if keyframe_range is None:
+            pprint('---> skip clip without keyframes: {}'.format(input_fbx))
+            with profiler.stage('reset'):
+                reset_scene(scene_state, name_space, reset_mode)
+            profiler.end_clip(status='skipped')
+            continue
+        start_time, end_time, _ = keyframe_range
 
-        fbx_path = export_animation_into_fbx(
-            export_node_name,
-            save_dir,
-            save_filename,
-            start_time,
-            end_time
-        )
+        with profiler.stage('export_fbx'):
+            fbx_path = export_animation_into_fbx(
+                export_node_name,
+                save_dir,
+                save_filename,
+                start_time,
+                end_time
+            )
 
         print('='*32)
         print('===> fbx saved into: ', fbx_path)
         print('='*32)
+
+        with profiler.stage('reset'):
+            reset_stats = reset_scene(scene_state, name_space, reset_mode)
+        profiler.end_clip(status='done', deleted_nodes=reset_stats.get('deleted_nodes'), num_nodes=len(cmds.ls()))
+
+    print_profile_report(summarize_profile([profile_filename]))
@@ -0,0 +1,558 @@
+# coding=utf-8
+# """
+# Convert a list of animation clips (.fbx, e.g. Mixamo clips) with the target rig scene, in a pool of
+# long-lived mayapy workers: every worker opens the rig scene once, then processes the clips dispatched to it.
+
+# Launcher (plain python, outside Maya):
+#     python maya_batch_worker_pool.py rig_scene.mb fbx_list.txt --save-dir ./maya_exports --num-workers 8
+# Worker (started by the launcher):
+#     mayapy maya_batch_worker_pool.py rig_scene.mb --worker --reset-mode delete --profile-log <jsonl>
+
+# The launcher writes one clip job (json) per line to the stdin of a worker,
+# the worker answers with one line '@@result <json>' on its stdout (other output goes to worker_<i>.log).
+# The rig scene is reset between clips (see maya_scene_reset.py).
+# Every attempt is appended to the manifest {save_dir}/batch_manifest.jsonl: clip, status (done/failed),
+# outputs, error, seconds, timings (seconds per stage), num_nodes (after the reset), worker, attempt.
+# Every worker also writes the stage profile (wall/CPU time, Maya command counts, memory) of its clips into
+# clip_profile.worker_<i>.jsonl, summarized into {save_dir}/profile_report.json at the end of the run.
+# Clips already done in the manifest are skipped, so an interrupted run is resumed by running the same command again.
+# A worker which crashes (or exceeds clip_timeout) is restarted, its clip is retried up to max_retries times.
+# A worker which can not start (exits, or is not ready within startup_timeout) is restarted with a backoff, up to
+# max_startup_failures times in a row; when no worker can start, the pending clips are recorded as failed and the run ends.
+
+# Playblast needs a model panel (viewport), which mayapy (maya.standalone) does not have:
+# with --video-encoder, the videos are rendered offscreen by maya_chunked_playblast.py instead.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+from __future__ import print_function
+import os
+import os.path as osp
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+import subprocess
+from pprint import pprint
+from stage_profiler import summarize_profile, print_profile_report, save_profile_report
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+RESULT_PREFIX = '@@result '
+READY_PREFIX = '@@ready '
+
+
+def read_clip_list(clip_list_filename):
+    """
+    Read the clip list file, one path per line (empty lines and lines starting with '#' are skipped).
+
+    Returns:
+        list of str
+    """
+    clips = []
+    fp = open(clip_list_filename, 'r')
+    for line in fp:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            clips.append(line)
+    fp.close()
+
+    return clips
+
+
+def get_clip_save_filename(clip):
+    base_name = osp.splitext(osp.basename(clip))[0]
+
+    return base_name.replace(' ', '_') + '.fbx'
+
+
+def read_manifest(manifest_filename):
+    """
+    Read the manifest of previous runs.
+
+    Returns:
+        dict
+            (k=clip, v=last record of the clip).
+    """
+    records = {}
+    if not osp.isfile(manifest_filename):
+        return records
+
+    fp = open(manifest_filename, 'r')
+    for line in fp:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # the last line of an interrupted run may be incomplete
+            continue
+        records[record['clip']] = record
+    fp.close()
+
+    return records
+
+
+def append_manifest(fp, record):
+    fp.write(json.dumps(record, sort_keys=True) + '\n')
+    fp.flush()
+    os.fsync(fp.fileno())
+
+
+def process_clip(job, clip_state, profiler):
+    """
+    Convert a clip in the worker: import the animation, detect its keyframe range and export the .fbx file.
+
+    Args:
+        job: dict
+            'clip_path': absolute path to the .fbx clip; 'save_dir'; 'keyframe_node_name'; 'export_node_name';
+            'video_encoder': None, or encoder of the video, see maya_chunked_playblast.py; 'video_chunks'.
+        clip_state: dict
+            Filled with 'name_space' (of the imported clip, to reset the scene), also when the clip fails.
+        profiler: stage_profiler.StageProfiler
+            Profiler of the worker, the clip is started.
+
+    Returns:
+        dict
+            Outputs of the clip.
+    """
+    from maya_batch_load_and_export_animation_into_fbx_and_video import (
+        load_animation_from_fbx, export_animation_into_fbx)
+    from maya_keyframe_range import get_keyframe_range
+
+    with profiler.stage('load'):
+        clip_state['name_space'] = load_animation_from_fbx(job['clip_path'])
+
+    with profiler.stage('keyframe_range'):
+        keyframe_range = get_keyframe_range(clip_state['name_space'], job['keyframe_node_name'])
+    if keyframe_range is None:
+        raise RuntimeError('No keyframes in clip: {}'.format(job['clip_path']))
+    start_time, end_time, step = keyframe_range
+
+    with profiler.stage('export_fbx'):
+        fbx_path = export_animation_into_fbx(
+            job['export_node_name'],
+            job['save_dir'],
+            get_clip_save_filename(job['clip']),
+            start_time,
+            end_time
+        )
+
+    outputs = {'fbx': fbx_path, 'start_time': start_time, 'end_time': end_time, 'step': step}
+
+    if job.get('video_encoder'):
+        from maya_chunked_playblast import export_animation_into_video_chunked
+
+        with profiler.stage('export_video'):
+            outputs['video'] = export_animation_into_video_chunked(
+                job['save_dir'],
+                get_clip_save_filename(job['clip']),
+                start_time,
+                end_time,
+                num_chunks=job['video_chunks'],
+                encoder=job['video_encoder'],
+                root_node_name=job['export_node_name']
+            )
+
+    return outputs
+
+
+def run_worker(scene_file, reset_mode='delete', profile_filename=None):
+    """
+    Worker loop in mayapy: open the scene once, then process the jobs read from stdin, one json per line,
+    until stdin is closed. The scene is reset to the clean rig after every clip, see maya_scene_reset.py.
+
+    Args:
+        scene_file: str
+            Path to the rig scene.
+        reset_mode: str
+            'delete' or 'reopen'.
+        profile_filename: str or None
+            Stage profile log of the worker (JSON lines), see stage_profiler.py.
+
+    Returns:
+        None.
+    """
+    # results are written to the original stdout, everything else printed goes to stderr (the worker log)
+    result_fp = sys.stdout
+    sys.stdout = sys.stderr
+
+    start_time = time.time()
+
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+
+    import maya.cmds as cmds
+    from maya_scene_reset import get_scene_state, reset_scene
+    from stage_profiler import StageProfiler
+    import maya_batch_load_and_export_animation_into_fbx_and_video
+    import maya_keyframe_range
+    import maya_chunked_playblast
+    cmds.loadPlugin('fbxmaya', quiet=True)
+
+    pprint('===> open scene: {}'.format(scene_file))
+    cmds.file(scene_file, open=True, force=True)
+    scene_state = get_scene_state()
+
+    profiler = StageProfiler(profile_filename)
+    profiler.instrument('maya_batch_load_and_export_animation_into_fbx_and_video', 'maya_keyframe_range',
+                        'maya_chunked_playblast', 'maya_scene_reset')
+
+    result_fp.write(READY_PREFIX + json.dumps({'pid': os.getpid(), 'seconds': time.time() - start_time}) + '\n')
+    result_fp.flush()
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+
+        job = json.loads(line)
+        result = {'clip': job['clip']}
+        clip_state = {'name_space': None}
+        profiler.start_clip(job['clip'])
+        try:
+            result['outputs'] = process_clip(job, clip_state, profiler)
+            result['status'] = 'done'
+        except Exception:
+            result['status'] = 'failed'
+            result['error'] = traceback.format_exc()
+
+        # a scene which can not be reset would spoil the next clips: exit, the launcher restarts the worker
+        with profiler.stage('reset'):
+            reset_scene(scene_state, clip_state['name_space'], reset_mode)
+
+        record = profiler.end_clip(status=result['status'], attempt=job['attempt'], num_nodes=len(cmds.ls()))
+        result['seconds'] = record['wall']
+        result['timings'] = dict((name, stage['wall']) for name, stage in record['stages'].items())
+        result['num_nodes'] = record['num_nodes']
+
+        result_fp.write(RESULT_PREFIX + json.dumps(result) + '\n')
+        result_fp.flush()
+
+    try:
+        maya.standalone.uninitialize()
+    except AttributeError:
+        pass
+
+
+def read_worker_output(worker_idx, proc, messages):
+    # forward the result/ready lines of a worker to the launcher, None when the worker exits
+    for line in iter(proc.stdout.readline, b''):
+        line = line.decode('utf-8', 'replace')
+        if line.startswith(RESULT_PREFIX):
+            messages.put((worker_idx, proc, 'result', json.loads(line[len(RESULT_PREFIX):])))
+        elif line.startswith(READY_PREFIX):
+            messages.put((worker_idx, proc, 'ready', json.loads(line[len(READY_PREFIX):])))
+    messages.put((worker_idx, proc, 'exit', None))
+
+
+class Worker(object):
+    """
+    A mayapy worker process, see run_worker().
+    """
+
+    def __init__(self, worker_idx, mayapy, scene_file, reset_mode, log_filename, profile_filename, messages):
+        self.worker_idx = worker_idx
+        self.log_fp = open(log_filename, 'a')
+        script_filename = osp.abspath(__file__)
+        self.proc = subprocess.Popen([mayapy, script_filename, scene_file, '--worker', '--reset-mode', reset_mode,
+                                      '--profile-log', profile_filename],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log_fp,
+                                     cwd=osp.dirname(script_filename))
+        self.start_time = time.time()
+        self.ready = False
+        self.job = None
+        self.job_start_time = None
+
+        thread = threading.Thread(target=read_worker_output, args=(worker_idx, self.proc, messages))
+        thread.daemon = True
+        thread.start()
+
+    def send(self, job):
+        self.job = job
+        self.job_start_time = time.time()
+        self.proc.stdin.write((json.dumps(job) + '\n').encode('utf-8'))
+        self.proc.stdin.flush()
+
+    def stop(self, kill=False):
+        if kill:
+            self.proc.kill()
+        else:
+            try:
+                self.proc.stdin.close()
+            except (IOError, OSError):
+                pass
+        self.proc.wait()
+        self.log_fp.close()
+
+
+def run_worker_pool(scene_file, clips, save_dir, keyframe_node_name, export_node_name,
+                    num_workers=4, mayapy=None, max_retries=2, clip_timeout=None, reset_mode='delete',
+                    video_encoder=None, video_chunks=1, max_startup_failures=3, startup_timeout=600):
+    """
+    Convert clips in a pool of mayapy workers, see the module docstring.
+
+    Args:
+        scene_file: str
+            Path to the rig scene, opened once by every worker.
+        clips: list of str
+            Paths to the .fbx clips.
+        save_dir: str
+            Directory to save the .fbx files, the manifest and the worker logs.
+        keyframe_node_name: str
+            Node whose keyframes give the frame range of a clip, e.g. 'mixamorig:Hips'.
+        export_node_name: str
+            Root node of the exported animation, e.g. 'AI_TD_01_grp'.
+        num_workers: int
+            Number of mayapy processes.
+        mayapy: str or None
+            Path to mayapy. If None, use env MAYAPY, or 'mayapy' in PATH.
+        max_retries: int
+            Max number of times a failed clip is retried (in this run).
+        clip_timeout: float or None
+            Max seconds per clip, the worker is killed and restarted when exceeded.
+        reset_mode: str
+            How the workers reset the rig scene between clips: 'delete' or 'reopen', see maya_scene_reset.py.
+        video_encoder: str or None
+            Also render the video of every clip with this encoder ('ffmpeg' or 'mjpeg_avi'), None for no video.
+        video_chunks: int
+            Number of chunks (Render processes) per video, the workers already run in parallel.
+        max_startup_failures: int
+            A worker which exits before it is ready (bad scene path, missing plugin, ...) is restarted with a backoff,
+            its slot is given up after max_startup_failures failures in a row. When no worker is left, the pending
+            clips are recorded as failed and the run ends.
+        startup_timeout: float or None
+            Max seconds for a worker to get ready (open the scene), the worker is killed and counted as a startup
+            failure when exceeded (e.g. hung on a license check or a modal dialog).
+
+    Returns:
+        dict
+            (k=clip, v=last manifest record of the clip).
+    """
+    if mayapy is None:
+        mayapy = os.environ.get('MAYAPY', 'mayapy')
+    if osp.dirname(mayapy):
+        # the workers run in the directory of this script
+        mayapy = osp.abspath(mayapy)
+
+    scene_file = osp.abspath(scene_file)
+    save_dir = osp.abspath(save_dir)
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    manifest_filename = osp.join(save_dir, 'batch_manifest.jsonl')
+    records = read_manifest(manifest_filename)
+
+    pending = []
+    for clip in clips:
+        record = records.get(clip)
+        if record is not None and record['status'] == 'done' and osp.isfile(record['outputs']['fbx']):
+            continue
+        pending.append((clip, 0))
+
+    pprint('===> {} clips, {} already done, {} workers'.format(len(clips), len(clips) - len(pending), num_workers))
+
+    messages = queue.Queue()
+    manifest_fp = open(manifest_filename, 'a')
+    workers = {}
+    # consecutive failures before ready, and delayed restarts, of every worker slot
+    startup_failures = dict((idx, 0) for idx in range(num_workers))
+    restart_times = {}
+    num_done = 0
+    num_failed = 0
+    run_start_time = time.time()
+
+    def start_worker(worker_idx):
+        log_filename = osp.join(save_dir, 'worker_{}.log'.format(worker_idx))
+        profile_filename = osp.join(save_dir, 'clip_profile.worker_{}.jsonl'.format(worker_idx))
+        workers[worker_idx] = Worker(worker_idx, mayapy, scene_file, reset_mode, log_filename, profile_filename,
+                                     messages)
+
+    def finish_job(worker, result):
+        # record an attempt, and retry a failed clip
+        clip, attempt = worker.job['clip'], worker.job['attempt']
+        record = {
+            'clip': clip,
+            'status': result['status'],
+            'outputs': result.get('outputs'),
+            'error': result.get('error'),
+            'seconds': result.get('seconds', time.time() - worker.job_start_time),
+            'timings': result.get('timings'),
+            'num_nodes': result.get('num_nodes'),
+            'worker': worker.worker_idx,
+            'attempt': attempt
+        }
+        append_manifest(manifest_fp, record)
+        records[clip] = record
+        worker.job = None
+
+        if record['status'] == 'done':
+            return 1, 0
+        if attempt < max_retries:
+            pprint('---> clip failed, retry: {}'.format(clip))
+            pending.append((clip, attempt + 1))
+            return 0, 0
+        pprint('---> clip failed after {} attempts: {}'.format(attempt + 1, clip))
+        return 0, 1
+
+    def restart_worker(worker):
+        # after an exit or a kill, a worker which was not ready yet is restarted with a backoff
+        worker_idx = worker.worker_idx
+        del workers[worker_idx]
+
+        delay = 0
+        if not worker.ready:
+            startup_failures[worker_idx] += 1
+            delay = 2 ** (startup_failures[worker_idx] - 1)
+        if startup_failures[worker_idx] >= max_startup_failures:
+            pprint('---> worker #{} failed before ready {} times in a row, give up the slot, see {}'.format(
+                worker_idx, startup_failures[worker_idx],
+                osp.join(save_dir, 'worker_{}.log'.format(worker_idx))))
+        elif pending:
+            pprint('---> restart worker #{} in {} seconds'.format(worker_idx, delay))
+            restart_times[worker_idx] = time.time() + delay
+
+    for worker_idx in range(min(num_workers, len(pending))):
+        start_worker(worker_idx)
+
+    try:
+        while (pending and (workers or restart_times)) or any(w.job is not None for w in workers.values()):
+            for worker_idx, restart_time in list(restart_times.items()):
+                if time.time() >= restart_time:
+                    del restart_times[worker_idx]
+                    if pending:
+                        start_worker(worker_idx)
+
+            for worker in workers.values():
+                if worker.ready and worker.job is None and pending:
+                    clip, attempt = pending.pop(0)
+                    worker.send({
+                        'clip': clip,
+                        'clip_path': osp.abspath(clip),
+                        'attempt': attempt,
+                        'save_dir': save_dir,
+                        'keyframe_node_name': keyframe_node_name,
+                        'export_node_name': export_node_name,
+                        'video_encoder': video_encoder,
+                        'video_chunks': video_chunks
+                    })
+
+            try:
+                worker_idx, proc, kind, payload = messages.get(timeout=1)
+            except queue.Empty:
+                worker_idx, proc, kind, payload = None, None, None, None
+
+            worker = workers.get(worker_idx)
+            if worker is not None and worker.proc is proc:
+                if kind == 'ready':
+                    pprint('===> worker #{} ready in {:.1f} seconds'.format(worker_idx, payload['seconds']))
+                    worker.ready = True
+                    startup_failures[worker_idx] = 0
+                elif kind == 'result':
+                    done, failed = finish_job(worker, payload)
+                    num_done += done
+                    num_failed += failed
+                    if done:
+                        pprint('===> [{}/{}] {:.1f} seconds: {}'.format(
+                            num_done, len(clips), payload['seconds'], payload['clip']))
+                elif kind == 'exit':
+                    code = worker.proc.wait()
+                    pprint('---> worker #{} exited (code {})'.format(worker_idx, code))
+                    if worker.job is not None:
+                        done, failed = finish_job(worker, {
+                            'status': 'failed', 'error': 'worker exited with code {}'.format(code)})
+                        num_failed += failed
+                    worker.stop()
+                    restart_worker(worker)
+
+            if startup_timeout is not None:
+                for worker in list(workers.values()):
+                    if not worker.ready and time.time() - worker.start_time > startup_timeout:
+                        pprint('---> worker #{} not ready after {} seconds, kill it'.format(
+                            worker.worker_idx, startup_timeout))
+                        worker.stop(kill=True)
+                        restart_worker(worker)
+
+            if clip_timeout is not None:
+                for worker in list(workers.values()):
+                    if worker.job is not None and time.time() - worker.job_start_time > clip_timeout:
+                        pprint('---> worker #{} exceeded {} seconds, kill it'.format(worker.worker_idx, clip_timeout))
+                        done, failed = finish_job(worker, {
+                            'status': 'failed', 'error': 'timeout after {} seconds'.format(clip_timeout)})
+                        num_failed += failed
+                        worker.stop(kill=True)
+                        start_worker(worker.worker_idx)
+        if pending:
+            # no worker could start: record the clips left, so that the run ends
+            error = 'no worker could start (failed before ready {} times in a row), see the worker logs'.format(
+                max_startup_failures)
+            pprint('---> {}, {} clips not converted'.format(error, len(pending)))
+            for clip, attempt in pending:
+                record = {'clip': clip, 'status': 'failed', 'outputs': None, 'error': error, 'seconds': 0,
+                          'timings': None, 'num_nodes': None, 'worker': None, 'attempt': attempt}
+                append_manifest(manifest_fp, record)
+                records[clip] = record
+            num_failed += len(pending)
+            del pending[:]
+    finally:
+        for worker in workers.values():
+            worker.stop(kill=worker.job is not None)
+        manifest_fp.close()
+
+    pprint('===> {} clips done, {} failed in {:.1f} seconds, see manifest: {}'.format(
+        num_done, num_failed, time.time() - run_start_time, manifest_filename))
+
+    profile_logs = [osp.join(save_dir, 'clip_profile.worker_*.jsonl')]
+    report = summarize_profile(profile_logs)
+    if report['num_clips']:
+        print_profile_report(report)
+        save_profile_report(report, osp.join(save_dir, 'profile_report.json'))
+
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert animation clips with a pool of mayapy workers.')
+    parser.add_argument('scene_file', help='rig scene opened by every worker')
+    parser.add_argument('clip_list', nargs='?', help='text file with one .fbx clip path per line')
+    parser.add_argument('--worker', action='store_true', help='(internal) run a worker in mayapy')
+    parser.add_argument('--save-dir', default='./maya_exports')
+    parser.add_argument('--keyframe-node-name', default='mixamorig:Hips')
+    parser.add_argument('--export-node-name', default='AI_TD_01_grp')
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--mayapy', default=None)
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--clip-timeout', type=float, default=None)
+    parser.add_argument('--max-startup-failures', type=int, default=3,
+                        help='give up a worker slot after this many failures before ready in a row')
+    parser.add_argument('--startup-timeout', type=float, default=600,
+                        help='kill a worker which is not ready after this many seconds (a startup failure)')
+    parser.add_argument('--reset-mode', default='delete', choices=['delete', 'reopen'],
+                        help='reset the rig between clips: delete the imported nodes, or reopen the scene')
+    parser.add_argument('--video-encoder', default=None, choices=['ffmpeg', 'mjpeg_avi'],
+                        help='also render the video of every clip, offscreen')
+    parser.add_argument('--video-chunks', type=int, default=1)
+    parser.add_argument('--profile-log', default=None, help='(internal) stage profile log of a worker')
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.scene_file, args.reset_mode, args.profile_log)
+    else:
+        if not args.clip_list:
+            parser.error('clip_list is required')
+
+        run_worker_pool(args.scene_file, read_clip_list(args.clip_list), args.save_dir,
+                        args.keyframe_node_name, args.export_node_name,
+                        num_workers=args.num_workers,
+                        mayapy=args.mayapy,
+                        max_retries=args.max_retries,
+                        clip_timeout=args.clip_timeout,
+                        max_startup_failures=args.max_startup_failures,
+                        startup_timeout=args.startup_timeout,
+                        reset_mode=args.reset_mode,
+                        video_encoder=args.video_encoder,
+                        video_chunks=args.video_chunks)
@@ -0,0 +1,578 @@
+# coding=utf-8
+# """
+# Render the animation video of a clip in parallel chunks, then concatenate the chunks into the final movie.
+
+# playblast needs a model panel (viewport), so it can not run in background processes: every chunk is rendered
+# offscreen as an image sequence by a Maya Hardware 2.0 batch render process (Render -r hw2, the viewport
+# renderer used by playblast), e.g.
+#     Render -r hw2 -s 0 -e 59 -rd {video}.chunks/chunk_000 -im frame -of png -fnc name.#.ext -pad 6 -cam persp scene.mb
+# Failed chunks (non-zero exit code, or missing frames) are re-rendered alone, up to max_retries times;
+# complete chunks of an interrupted run are not rendered again.
+# The frames of all the chunks, in frame order, are written into the movie by a pluggable encoder:
+#     'ffmpeg': the ffmpeg binary (concat demuxer over the image files, a single encode, no re-encoding of segments);
+#     'mjpeg_avi': pure-Python Motion-JPEG .avi writer (no dependency, the chunks are rendered as .jpg).
+# Any object with the attributes image_format, extension and a method encode(image_files, video_filename, fps)
+# can be used as encoder.
+
+# In Maya (with the clip loaded): export_animation_into_video_chunked() exports the scene into a copy and renders it,
+# the top-level transforms other than the one of root_node_name (and the camera) are hidden in the copy.
+# Outside Maya:
+#     python maya_chunked_playblast.py scene.mb 0 239 -o ./maya_exports/clip.mp4 --num-chunks 8 --encoder ffmpeg
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+from __future__ import print_function
+import os
+import os.path as osp
+import re
+import sys
+import json
+import time
+import shutil
+import struct
+import argparse
+import subprocess
+from pprint import pprint
+
+try:
+    import maya.cmds as cmds
+except ImportError:
+    cmds = None
+
+
+# frames per second of the time units of Maya
+TIME_UNIT_FPS = {
+    'game': 15, 'film': 24, 'pal': 25, 'ntsc': 30, 'show': 48, 'palf': 50, 'ntscf': 60
+}
+
+
+class FFmpegEncoder(object):
+    """
+    Encode the frames with the ffmpeg binary.
+    """
+    image_format = 'png'
+
+    def __init__(self, ffmpeg=None, codec='libx264', crf=18, extension='.mp4'):
+        """
+        Args:
+            ffmpeg: str or None
+                Path to ffmpeg. If None, use env FFMPEG, or 'ffmpeg' in PATH.
+            codec: str
+                ffmpeg video codec.
+            crf: int
+                Constant rate factor (quality) of the codec.
+            extension: str
+                Extension of the video file.
+        """
+        self.ffmpeg = ffmpeg or os.environ.get('FFMPEG', 'ffmpeg')
+        self.codec = codec
+        self.crf = crf
+        self.extension = extension
+
+    def encode(self, image_files, video_filename, fps=30):
+        # the concat demuxer reads the frames of all the chunks as one input
+        list_filename = video_filename + '.frames.txt'
+        fp = open(list_filename, 'w')
+        for image_file in image_files:
+            fp.write("file '{}'\n".format(osp.abspath(image_file).replace("'", r"'\''")))
+            fp.write('duration {}\n'.format(1.0 / fps))
+        # the duration of the last entry is only applied when the file is listed again
+        fp.write("file '{}'\n".format(osp.abspath(image_files[-1]).replace("'", r"'\''")))
+        fp.close()
+
+        cmd = [self.ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_filename,
+               '-r', str(fps), '-c:v', self.codec, '-crf', str(self.crf), '-pix_fmt', 'yuv420p',
+               # yuv420p needs even width and height
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', video_filename]
+        pprint('===> run command: ')
+        pprint(' '.join(cmd))
+        subprocess.check_call(cmd)
+        os.remove(list_filename)
+
+        return video_filename
+
+
+def get_jpeg_size(jpeg_filename):
+    """
+    Get the (width, height) of a .jpg file from its SOF marker.
+    """
+    fp = open(jpeg_filename, 'rb')
+    data = fp.read()
+    fp.close()
+
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos:pos + 1] != b'\xff':
+            pos += 1
+            continue
+        marker = struct.unpack('>B', data[pos + 1:pos + 2])[0]
+        if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7 or marker == 0xff:
+            pos += 2 if marker != 0xff else 1
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        # SOF0..SOF15, except DHT (c4), JPG (c8) and DAC (cc)
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+
+    raise ValueError('No SOF marker in JPEG file: {}'.format(jpeg_filename))
+
+
+class MJPEGAviEncoder(object):
+    """
+    Write the .jpg frames into a Motion-JPEG .avi file (AVI 1.0, < 1GB), in pure Python.
+    """
+    image_format = 'jpg'
+    extension = '.avi'
+
+    def encode(self, image_files, video_filename, fps=30):
+        width, height = get_jpeg_size(image_files[0])
+        frame_sizes = [osp.getsize(fn) for fn in image_files]
+        padded_sizes = [size + (size & 1) for size in frame_sizes]
+        num_frames = len(image_files)
+        max_frame_size = max(frame_sizes)
+
+        # frame rate as a ratio of integers, e.g. 29.97 -> 29970 / 1000
+        scale = 1000
+        rate = int(round(fps * scale))
+
+        avih = struct.pack('<14I',
+                           int(round(1000000.0 / fps)),  # dwMicroSecPerFrame
+                           int(max_frame_size * fps),  # dwMaxBytesPerSec
+                           0,  # dwPaddingGranularity
+                           0x10,  # dwFlags: AVIF_HASINDEX
+                           num_frames,  # dwTotalFrames
+                           0,  # dwInitialFrames
+                           1,  # dwStreams
+                           max_frame_size,  # dwSuggestedBufferSize
+                           width, height, 0, 0, 0, 0)
+        strh = b'vidsMJPG' + struct.pack('<IHHIIIIIIIi4h',
+                                         0,  # dwFlags
+                                         0, 0,  # wPriority, wLanguage
+                                         0,  # dwInitialFrames
+                                         scale, rate,  # dwScale, dwRate
+                                         0,  # dwStart
+                                         num_frames,  # dwLength
+                                         max_frame_size,  # dwSuggestedBufferSize
+                                         -1 & 0xffffffff,  # dwQuality: default
+                                         0,  # dwSampleSize
+                                         0, 0, width, height)  # rcFrame
+        strf = struct.pack('<IiiHH4sIiiII', 40, width, height, 1, 24, b'MJPG', width * height * 3, 0, 0, 0, 0)
+
+        def chunk(fourcc, data):
+            return fourcc + struct.pack('<I', len(data)) + data
+
+        def list_chunk(list_type, data):
+            return b'LIST' + struct.pack('<I', len(data) + 4) + list_type + data
+
+        strl = list_chunk(b'strl', chunk(b'strh', strh) + chunk(b'strf', strf))
+        hdrl = list_chunk(b'hdrl', chunk(b'avih', avih) + strl)
+
+        movi_size = 4 + sum(8 + size for size in padded_sizes)
+        idx1_size = 16 * num_frames
+        riff_size = 4 + len(hdrl) + 8 + movi_size + 8 + idx1_size
+        if riff_size > 0x40000000:
+            raise ValueError('Video larger than 1GB, not supported by AVI 1.0, use the ffmpeg encoder')
+
+        fp = open(video_filename, 'wb')
+        fp.write(b'RIFF' + struct.pack('<I', riff_size) + b'AVI ')
+        fp.write(hdrl)
+        fp.write(b'LIST' + struct.pack('<I', movi_size) + b'movi')
+
+        index = []
+        offset = 4
+        for image_file, size in zip(image_files, frame_sizes):
+            img_fp = open(image_file, 'rb')
+            data = img_fp.read()
+            img_fp.close()
+
+            fp.write(b'00dc' + struct.pack('<I', size) + data)
+            if size & 1:
+                fp.write(b'\x00')
+            # offsets are relative to the 'movi' fourcc, every frame is a key frame
+            index.append(struct.pack('<4sIII', b'00dc', 0x10, offset, size))
+            offset += 8 + size + (size & 1)
+
+        fp.write(b'idx1' + struct.pack('<I', idx1_size) + b''.join(index))
+        fp.close()
+
+        return video_filename
+
+
+ENCODERS = {
+    'ffmpeg': FFmpegEncoder,
+    'mjpeg_avi': MJPEGAviEncoder
+}
+
+
+def get_encoder(encoder):
+    """
+    Get an encoder object from its name in ENCODERS, encoder objects are returned as is.
+    """
+    if encoder in ENCODERS:
+        return ENCODERS[encoder]()
+    if hasattr(encoder, 'encode'):
+        return encoder
+
+    raise ValueError('Unknown encoder: {}, should be in {}'.format(encoder, sorted(ENCODERS)))
+
+
+def split_frame_range(start_time, end_time, num_chunks):
+    """
+    Split the frame range [start_time, end_time] into at most num_chunks contiguous chunks.
+
+    Returns:
+        list of (int, int)
+    """
+    num_frames = end_time - start_time + 1
+    num_chunks = max(1, min(num_chunks, num_frames))
+
+    chunks = []
+    for idx in range(num_chunks):
+        chunk_start = start_time + num_frames * idx // num_chunks
+        chunk_end = start_time + num_frames * (idx + 1) // num_chunks - 1
+        chunks.append((chunk_start, chunk_end))
+
+    return chunks
+
+
+def get_chunk_images(chunk_dir, image_format):
+    """
+    Get the image files of a rendered chunk, sorted by frame number.
+    """
+    if not osp.isdir(chunk_dir):
+        return []
+
+    images = []
+    for fn in os.listdir(chunk_dir):
+        match = re.match(r'.*?(-?\d+)\.{}$'.format(image_format), fn)
+        if match:
+            images.append((int(match.group(1)), osp.join(chunk_dir, fn)))
+
+    return [fn for _, fn in sorted(images)]
+
+
+def is_chunk_done(chunk_dir, chunk_start, chunk_end):
+    # a chunk of a previous run with another frame range (or number of chunks) is rendered again
+    done_filename = osp.join(chunk_dir, 'done.json')
+    if not osp.isfile(done_filename):
+        return False
+
+    fp = open(done_filename, 'r')
+    done = json.load(fp)
+    fp.close()
+
+    return done['start_time'] == chunk_start and done['end_time'] == chunk_end
+
+
+def start_chunk_render(scene_file, chunk_dir, chunk_start, chunk_end, image_format,
+                       camera='persp', width=None, height=None, render=None):
+    """
+    Start the Render process of a chunk, output and errors go to {chunk_dir}/render.log.
+
+    Returns:
+        subprocess.Popen
+    """
+    if render is None:
+        render = os.environ.get('MAYA_RENDER', 'Render')
+
+    # restart the chunk from scratch
+    if osp.exists(chunk_dir):
+        shutil.rmtree(chunk_dir)
+    os.makedirs(chunk_dir)
+
+    cmd = [render, '-r', 'hw2', '-s', str(chunk_start), '-e', str(chunk_end), '-b', '1',
+           '-rd', chunk_dir, '-im', 'frame', '-of', image_format, '-fnc', 'name.#.ext', '-pad', '6',
+           '-cam', camera]
+    if width and height:
+        cmd += ['-x', str(width), '-y', str(height)]
+    cmd.append(scene_file)
+
+    log_fp = open(osp.join(chunk_dir, 'render.log'), 'w')
+    log_fp.write(' '.join(cmd) + '\n')
+    log_fp.flush()
+    proc = subprocess.Popen(cmd, stdout=log_fp, stderr=subprocess.STDOUT)
+    log_fp.close()
+
+    return proc
+
+
+def render_video_chunked(scene_file, start_time, end_time, video_filename, num_chunks=4, num_workers=None,
+                         encoder='ffmpeg', fps=30, camera='persp', width=None, height=None,
+                         max_retries=2, render=None, keep_chunks=False):
+    """
+    Render the frame range of a scene in parallel chunks, and encode all the frames into a video.
+
+    Args:
+        scene_file: str
+            Scene to render (with the animation).
+        start_time, end_time: int
+            Frame range.
+        video_filename: str
+            Path to the video file, the extension of the encoder is added if missing.
+        num_chunks: int
+            Number of chunks of the frame range.
+        num_workers: int or None
+            Max number of Render processes running at the same time, None for num_chunks.
+        encoder: str or encoder object
+            See the module docstring.
+        fps: float
+            Frame rate of the video.
+        camera: str
+            Camera to render.
+        width, height: int or None
+            Resolution, None for the resolution of the render settings of the scene.
+        max_retries: int
+            Max number of times a failed chunk is rendered again.
+        render: str or None
+            Path to the Render binary. If None, use env MAYA_RENDER, or 'Render' in PATH.
+        keep_chunks: bool
+            Keep the rendered frames, in {video_filename}.chunks/.
+
+    Returns:
+        str
+            Full absolute path of the video file.
+    """
+    encoder = get_encoder(encoder)
+    start_time = int(start_time)
+    end_time = int(end_time)
+
+    if not video_filename.endswith(encoder.extension):
+        video_filename += encoder.extension
+    video_filename = osp.abspath(video_filename)
+
+    chunks_dir = video_filename + '.chunks'
+    chunks = split_frame_range(start_time, end_time, num_chunks)
+    chunk_dirs = [osp.join(chunks_dir, 'chunk_{:03d}'.format(idx)) for idx in range(len(chunks))]
+    num_workers = num_workers or len(chunks)
+
+    pending = [idx for idx in range(len(chunks)) if not is_chunk_done(chunk_dirs[idx], *chunks[idx])]
+    attempts = dict((idx, 0) for idx in pending)
+    running = {}
+    failed = []
+
+    start_run_time = time.time()
+    pprint('===> render {} frames in {} chunks ({} to render), {} workers'.format(
+        end_time - start_time + 1, len(chunks), len(pending), num_workers))
+
+    while pending or running:
+        while pending and len(running) < num_workers:
+            idx = pending.pop(0)
+            chunk_start, chunk_end = chunks[idx]
+            running[idx] = start_chunk_render(scene_file, chunk_dirs[idx], chunk_start, chunk_end,
+                                              encoder.image_format, camera, width, height, render)
+
+        time.sleep(0.2)
+
+        for idx, proc in list(running.items()):
+            code = proc.poll()
+            if code is None:
+                continue
+            del running[idx]
+
+            chunk_start, chunk_end = chunks[idx]
+            num_images = len(get_chunk_images(chunk_dirs[idx], encoder.image_format))
+            if code == 0 and num_images == chunk_end - chunk_start + 1:
+                fp = open(osp.join(chunk_dirs[idx], 'done.json'), 'w')
+                json.dump({'start_time': chunk_start, 'end_time': chunk_end, 'attempts': attempts[idx] + 1}, fp)
+                fp.close()
+                pprint('---> chunk {} done: frames {}-{}'.format(idx, chunk_start, chunk_end))
+            elif attempts[idx] < max_retries:
+                attempts[idx] += 1
+                pprint('---> chunk {} failed (code {}, {} frames), retry: see {}'.format(
+                    idx, code, num_images, osp.join(chunk_dirs[idx], 'render.log')))
+                pending.append(idx)
+            else:
+                failed.append(idx)
+
+    if failed:
+        raise RuntimeError('Chunks failed after {} retries: {}, see the render.log files in {}'.format(
+            max_retries, sorted(failed), chunks_dir))
+
+    image_files = []
+    for chunk_dir in chunk_dirs:
+        image_files += get_chunk_images(chunk_dir, encoder.image_format)
+
+    pprint('===> encode {} frames into: {}'.format(len(image_files), video_filename))
+    encoder.encode(image_files, video_filename, fps)
+
+    if not keep_chunks:
+        shutil.rmtree(chunks_dir)
+
+    pprint('===> video rendered in {:.1f} seconds'.format(time.time() - start_run_time))
+
+    return video_filename
+
+
+def get_scene_fps():
+    """
+    Get the frame rate of the current Maya scene, 30 for unknown time units.
+    """
+    time_unit = cmds.currentUnit(query=True, time=True)
+    if time_unit in TIME_UNIT_FPS:
+        return TIME_UNIT_FPS[time_unit]
+
+    match = re.match(r'([\d.]+)fps$', time_unit)
+    if match:
+        return float(match.group(1))
+
+    return 30
+
+
+def get_default_camera():
+    """
+    Get the camera of the viewport pane used by playblast (pane1 of viewPanes) in the GUI, 'persp' in batch mode.
+    """
+    if not cmds.about(batch=True) and cmds.paneLayout('viewPanes', exists=True):
+        panel = cmds.paneLayout('viewPanes', query=True, pane1=True)
+        if panel and cmds.getPanel(typeOf=panel) == 'modelPanel':
+            return cmds.modelPanel(panel, query=True, camera=True)
+
+    return 'persp'
+
+
+def get_top_node(node_name):
+    """
+    Get the top-level transform (long name) above a DAG node, None for DG nodes.
+    """
+    long_names = cmds.ls(node_name, long=True) or []
+    if not long_names or not long_names[0].startswith('|'):
+        return None
+
+    return '|' + long_names[0].split('|')[1]
+
+
+def hide_other_top_nodes(keep_node_names):
+    """
+    Hide the top-level transforms other than the ones above keep_node_names, like isolateSelect in a playblast.
+
+    Args:
+        keep_node_names: list of str
+            Nodes kept visible.
+
+    Returns:
+        list of str
+            The hidden nodes, to show again after the export.
+    """
+    keep_nodes = set(get_top_node(node_name) for node_name in keep_node_names)
+    hidden_nodes = []
+    for node in cmds.ls(assemblies=True, long=True) or []:
+        if node in keep_nodes or not cmds.getAttr(node + '.visibility'):
+            continue
+        # locked or connected
+        if not cmds.getAttr(node + '.visibility', settable=True):
+            pprint('---> can not hide: {}'.format(node))
+            continue
+        cmds.setAttr(node + '.visibility', False)
+        hidden_nodes.append(node)
+
+    return hidden_nodes
+
+
+def export_animation_into_video_chunked(
+    save_dir='./',
+    save_filename='',
+    start_time=0,
+    end_time=240,
+    num_chunks=4,
+    encoder='ffmpeg',
+    camera=None,
+    root_node_name=None,
+    **kwargs
+):
+    """
+    Export the animation of the current scene into a video file, rendered in parallel chunks.
+    Replaces the playblast of export_animation_into_video() in the batch converters.
+
+    Args:
+        save_dir: str
+            Directory to save video files.
+        save_filename: str
+            Video filename. The full file path is : {save_dir}/{save_filename}{encoder extension}
+        start_time: int
+            Start frame of animation
+        end_time: int
+            End frame of animation
+        num_chunks: int
+            Number of chunks rendered in parallel.
+        encoder: str or encoder object
+            'ffmpeg' or 'mjpeg_avi', see the module docstring.
+        camera: str or None
+            Camera to render. If None, the camera of the viewport pane in the GUI, see get_default_camera().
+        root_node_name: str or None
+            Node to render, the other top-level transforms are hidden in the rendered copy of the scene.
+            If None, render the whole scene.
+        kwargs:
+            Other arguments of render_video_chunked().
+
+    Returns:
+        Full absolute path of saved file.
+    """
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    scene_name = osp.splitext(cmds.file(query=True, sceneName=True, shortName=True))[0]
+    if not save_filename:
+        save_filename = '{}.animation'.format(scene_name)
+    save_filename = osp.splitext(save_filename)[0]
+
+    if not camera:
+        camera = get_default_camera()
+
+    # the Render processes read the scene with the clip from an exported copy,
+    # the current scene is neither renamed nor saved (untitled scenes stay untitled)
+    render_scene = osp.abspath(osp.join(save_dir, save_filename + '.render_scene.mb'))
+    hidden_nodes = hide_other_top_nodes([root_node_name, camera]) if root_node_name else []
+    try:
+        cmds.file(render_scene, exportAll=True, preserveReferences=True, type='mayaBinary', force=True)
+    finally:
+        for node in hidden_nodes:
+            cmds.setAttr(node + '.visibility', True)
+
+    kwargs.setdefault('fps', get_scene_fps())
+    try:
+        video_filename = render_video_chunked(render_scene, start_time, end_time,
+                                              osp.join(save_dir, save_filename),
+                                              num_chunks=num_chunks, encoder=encoder, camera=camera, **kwargs)
+    finally:
+        os.remove(render_scene)
+
+    pprint("===> full path of output file: {}".format(video_filename))
+
+    return video_filename
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the frame range of a scene into a video, in parallel chunks.')
+    parser.add_argument('scene_file')
+    parser.add_argument('start_time', type=int)
+    parser.add_argument('end_time', type=int)
+    parser.add_argument('-o', '--output', required=True, help='video file')
+    parser.add_argument('--num-chunks', type=int, default=4)
+    parser.add_argument('--num-workers', type=int, default=None)
+    parser.add_argument('--encoder', default='ffmpeg', choices=sorted(ENCODERS))
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--camera', default='persp')
+    parser.add_argument('--width', type=int, default=None)
+    parser.add_argument('--height', type=int, default=None)
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--render', default=None, help='path to the Maya Render binary')
+    parser.add_argument('--keep-chunks', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        render_video_chunked(args.scene_file, args.start_time, args.end_time, args.output,
+                             num_chunks=args.num_chunks,
+                             num_workers=args.num_workers,
+                             encoder=args.encoder,
+                             fps=args.fps,
+                             camera=args.camera,
+                             width=args.width,
+                             height=args.height,
+                             max_retries=args.max_retries,
+                             render=args.render,
+                             keep_chunks=args.keep_chunks)
+    except RuntimeError as e:
+        pprint('---> {}'.format(e))
+        sys.exit(1)
@@ -7,9 +7,18 @@
 import os
 import os.path as osp
 import json
+import fnmatch
+from collections import OrderedDict
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.api.OpenMaya as om
 from pprint import pprint
+from maya_attr_sampler import get_plug
+
+
+# MFnNumericData types read with MPlug.asInt()
+INT_NUMERIC_TYPES = set(getattr(om.MFnNumericData, name) for name in (
+    'kByte', 'kChar', 'kShort', 'kInt', 'kInt64', 'kLong', 'kAddr') if hasattr(om.MFnNumericData, name))
 
 
 def get_current_scene_name():
@@ -30,7 +39,7 @@ def get_current_scene_name():
     return scene_name
 
 
-def get_attributes_list(node_name, attribute_name_pattern=None):
+def get_attributes_list(node_name, attribute_name_pattern=None, scene_index=None):
     """
     Get attributes list of a node.
 
@@ -39,6 +48,8 @@ def get_attributes_list(node_name, attribute_name_pattern=None):
             Node Name in Maya.
         attribute_name_pattern: str
             List only the attributes that match the other criteria AND match the string(s) passed from this flag. String can be a regular expression.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         list of str
@@ -50,8 +61,10 @@ def get_attributes_list(node_name, attribute_name_pattern=None):
     # cmd = 'listAttr -k -m -st "weight" ' + node_name
     # attributes_list = mel.eval(cmd)
 
+    if scene_index is not None:
+        attributes_list = scene_index.get_keyable_attributes(node_name, attribute_name_pattern)
     # Maya python cmd
-    if attribute_name_pattern is None:
+    elif attribute_name_pattern is None:
         attributes_list = cmds.listAttr(node_name, multi=True, keyable=True)
     else:
         attributes_list = cmds.listAttr(
@@ -62,7 +75,7 @@ def get_attributes_list(node_name, attribute_name_pattern=None):
     return attributes_list
 
 
-def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None):
+def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None, scene_index=None):
     """
     Get and save attributes list of a node.
 
@@ -73,6 +86,8 @@ def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None
             Directory to save attributes list.
         attribute_name_pattern: str
             List only the attributes that match the other criteria AND match the string(s) passed from this flag. String can be a regular expression.
+        scene_index: SceneIndex or None
+            List the attributes from the scene index (see maya_scene_index.py), the values are read from the scene.
 
     Returns: 
         None.
@@ -85,12 +100,13 @@ def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None
     attributes_filename = osp.join(
         save_dir, '{}.{}.attributes_dict.json'.format(scene_name, node_name))
 
-    attributes_list = get_attributes_list(node_name, attribute_name_pattern)
+    attributes_list = get_attributes_list(node_name, attribute_name_pattern, scene_index)
     attributes_dict = {}
 
     for idx, attribute in enumerate(attributes_list):
         # cmds.setAttr( node_name + '.' + attribute, 0)
-        attribute_value = cmds.getAttr( node_name + '.' + attribute )
+        plug_name = node_name + '.' + attribute
+        attribute_value = read_plug_value(get_plug(plug_name), plug_name)
         attributes_dict[attribute] =  attribute_value
         pprint('---> {}: {} {}'.format(idx+1, attribute, attribute_value))
 
@@ -108,6 +124,201 @@ def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None
     fp.close()
 
 
+def get_node_object(node_name):
+    """
+    Get the MObject of a node.
+    """
+    sel_list = om.MSelectionList()
+    sel_list.add(node_name)
+
+    return sel_list.getDependNode(0)
+
+
+def read_plug_value(plug, plug_name=None):
+    """
+    Read the value of a plug, in the same units as cmds.getAttr() (UI units for angles, distances and times).
+    Plugs of other attribute types (strings, matrices, compounds, ...) are read by cmds.getAttr(plug_name).
+
+    Args:
+        plug: maya.api.OpenMaya.MPlug
+        plug_name: str or None
+            Name of the attribute, default: plug.name().
+
+    Returns:
+        bool, int, float, or the value returned by cmds.getAttr()
+    """
+    attr = plug.attribute()
+
+    if attr.hasFn(om.MFn.kNumericAttribute):
+        numeric_type = om.MFnNumericAttribute(attr).numericType()
+        if numeric_type == om.MFnNumericData.kBoolean:
+            return plug.asBool()
+        elif numeric_type in INT_NUMERIC_TYPES:
+            return plug.asInt()
+        elif numeric_type in (om.MFnNumericData.kFloat, om.MFnNumericData.kDouble):
+            return plug.asDouble()
+    elif attr.hasFn(om.MFn.kUnitAttribute):
+        unit_type = om.MFnUnitAttribute(attr).unitType()
+        if unit_type == om.MFnUnitAttribute.kAngle:
+            return plug.asMAngle().asUnits(om.MAngle.uiUnit())
+        elif unit_type == om.MFnUnitAttribute.kDistance:
+            return plug.asMDistance().asUnits(om.MDistance.uiUnit())
+        elif unit_type == om.MFnUnitAttribute.kTime:
+            return plug.asMTime().asUnits(om.MTime.uiUnit())
+    elif attr.hasFn(om.MFn.kEnumAttribute):
+        return plug.asShort()
+
+    return cmds.getAttr(plug_name or plug.name())
+
+
+def is_in_array(attr):
+    """
+    Check whether an attribute is an array, or a child of an array compound (one plug per element).
+    """
+    while not attr.isNull():
+        attr_fn = om.MFnAttribute(attr)
+        if attr_fn.array:
+            return True
+        attr = attr_fn.parent
+
+    return False
+
+
+def get_type_keyable_attributes(node_type):
+    """
+    Get the static attributes of a node type which can be keyed (array elements excluded), nodes of the same type
+    share them. Not only the attributes keyable by default: the keyable state can be changed per node
+    (e.g. rotateOrder or visibility made keyable in the channel box), check it with MPlug.isKeyable.
+
+    Args:
+        node_type: str
+            Node type, e.g. transform.
+
+    Returns:
+        list of (str, MObject)
+            Long names and attribute objects.
+    """
+    attributes = []
+    for attr in om.MNodeClass(node_type).getAttributes():
+        # numeric, unit (distance, angle, time) and enum attributes which accept an incoming connection
+        if not (attr.hasFn(om.MFn.kNumericAttribute) or attr.hasFn(om.MFn.kUnitAttribute)
+                or attr.hasFn(om.MFn.kEnumAttribute)):
+            continue
+        attr_fn = om.MFnAttribute(attr)
+        if attr_fn.writable and attr_fn.connectable and not is_in_array(attr):
+            attributes.append((attr_fn.name, attr))
+
+    return attributes
+
+
+def get_attributes_table(node_name_pattern=None, node_type=None, attribute_name_pattern=None):
+    """
+    Read the keyable attributes of many nodes (e.g. all the controllers of a face rig):
+    the static attributes which can be keyed are listed once per node type (and kept if keyable on the node),
+    the user-defined ones once per node,
+    the values are read from the plugs with OpenMaya (no getAttr per attribute).
+
+    Args:
+        node_name_pattern: str or None
+            Node name pattern of cmds.ls(), e.g. 'CTRL_*'.
+        node_type: str or None
+            Node type of cmds.ls(), e.g. 'transform'. At least one of node_name_pattern and node_type is required.
+        attribute_name_pattern: str or None
+            Wildcard pattern of the attribute names, e.g. 'CTRL*'.
+
+    Returns:
+        OrderedDict
+            'nodes': list of str, long names of the nodes;
+            'node_types': list of str, node types in the table;
+            'types': list of int, index into node_types of every node;
+            'columns': OrderedDict, (k=attribute name, v=OrderedDict of
+                'nodes': indices of the nodes which have the keyable attribute, 'values': the values).
+    """
+    if node_name_pattern is None and node_type is None:
+        raise ValueError('node_name_pattern or node_type is required')
+
+    ls_args = [node_name_pattern] if node_name_pattern is not None else []
+    ls_kwargs = {'type': node_type} if node_type is not None else {}
+    nodes_and_types = cmds.ls(*ls_args, long=True, showType=True, **ls_kwargs) or []
+    nodes = nodes_and_types[0::2]
+
+    type_attributes = {}
+    node_types = []
+    type_index = {}
+    types = []
+    columns = {}
+
+    for node_idx, (node_name, node_type_name) in enumerate(zip(nodes, nodes_and_types[1::2])):
+        if node_type_name not in type_index:
+            type_index[node_type_name] = len(node_types)
+            node_types.append(node_type_name)
+            type_attributes[node_type_name] = get_type_keyable_attributes(node_type_name)
+        types.append(type_index[node_type_name])
+
+        node_fn = om.MFnDependencyNode(get_node_object(node_name))
+        plugs = [(name, node_fn.findPlug(attr, False)) for name, attr in type_attributes[node_type_name]]
+        for name in cmds.listAttr(node_name, userDefined=True, keyable=True) or []:
+            plug = node_fn.findPlug(name, False)
+            if not is_in_array(plug.attribute()):
+                plugs.append((name, plug))
+
+        for name, plug in plugs:
+            if attribute_name_pattern is not None and not fnmatch.fnmatchcase(name, attribute_name_pattern):
+                continue
+            if not plug.isKeyable or plug.isCompound:
+                continue
+
+            column = columns.setdefault(name, OrderedDict([('nodes', []), ('values', [])]))
+            column['nodes'].append(node_idx)
+            column['values'].append(read_plug_value(plug, node_name + '.' + name))
+
+    table = OrderedDict()
+    table['nodes'] = nodes
+    table['node_types'] = node_types
+    table['types'] = types
+    table['columns'] = OrderedDict((name, columns[name]) for name in sorted(columns))
+
+    return table
+
+
+def export_attributes_table(save_dir='./', node_name_pattern=None, node_type=None, attribute_name_pattern=None):
+    """
+    Get and save the keyable attributes of many nodes into one columnar file {scene}.attributes_table.json,
+    see get_attributes_table().
+
+    Args:
+        save_dir: str
+            Directory to save the attributes table.
+        node_name_pattern: str or None
+            Node name pattern of cmds.ls(), e.g. 'CTRL_*'.
+        node_type: str or None
+            Node type of cmds.ls(), e.g. 'transform'.
+        attribute_name_pattern: str or None
+            Wildcard pattern of the attribute names.
+
+    Returns:
+        None.
+    """
+
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    scene_name = get_current_scene_name()
+    table_filename = osp.join(save_dir, '{}.attributes_table.json'.format(scene_name))
+
+    table = get_attributes_table(node_name_pattern, node_type, attribute_name_pattern)
+    num_values = sum(len(column['values']) for column in table['columns'].values())
+
+    pprint('\n===> {} nodes, {} attributes, {} values in total'.format(
+        len(table['nodes']), len(table['columns']), num_values))
+
+    pprint('\n===> save attributes table into file: ')
+    pprint(table_filename)
+    fp = open(table_filename, 'w')
+    json.dump(table, fp)
+    fp.close()
+
+
 if __name__ == '__main__':
     node_name = r'Root_M'
     save_dir = r'D:/zhaoyafei/maya_exports'
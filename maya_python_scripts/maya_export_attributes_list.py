@@ -30,7 +30,7 @@ def get_current_scene_name():
     return scene_name
 
 
-def get_attributes_list(node_name, attribute_name_pattern=None):
+def get_attributes_list(node_name, attribute_name_pattern=None, scene_index=None):
     """
     Get attributes list of a node.
 
@@ -39,6 +39,8 @@ def get_attributes_list(node_name, attribute_name_pattern=None):
             Node Name in Maya.
         attribute_name_pattern: str
             List only the attributes that match the other criteria AND match the string(s) passed from this flag. String can be a regular expression.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         list of str
@@ -50,8 +52,10 @@ def get_attributes_list(node_name, attribute_name_pattern=None):
     # cmd = 'listAttr -k -m -st "weight" ' + node_name
     # attributes_list = mel.eval(cmd)
 
+    if scene_index is not None:
+        attributes_list = scene_index.get_keyable_attributes(node_name, attribute_name_pattern)
     # Maya python cmd
-    if attribute_name_pattern is None:
+    elif attribute_name_pattern is None:
         attributes_list = cmds.listAttr(node_name, multi=True, keyable=True)
     else:
         attributes_list = cmds.listAttr(
@@ -62,7 +66,7 @@ def get_attributes_list(node_name, attribute_name_pattern=None):
     return attributes_list
 
 
-def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None):
+def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None, scene_index=None):
     """
     Get and save attributes list of a node.
 
@@ -73,6 +77,8 @@ def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None
             Directory to save attributes list.
         attribute_name_pattern: str
             List only the attributes that match the other criteria AND match the string(s) passed from this flag. String can be a regular expression.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         None.
@@ -85,7 +91,7 @@ def export_attributes_list(node_name, save_dir='./', attribute_name_pattern=None
     attributes_filename = osp.join(
         save_dir, '{}.{}.attributes.txt'.format(scene_name, node_name))
 
-    attributes_list = get_attributes_list(node_name, attribute_name_pattern)
+    attributes_list = get_attributes_list(node_name, attribute_name_pattern, scene_index)
 
     for idx, attribute in enumerate(attributes_list):
         pprint('---> {}: {}'.format(idx+1, attribute))
@@ -0,0 +1,703 @@
+# coding=utf-8
+# """
+# Export a blendshape node into a glTF 2.0 file (.gltf/.glb), with all target shapes as sparse morph targets.
+
+# Vertices are split by their (vertex, uv, normal) corners, the mesh has POSITION, NORMAL and TEXCOORD_0 attributes,
+# the morph targets have sparse POSITION (and optionally NORMAL) displacements.
+# Positions are scaled by unit_scale: Maya works in centimeters, glTF in meters (unit_scale=0.01).
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import json
+import struct
+import maya.cmds as cmds
+import maya.mel as mel
+from pprint import pprint
+
+import numpy as np
+
+from maya_mesh_export_utils import get_mesh_face_tables, get_mesh_points, get_mesh_normals
+
+
+# glTF constants
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+GLTF_TRIANGLES = 4
+
+
+def get_current_scene_name():
+    """
+    Get current scene name.
+
+    Args: 
+        None.
+
+    Returns: 
+        str
+            Scene name.
+    """
+
+    scene_name = cmds.file(query=True, sceneName=True, shortName=True)
+    scene_name = osp.splitext(scene_name)[0]
+
+    return scene_name
+
+
+def get_blendshape_keys_list(blendshape_node_name, sort_keys=False):
+    """
+    Get name list (blendshape keys) of target-shapes/morphing-targets of blendshape.
+
+    Args:
+        blendshape_node_name: str 
+            Name of blend shape deformer (blendShape Node) in Maya.
+        sort_keys: bool
+            Whether to sort the keys by name.
+
+    Returns: 
+        list of str
+            Name list of target shapes of the input blendshape node.
+
+    """
+
+    # Maya Mel cmd
+    # cmd = 'listAttr -k -m -st "weight" ' + blendshape_node_name
+    # blendshape_keys_list = mel.eval(cmd)
+
+    # Maya python cmd
+    blendshape_keys_list = cmds.listAttr(
+        blendshape_node_name, st='weight', multi=True, keyable=True)
+
+    if sort_keys:
+        blendshape_keys_list.sort()
+
+    return blendshape_keys_list
+
+
+
+def get_blendshape_geometry_name(blendshape_node_name):
+    """
+    Get the geometry name binded with the specified blendshape.
+
+    Args:
+        blendshape_node_name: str 
+            Name of blend shape deformer (blendShape Node) in Maya.
+
+    Returns: 
+        list of str
+            Name list of geometry of the input blendshape node.
+
+    """
+    # Maya python cmd
+    geometry_list = cmds.blendShape(
+        blendshape_node_name, query=True, geometry=True)
+
+    geometry_list.sort()
+
+    return geometry_list
+
+
+def make_blendshape_keys_settable(blendshape_node_name, save_dir, blendshape_keys_list=None, forced=False):
+    """
+    Make keyable/settable a list of blendshape keys (name of target-shapes/morphing-targets)
+    by unlocking/makeing settable/breaking connections.
+
+    Args:
+        blendshape_node_name: str
+            Name of blend shape deformer (blendShape Node) in Maya.
+        save_dir: str
+            Where to save the restore info file
+        blendshape_keys_list: list of str
+            List of blendshape keys (weight names).
+        forced: bool
+            If True, will not ask user to check.
+
+    Returns: tuple of (int, str)
+        str: file path to restore info of all the modifications to make blendshape settable.
+    """
+
+    need_restore = -1
+    info_str = ""
+
+    if forced:
+        input_words = 'y'
+    else:
+        pprint("""\n===> Are you sure to make blendshape attributes settable? 
+                    This will try to make attributes settable by making them keyable, unlocking them, 
+                    breaking their connection. Although this script will try to save the modification info,
+                    and use these info to restore all the attribute state back, 
+                    there still is risk not able to restore everything.
+                    Please make a copy of your Maya Project (.ma,.mb), and operates in the project copy. 
+                    If you are aware of what you are doing, input 'yes' or 'y' to continue;
+                    Otherwise, this script will exit.""")
+        input_words = raw_input('yes or no:')
+        input_words = input_words.lower()
+
+    if not(input_words == 'yes' or input_words == 'y'):
+        need_restore = -1
+        info_str = "make_blendshape_keys_settable() is canceled"
+    else:
+        scene_name = get_current_scene_name()
+        need_restore = True
+
+        settable_restore_info_list = []
+
+        if blendshape_keys_list is None:
+            blendshape_keys_list = get_blendshape_keys_list(
+                blendshape_node_name)
+
+        for k in blendshape_keys_list:
+            key_name = "{}.{}".format(blendshape_node_name, k)
+            restore_info_dict = {'key_name': key_name}
+
+            if not cmds.getAttr(key_name, settable=True):
+                pprint('---> Attribute {} is not settable'.format(key_name))
+                pprint('     Try to make it keyable and unlocked')
+
+                keyable = cmds.getAttr(key_name, keyable=True)
+                lock = cmds.getAttr(key_name, lock=True)
+
+                restore_info_dict["keyable"] = keyable
+                restore_info_dict["lock"] = lock
+
+                # set attr keyable and unlock attr
+                cmds.setAttr(key_name, keyable=True, lock=False)
+
+                if not cmds.getAttr(key_name, settable=True):
+                    pprint('---> Attribute {} is still not settable'.format(key_name))
+                    pprint('     Try to break all the connections upon it.')
+                    # break all connections:
+                    # cmd = 'CBdeleteConnection ' + key_name
+                    # mel.eval(cmd)
+                    restore_info_dict["connections_from"] = cmds.listConnections(
+                        key_name, d=False, s=True, p=True)
+                    restore_info_dict["connections_to"] = cmds.listConnections(
+                        key_name, d=True, s=False, p=True)
+
+                    if isinstance(restore_info_dict["connections_from"], list) and len(restore_info_dict["connections_from"]) > 0:
+                        for attr in restore_info_dict["connections_from"]:
+                            cmds.disconnectAttr(attr, key_name)
+
+                    if  isinstance(restore_info_dict["connections_to"], list) and len(restore_info_dict["connections_to"]) > 0:
+                        for attr in restore_info_dict["connections_to"]:
+                            cmds.disconnectAttr(key_name, attr)
+
+                settable_restore_info_list.append(restore_info_dict)
+
+        if len(settable_restore_info_list) > 0:
+            restore_filename = osp.join(
+                save_dir, '{}.blendshape.restore_info.txt'.format(scene_name))
+            pprint('\n===> save blendshape restore info into file: ')
+            pprint(restore_filename)
+            fp = open(restore_filename, 'w')
+            fp.write(json.dumps(settable_restore_info_list, indent=2) + '\n')
+            fp.close()
+
+            need_restore = 1
+            info_str = restore_filename
+
+        else:
+            need_restore = 0
+            info_str = "Nothing to restore"
+
+    return (need_restore, info_str)
+
+
+def restore_settable_modification(restore_info):
+    """
+    Restore all the modifications to make keyable/settable a list of 
+    blendshape keys (name of target-shapes/morphing-targets)
+    by unlocking/makeing settable/breaking connections.
+
+    Args:
+        restore_info: list of dict or str
+            list of dict: Restore info of all the modifications to make blendshape settable.
+            str: path to the restore info file
+
+    Returns: 
+        None.
+    """
+    if isinstance(restore_info, list):
+        settable_restore_info_list = restore_info
+    elif isinstance(restore_info, str) and osp.isfile(restore_info):
+        with open(restore_info, 'r') as fp:
+            settable_restore_info_list = json.load(fp)
+            fp.close()
+    else:
+        pprint("===> restore_settable_modification(): valid input ")
+        return
+
+    for restore_info_dict in settable_restore_info_list[::-1]:
+        key_name = restore_info_dict['key_name']
+        if "connections_to" in restore_info_dict and isinstance(restore_info_dict["connections_to"], list) and len(restore_info_dict["connections_to"]) > 0:
+            for attr in restore_info_dict["connections_to"]:
+                cmds.connectAttr(key_name, attr)
+        if "connections_from" in restore_info_dict and isinstance(restore_info_dict["connections_from"], list) and len(restore_info_dict["connections_from"]) > 0:
+            for attr in restore_info_dict["connections_from"]:
+                cmds.connectAttr(attr, key_name)
+
+        # restore attr keyable info and lock info
+        cmds.setAttr(
+            key_name, keyable=restore_info_dict["keyable"], lock=restore_info_dict["lock"])
+
+
+def set_blendshape_weight(blendshape_node_name, blendshape_key, value, key_time=None):
+    """
+    Set the weight value of a blendshape key (name of target-shape/morphing-target).
+
+    Args:
+        blendshape_node_name: str
+            Name of blend shape deformer (blendShape Node) in Maya.
+        blendshape_key: str
+            Blendshape key (weight name).
+        value: float
+            Weight value.
+        key_time: int or None
+            If not None, also set a keyframe of the weight value at this time.
+
+    Returns: 
+        None.
+    """
+    key_name = "{}.{}".format(blendshape_node_name, blendshape_key)
+    cmds.setAttr(key_name, value)
+
+    if key_time is not None:
+        cmds.setKeyframe(key_name, time=key_time, value=value)
+
+
+class GltfBinaryBuffer(object):
+    """
+    The binary buffer of a glTF file, built from NumPy arrays.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.byte_length = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add_buffer_view(self, array, target=None):
+        """
+        Append an array into the buffer as a new bufferView.
+
+        Args:
+            array: np.ndarray
+                Array of float32 or uint32.
+            target: int or None
+                GLTF_ARRAY_BUFFER or GLTF_ELEMENT_ARRAY_BUFFER, None for sparse data.
+
+        Returns:
+            int
+                Index of the bufferView.
+        """
+        data = np.ascontiguousarray(array).tobytes()
+
+        buffer_view = {
+            'buffer': 0,
+            'byteOffset': self.byte_length,
+            'byteLength': len(data)
+        }
+        if target is not None:
+            buffer_view['target'] = target
+
+        # all the components are 4 bytes, keep every bufferView 4-byte aligned
+        padding = (4 - len(data) % 4) % 4
+        self.chunks.append(data + b'\x00' * padding)
+        self.byte_length += len(data) + padding
+
+        self.buffer_views.append(buffer_view)
+
+        return len(self.buffer_views) - 1
+
+    def add_accessor(self, array, accessor_type, target=None, with_bounds=False):
+        """
+        Append an array into the buffer and add an accessor of it.
+
+        Args:
+            array: np.ndarray
+                Array of shape (count, ) or (count, n).
+            accessor_type: str
+                'SCALAR', 'VEC2' or 'VEC3'.
+            target: int or None
+                See add_buffer_view().
+            with_bounds: bool
+                Whether to add min/max (required by POSITION).
+
+        Returns:
+            int
+                Index of the accessor.
+        """
+        accessor = {
+            'bufferView': self.add_buffer_view(array, target),
+            'componentType': GLTF_UNSIGNED_INT if array.dtype == np.uint32 else GLTF_FLOAT,
+            'count': int(array.shape[0]),
+            'type': accessor_type
+        }
+
+        if with_bounds:
+            accessor['min'] = array.min(axis=0).tolist()
+            accessor['max'] = array.max(axis=0).tolist()
+
+        self.accessors.append(accessor)
+
+        return len(self.accessors) - 1
+
+    def add_sparse_accessor(self, count, indices, values):
+        """
+        Add a VEC3 accessor of zeros with sparse substitution (for morph target displacements).
+
+        Args:
+            count: int
+                Number of vertices.
+            indices: np.ndarray of uint32
+                Strictly increasing indices of displaced vertices.
+            values: np.ndarray of float32, shape (len(indices), 3)
+                Displacements of these vertices.
+
+        Returns:
+            int
+                Index of the accessor.
+        """
+        accessor = {
+            'componentType': GLTF_FLOAT,
+            'count': int(count),
+            'type': 'VEC3',
+            'min': [0., 0., 0.],
+            'max': [0., 0., 0.]
+        }
+
+        # glTF requires sparse.count >= 1, an accessor without bufferView is initialized with zeros
+        if len(indices) > 0:
+            accessor['sparse'] = {
+                'count': int(len(indices)),
+                'indices': {
+                    'bufferView': self.add_buffer_view(indices),
+                    'componentType': GLTF_UNSIGNED_INT
+                },
+                'values': {
+                    'bufferView': self.add_buffer_view(values)
+                }
+            }
+
+            min_vals = values.min(axis=0)
+            max_vals = values.max(axis=0)
+            if len(indices) < count:
+                # the vertices not listed stay zeros
+                min_vals = np.minimum(min_vals, 0.)
+                max_vals = np.maximum(max_vals, 0.)
+
+            accessor['min'] = min_vals.tolist()
+            accessor['max'] = max_vals.tolist()
+
+        self.accessors.append(accessor)
+
+        return len(self.accessors) - 1
+
+    def get_bytes(self):
+        return b''.join(self.chunks)
+
+
+def get_gltf_vertex_mapping(face_table):
+    """
+    Split Maya vertices by their (vertex, uv, normal) corners, since all glTF attributes are per vertex.
+
+    Args:
+        face_table: dict
+            Triangulated face-index table, see maya_mesh_export_utils.get_mesh_face_table().
+
+    Returns:
+        tuple of (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+            vert_ids: Maya vertex index of each glTF vertex;
+            uv_ids: UV index of each glTF vertex (-1 if no UV);
+            normal_ids: Maya normal index of each glTF vertex, see maya_mesh_export_utils.get_mesh_normals();
+            indices: triangle indices of glTF vertices.
+    """
+    corner_dict = {}
+    indices = []
+
+    for face in face_table['faces']:
+        for corner in face:
+            idx = corner_dict.get(corner)
+            if idx is None:
+                idx = len(corner_dict)
+                corner_dict[corner] = idx
+            indices.append(idx)
+
+    corners = sorted(corner_dict.items(), key=lambda kv: kv[1])
+    vert_ids = np.array([c[0][0] for c in corners], dtype=np.int64)
+    uv_ids = np.array([-1 if c[0][1] is None else c[0][1] for c in corners], dtype=np.int64)
+    normal_ids = np.array([c[0][2] for c in corners], dtype=np.int64)
+
+    return vert_ids, uv_ids, normal_ids, np.array(indices, dtype=np.uint32)
+
+
+def get_gltf_normals(mesh_node_name, normal_ids):
+    """
+    Get the unit normals of the glTF vertices of the evaluated mesh.
+
+    Returns:
+        np.ndarray of float64, shape (len(normal_ids), 3)
+    """
+    normals = np.array(get_mesh_normals(mesh_node_name), dtype=np.float64)[normal_ids]
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+
+    return normals / np.maximum(lengths, 1e-12)
+
+
+def get_sparse_deltas(deltas, threshold):
+    """
+    Get the sparse displacements of a morph target.
+
+    Returns:
+        tuple of (np.ndarray of uint32, np.ndarray of float32)
+            Indices of the displaced vertices (with any abs(dx, dy, dz) > threshold), and their displacements.
+    """
+    indices = np.nonzero((np.abs(deltas) > threshold).any(axis=1))[0]
+
+    return indices.astype(np.uint32), deltas[indices].astype(np.float32)
+
+
+def write_gltf_file(save_filename, meshes_data, target_names):
+    """
+    Write meshes with morph targets into a .gltf (+ .bin) or .glb file.
+
+    Args:
+        save_filename: str
+            Path to the output file, .glb for binary glTF, otherwise .gltf with a .bin buffer file.
+        meshes_data: list of dict
+            Each dict has:
+                'name': mesh name;
+                'positions': np.ndarray of float32, shape (num_verts, 3);
+                'normals': np.ndarray of float32, shape (num_verts, 3) or None;
+                'uvs': np.ndarray of float32, shape (num_verts, 2) or None;
+                'indices': np.ndarray of uint32, triangle indices;
+                'targets': list of dict (k='POSITION' or 'NORMAL', v=(indices, values) of sparse displacements),
+                    one for each target name.
+        target_names: list of str
+            Names of morph targets.
+
+    Returns:
+        None.
+    """
+    gltf_buffer = GltfBinaryBuffer()
+    gltf_meshes = []
+    gltf_nodes = []
+
+    for mesh_data in meshes_data:
+        num_verts = mesh_data['positions'].shape[0]
+
+        attributes = {
+            'POSITION': gltf_buffer.add_accessor(
+                mesh_data['positions'], 'VEC3', GLTF_ARRAY_BUFFER, with_bounds=True)
+        }
+        if mesh_data.get('normals') is not None:
+            attributes['NORMAL'] = gltf_buffer.add_accessor(
+                mesh_data['normals'], 'VEC3', GLTF_ARRAY_BUFFER)
+        if mesh_data['uvs'] is not None:
+            attributes['TEXCOORD_0'] = gltf_buffer.add_accessor(
+                mesh_data['uvs'], 'VEC2', GLTF_ARRAY_BUFFER)
+
+        primitive = {
+            'attributes': attributes,
+            'indices': gltf_buffer.add_accessor(
+                mesh_data['indices'], 'SCALAR', GLTF_ELEMENT_ARRAY_BUFFER),
+            'mode': GLTF_TRIANGLES,
+            'targets': [
+                dict((attribute, gltf_buffer.add_sparse_accessor(num_verts, indices, values))
+                     for attribute, (indices, values) in sorted(target.items()))
+                for target in mesh_data['targets']
+            ]
+        }
+
+        gltf_meshes.append({
+            'name': mesh_data['name'],
+            'primitives': [primitive],
+            'weights': [0.] * len(target_names),
+            'extras': {'targetNames': list(target_names)}
+        })
+        gltf_nodes.append({
+            'name': mesh_data['name'],
+            'mesh': len(gltf_meshes) - 1
+        })
+
+    bin_data = gltf_buffer.get_bytes()
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'maya_export_blendshape_gltf.py'},
+        'scene': 0,
+        'scenes': [{'nodes': list(range(len(gltf_nodes)))}],
+        'nodes': gltf_nodes,
+        'meshes': gltf_meshes,
+        'accessors': gltf_buffer.accessors,
+        'bufferViews': gltf_buffer.buffer_views,
+        'buffers': [{'byteLength': len(bin_data)}]
+    }
+
+    if save_filename.lower().endswith('.glb'):
+        json_data = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+        json_data += b' ' * ((4 - len(json_data) % 4) % 4)
+
+        total_length = 12 + 8 + len(json_data) + 8 + len(bin_data)
+
+        fp = open(save_filename, 'wb')
+        fp.write(struct.pack('<4sII', b'glTF', 2, total_length))
+        fp.write(struct.pack('<I4s', len(json_data), b'JSON'))
+        fp.write(json_data)
+        fp.write(struct.pack('<I4s', len(bin_data), b'BIN\x00'))
+        fp.write(bin_data)
+        fp.close()
+    else:
+        bin_filename = osp.splitext(save_filename)[0] + '.bin'
+        gltf['buffers'][0]['uri'] = osp.basename(bin_filename)
+
+        fp = open(bin_filename, 'wb')
+        fp.write(bin_data)
+        fp.close()
+
+        fp = open(save_filename, 'w')
+        json.dump(gltf, fp, indent=2)
+        fp.close()
+
+
+def export_blendshape_into_gltf(blendshape_node_name,
+                                save_filename,
+                                blendshape_keys_list=None,
+                                mesh_node_name=None,
+                                delta_threshold=1e-6,
+                                unit_scale=0.01,
+                                export_normals=True,
+                                target_normals=False,
+                                normal_delta_threshold=1e-4):
+    """
+    Export a blendshape node into a glTF 2.0 file in one pass:
+    the neutral mesh, and all the target shapes as sparse morph targets (target names in mesh.extras.targetNames).
+
+    Args:
+        blendshape_node_name: str
+            Name of blend shape deformer (blendShape Node) in Maya.
+        save_filename: str
+            Path to the output file (.gltf or .glb).
+        blendshape_keys_list: list of str or None
+            List of blendshape keys (names of target shapes) to export. If =None, export all target shapes.
+        mesh_node_name: str or list of str or None
+            Name of mesh/shape in Maya. If =None, use the geometry of the blendshape node.
+        delta_threshold: float
+            Vertex displacements with all abs(dx, dy, dz) <= delta_threshold (in Maya units, cm)
+            are treated as zeros.
+        unit_scale: float
+            Scale of the positions and displacements, 0.01 from Maya centimeters to glTF meters, 1.0 to keep cm.
+        export_normals: bool
+            Whether to export the NORMAL attribute of the neutral mesh.
+        target_normals: bool
+            Whether to export the normal displacements of the target shapes too (sparse NORMAL of morph targets),
+            only with export_normals.
+        normal_delta_threshold: float
+            Normal displacements with all abs(dx, dy, dz) <= normal_delta_threshold are treated as zeros.
+
+    Returns: 
+        None.
+    """
+    pprint("===> blendshape_node_name: {}".format(blendshape_node_name))
+
+    save_dir = osp.dirname(osp.abspath(save_filename))
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    if mesh_node_name is None:
+        mesh_node_name = get_blendshape_geometry_name(blendshape_node_name)
+    if not isinstance(mesh_node_name, list):
+        mesh_node_name = [mesh_node_name]
+
+    pprint("===> mesh_node_name: {}".format(mesh_node_name))
+
+    if blendshape_keys_list is None:
+        blendshape_keys_list = get_blendshape_keys_list(blendshape_node_name, sort_keys=True)
+
+    pprint('\n===> {} blendshape keys in total'.format(len(blendshape_keys_list)))
+
+    # 0. make all blendshape keys/attributes settable
+    need_restore, restore_info = make_blendshape_keys_settable(
+        blendshape_node_name, save_dir, blendshape_keys_list, forced=True)
+
+    if need_restore < 0:
+        exit()
+
+    # the settable modification is restored even if the export fails
+    try:
+        # glTF only takes triangles, triangulate once for each mesh
+        face_tables = get_mesh_face_tables(mesh_node_name, triangulate=True)
+
+        # 1. The neutral pose.
+        for k in blendshape_keys_list:
+            set_blendshape_weight(blendshape_node_name, k, 0.)
+
+        meshes_data = []
+        for mesh, face_table in face_tables.items():
+            vert_ids, uv_ids, normal_ids, indices = get_gltf_vertex_mapping(face_table)
+
+            uvs = None
+            if len(face_table['uvs']) > 0 and (uv_ids >= 0).all():
+                uvs = np.array(face_table['uvs'], dtype=np.float32)[uv_ids]
+                # glTF puts the UV origin at the top-left corner
+                uvs[:, 1] = 1.0 - uvs[:, 1]
+
+            neutral_points = np.array(get_mesh_points(mesh), dtype=np.float64)
+            neutral_normals = get_gltf_normals(mesh, normal_ids) if export_normals else None
+
+            meshes_data.append({
+                'name': mesh,
+                'vert_ids': vert_ids,
+                'normal_ids': normal_ids,
+                'neutral_points': neutral_points,
+                'neutral_normals': neutral_normals,
+                'positions': (neutral_points[vert_ids] * unit_scale).astype(np.float32),
+                'normals': neutral_normals.astype(np.float32) if export_normals else None,
+                'uvs': uvs,
+                'indices': indices,
+                'targets': []
+            })
+
+        # 2. The target shapes, only switching the two weights that differ between successive targets.
+        active_key = None
+        for idx, curr_k in enumerate(blendshape_keys_list):
+            pprint('---> {}: {}'.format(idx+1, curr_k))
+
+            if active_key is not None:
+                set_blendshape_weight(blendshape_node_name, active_key, 0.)
+            set_blendshape_weight(blendshape_node_name, curr_k, 1.0)
+            active_key = curr_k
+
+            for mesh_data in meshes_data:
+                points = np.array(get_mesh_points(mesh_data['name']), dtype=np.float64)
+                deltas = (points - mesh_data['neutral_points'])[mesh_data['vert_ids']]
+
+                indices, values = get_sparse_deltas(deltas, delta_threshold)
+                target = {'POSITION': (indices, values * np.float32(unit_scale))}
+
+                if export_normals and target_normals:
+                    normal_deltas = get_gltf_normals(mesh_data['name'], mesh_data['normal_ids']) - \
+                        mesh_data['neutral_normals']
+                    target['NORMAL'] = get_sparse_deltas(normal_deltas, normal_delta_threshold)
+
+                mesh_data['targets'].append(target)
+
+        if active_key is not None:
+            set_blendshape_weight(blendshape_node_name, active_key, 0.)
+
+        pprint('\n===> save glTF into file: ')
+        pprint(save_filename)
+        write_gltf_file(save_filename, meshes_data, blendshape_keys_list)
+    finally:
+        if need_restore==1:
+            restore_settable_modification(restore_info)
+
+
+if __name__ == '__main__':
+    save_filename = r'/Users/zhaoyafei/Downloads/bs_definition_3D_face/maya_exports/Head01_blendShape.glb'
+
+    blendshape_node_name = r'Head01_blendShape'
+
+    export_blendshape_into_gltf(blendshape_node_name, save_filename)
@@ -11,6 +11,9 @@ import maya.cmds as cmds
 import maya.mel as mel
 from pprint import pprint
 
+from maya_mesh_export_utils import get_mesh_face_tables, export_pose_into_obj, ObjWriterPool
+from maya_mesh_export_utils import load_export_manifest, save_export_manifest
+
 
 def get_current_scene_name():
     """
@@ -227,13 +230,39 @@ def restore_settable_modification(restore_info):
             key_name, keyable=restore_info_dict["keyable"], lock=restore_info_dict["lock"])
 
 
+def set_blendshape_weight(blendshape_node_name, blendshape_key, value, key_time=None):
+    """
+    Set the weight value of a blendshape key (name of target-shape/morphing-target).
+
+    Args:
+        blendshape_node_name: str
+            Name of blend shape deformer (blendShape Node) in Maya.
+        blendshape_key: str
+            Blendshape key (weight name).
+        value: float
+            Weight value.
+        key_time: int or None
+            If not None, also set a keyframe of the weight value at this time.
+
+    Returns: 
+        None.
+    """
+    key_name = "{}.{}".format(blendshape_node_name, blendshape_key)
+    cmds.setAttr(key_name, value)
+
+    if key_time is not None:
+        cmds.setKeyframe(key_name, time=key_time, value=value)
+
+
 def export_blendshape_target_shapes(blendshape_node_name,
                                     mesh_node_name,
                                     save_dir='./',
                                     blendshape_keys_list=None,
                                     blendshape_inbetween_dict=None,
                                     force_triangulate=False,
-                                    skip_existing_files=True):
+                                    skip_existing_files=True,
+                                    set_keyframe=False,
+                                    num_writer_threads=0):
     """
     Export target shapes into .obj files for a blendshape node (name of target-shapes/morphing-targets).
 
@@ -248,6 +277,18 @@ def export_blendshape_target_shapes(blendshape_node_name,
             List of blendshape keys  (names of target shapes) to export. If =None, export all target shapes.
         blendshape_inbetween_dict: dict of {bs_name: [list of inbetween vals]}
             Dict of blendshape inbetween values.
+        force_triangulate: bool
+            Whether to export triangulated meshes.
+        skip_existing_files: bool
+            Whether to skip the poses whose .obj files are up to date,
+            i.e. their input state (blendshape key, weight and mesh vertices) and output hash
+            match those recorded in the export manifest.
+        set_keyframe: bool
+            Whether to key the weights of each exported pose on the timeline (one frame per inbetween value).
+            Only the weights changed between two successive poses are set (and keyed).
+        num_writer_threads: int
+            If > 0, the main thread only sets the weights and copies the vertex positions of each pose,
+            while this number of threads write the .obj files (with the cached face-index tables).
 
     Returns: 
         None.
@@ -258,7 +299,7 @@ def export_blendshape_target_shapes(blendshape_node_name,
     if not osp.exists(save_dir):
         os.makedirs(save_dir)
 
-    # scene_name = get_current_scene_name()
+    scene_name = get_current_scene_name()
     if blendshape_keys_list is None:
         blendshape_keys_list = get_blendshape_keys_list(blendshape_node_name, sort_keys=True)
 
@@ -274,98 +315,97 @@ def export_blendshape_target_shapes(blendshape_node_name,
     if need_restore < 0:
         exit()
 
-    # 1. Export the neutral pose.
-    obj_filename = osp.join(save_dir, '00_neutral.obj')
-    pprint('===> Export the neutral pose into {}.'.format(obj_filename))
+    # Existing files are only skipped if their input state recorded in the manifest is unchanged.
+    manifest_filename = osp.join(
+        save_dir, '{}.blendshape_inbetween.{}.export_manifest.json'.format(scene_name, blendshape_node_name))
+    manifest = load_export_manifest(manifest_filename)
+    writer_pool = None
 
-    curr_time = 0
-    cmds.currentTime(curr_time)
+    # the settable modification is restored even if the export fails
+    try:
+        # 1. Export the neutral pose.
+        obj_filename = osp.join(save_dir, '00_neutral.obj')
+        pprint('===> Export the neutral pose into {}.'.format(obj_filename))
 
-    if osp.isfile(obj_filename) and skip_existing_files:
-        pprint('===> skip existing file: {}'.format(obj_filename))
-    else:
-        for k in blendshape_keys_list:
-            v = 0.
-            key_name = "{}.{}".format(blendshape_node_name, k)
+        face_tables = None
+        if force_triangulate:
+            pprint('===> Force to export triangulated mesh')
 
-            cmds.setAttr(key_name, v)
-            cmds.setKeyframe(key_name)
+        if force_triangulate or num_writer_threads > 0:
+            # Triangulate once for each mesh, without adding polyTriangulate nodes into the history.
+            face_tables = get_mesh_face_tables(mesh_node_name, triangulate=force_triangulate)
 
-        # Select Mesh before export
-        cmds.select(mesh_node_name)
+        if num_writer_threads > 0:
+            writer_pool = ObjWriterPool(num_writer_threads, max_pending=4 * num_writer_threads)
 
-        if force_triangulate:
-            pprint('===> Force to export triangulated mesh')
-            if isinstance(mesh_node_name, list):
-                cmd = "polyTriangulate -ch 1 " + ' '.join(mesh_node_name)
-            else:
-                cmd = "polyTriangulate -ch 1 " + mesh_node_name
-
-            pprint('===> run MEL command: ')
-            pprint(cmd)
-
-            mel.eval(cmd)
-
-        cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-                    -typ "OBJexport" -pr -es " {}";""".format(obj_filename)
-
-        # cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-        #             -typ "OBJexport" -pr -es " {}/{}.obj";""".format(save_dir, "00_neutral")
-        pprint('===> run MEL command: ')
-        pprint(cmd)
-        mel.eval(cmd)
-
-    # 2. Export blendshape target shapes.
-    # for curr_k in blendshape_inbetween_dict[:5]:
-    for curr_k, bs_ibw_list in blendshape_inbetween_dict.items():
-        if len(bs_ibw_list) < 1:
-            continue
-
-        for bs_ibw_val in bs_ibw_list:
-            obj_filename = osp.join(save_dir, curr_k+'_{}.obj'.format(bs_ibw_val))
-
-            # if not curr_k.startswith('jaw'):
-            #     continue
-            pprint('===> Export the blendshape key: {}'.format(curr_k))
-
-            curr_time += 1
-            cmds.currentTime(curr_time)
-
-            # if osp.isfile(obj_filename) and skip_existing_files:
-            #     pprint('===> skip existing file: {}'.format(obj_filename))
-            # else:
-            # reset other bs values to 0
-            for k in blendshape_keys_list:
-                v = bs_ibw_val if curr_k == k else 0.
-                key_name = "{}.{}".format(blendshape_node_name, k)
-
-                cmds.setAttr(key_name, v)
-                cmds.setKeyframe(key_name)
-
-            # Select Mesh before export
-            cmds.select(mesh_node_name)
-
-            if force_triangulate:
-                pprint('===> Force to export triangulated mesh')
-                if isinstance(mesh_node_name, list):
-                    cmd = "polyTriangulate -ch 1 " + ' '.join(mesh_node_name)
-                else:
-                    cmd = "polyTriangulate -ch 1 " + mesh_node_name
-
-                pprint('===> run MEL command: ')
-                pprint(cmd)
-                mel.eval(cmd)
-
-            cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-                        -typ "OBJexport" -pr -es " {}";""".format(obj_filename)
-            # cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-            #               -typ "OBJexport" -pr -es " {}/{}.obj";""".format(save_dir, curr_k)
-            pprint('===> run MEL command: ')
-            pprint(cmd)
-            mel.eval(cmd)
-
-    if need_restore==1:
-        restore_settable_modification(restore_info)
+        num_poses = 0
+
+        curr_time = 0
+        cmds.currentTime(curr_time)
+        key_time = curr_time if set_keyframe else None
+
+        # Reset all the weights once, each pose below only switches the weights that differ
+        # from the previous pose.
+        for k in blendshape_keys_list:
+            set_blendshape_weight(blendshape_node_name, k, 0., key_time)
+
+        active_key = None
+
+        export_pose_into_obj(obj_filename, mesh_node_name, manifest, '00_neutral', 0.,
+                             face_tables, skip_existing_files, writer_pool)
+
+        # 2. Export blendshape target shapes.
+        # for curr_k in blendshape_inbetween_dict[:5]:
+        for curr_k, bs_ibw_list in blendshape_inbetween_dict.items():
+            if len(bs_ibw_list) < 1:
+                continue
+
+            for bs_ibw_val in bs_ibw_list:
+                obj_filename = osp.join(save_dir, curr_k+'_{}.obj'.format(bs_ibw_val))
+
+                # if not curr_k.startswith('jaw'):
+                #     continue
+                pprint('===> Export the blendshape key: {}'.format(curr_k))
+
+                # Only move along the timeline when keying, otherwise changing time would
+                # re-evaluate (and override) the weights set below.
+                if set_keyframe:
+                    curr_time += 1
+                    cmds.currentTime(curr_time)
+                    key_time = curr_time
+
+                # reset the previous bs value to 0
+                if active_key != curr_k:
+                    if set_keyframe:
+                        # hold the weight at 0 until the previous frame
+                        set_blendshape_weight(blendshape_node_name, curr_k, 0., key_time - 1)
+
+                    if active_key is not None:
+                        set_blendshape_weight(blendshape_node_name, active_key, 0., key_time)
+
+                set_blendshape_weight(blendshape_node_name, curr_k, bs_ibw_val, key_time)
+                active_key = curr_k
+
+                export_pose_into_obj(obj_filename, mesh_node_name, manifest,
+                                     '{}_{}'.format(curr_k, bs_ibw_val), bs_ibw_val,
+                                     face_tables, skip_existing_files, writer_pool)
+                num_poses += 1
+
+                # save the manifest now and then, so an interrupted export can be resumed
+                if num_poses % 20 == 0:
+                    save_export_manifest(manifest_filename, manifest)
+    finally:
+        try:
+            if writer_pool is not None:
+                # wait for the pending files to be written
+                writer_pool.close()
+        finally:
+            pprint('\n===> save export manifest into file: ')
+            pprint(manifest_filename)
+            save_export_manifest(manifest_filename, manifest)
+
+            if need_restore==1:
+                restore_settable_modification(restore_info)
 
 
 if __name__ == '__main__':
@@ -381,6 +421,7 @@ if __name__ == '__main__':
 
     force_triangulate = False
     skip_existing_files = True
+    num_writer_threads = 4
 
     blendshape_inbetween_dict = {
         "CheekPuffLeft4D": [0.125, 0.25, 0.375, 0.5, 0.625, 0.75, 0.875],
@@ -421,4 +462,5 @@ if __name__ == '__main__':
         blendshape_keys_list=None,
         blendshape_inbetween_dict=blendshape_inbetween_dict,
         force_triangulate=force_triangulate,
-        skip_existing_files=skip_existing_files)
+        skip_existing_files=skip_existing_files,
+        num_writer_threads=num_writer_threads)
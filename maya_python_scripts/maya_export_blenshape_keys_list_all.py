@@ -29,13 +29,15 @@ def get_current_scene_name():
 
     return scene_name
 
-def get_all_blendshape_nodes(show_type=False):
+def get_all_blendshape_nodes(show_type=False, scene_index=None):
     """
     Get name list of all blendshape nodes.
 
     Args:
         show_type: boolean
             Whether to show the node type of each shape node.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         list of str
@@ -44,6 +46,9 @@ def get_all_blendshape_nodes(show_type=False):
 
     """
 
+    if scene_index is not None:
+        return scene_index.get_nodes_of_type("blendShape", show_type=show_type)
+
     # blendshape_nodes_list = cmds.lsType("blendShape")
     blendshape_nodes_list = cmds.ls(type="blendShape", showType=show_type)
 
@@ -53,7 +58,7 @@ def get_all_blendshape_nodes(show_type=False):
     return blendshape_nodes_list
 
 
-def get_blendshape_keys_list(blendshape_node_name, sort_keys=False):
+def get_blendshape_keys_list(blendshape_node_name, sort_keys=False, scene_index=None):
     """
     Get name list (blendshape keys) of target-shapes/morphing-targets of blendshape.
 
@@ -62,6 +67,8 @@ def get_blendshape_keys_list(blendshape_node_name, sort_keys=False):
             Name of blend shape deformer (blendShape Node) in Maya.
         sort_keys: bool
             Whether to sort the keys by name.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         list of str
@@ -73,9 +80,12 @@ def get_blendshape_keys_list(blendshape_node_name, sort_keys=False):
     # cmd = 'listAttr -k -m -st "weight" ' + blendshape_node_name
     # blendshape_keys_list = mel.eval(cmd)
 
-    # Maya python cmd
-    blendshape_keys_list = cmds.listAttr(
-        blendshape_node_name, st='weight', multi=True, keyable=True)
+    if scene_index is not None:
+        blendshape_keys_list = scene_index.get_blendshape_targets(blendshape_node_name)
+    else:
+        # Maya python cmd
+        blendshape_keys_list = cmds.listAttr(
+            blendshape_node_name, st='weight', multi=True, keyable=True)
 
     if sort_keys:
         blendshape_keys_list.sort()
@@ -83,7 +93,7 @@ def get_blendshape_keys_list(blendshape_node_name, sort_keys=False):
     return blendshape_keys_list
 
 
-def export_blendshape_keys(blendshape_node_name, save_dir='./'):
+def export_blendshape_keys(blendshape_node_name, save_dir='./', scene_index=None):
     """
     Get and save name list of blendshape keys (name of target-shapes/morphing-targets).
 
@@ -92,6 +102,8 @@ def export_blendshape_keys(blendshape_node_name, save_dir='./'):
             Name of blend shape deformer (blendShape Node) in Maya.
         save_dir: str
             Directory to save blendshape keys list.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         None.
@@ -104,7 +116,8 @@ def export_blendshape_keys(blendshape_node_name, save_dir='./'):
     blendshape_keys_filename = osp.join(
         save_dir, '{}.blendshape.{}.txt'.format(scene_name, blendshape_node_name))
 
-    blendshape_keys_list = get_blendshape_keys_list(blendshape_node_name, sort_keys=True)
+    blendshape_keys_list = get_blendshape_keys_list(
+        blendshape_node_name, sort_keys=True, scene_index=scene_index)
 
     for idx, blendshape in enumerate(blendshape_keys_list):
         pprint('---> {}: {}'.format(idx+1, blendshape))
@@ -11,6 +11,9 @@ import maya.cmds as cmds
 import maya.mel as mel
 from pprint import pprint
 
+from maya_mesh_export_utils import get_mesh_face_tables, export_pose_into_obj, ObjWriterPool
+from maya_mesh_export_utils import load_export_manifest, save_export_manifest
+
 
 def get_current_scene_name():
     """
@@ -218,7 +221,7 @@ def restore_settable_modification(restore_info):
         if "connections_to" in restore_info_dict and isinstance(restore_info_dict["connections_to"], list) and len(restore_info_dict["connections_to"]) > 0:
             for attr in restore_info_dict["connections_to"]:
                 cmds.connectAttr(key_name, attr)
-        if "connections_from" in restore_info_dict and  isinstance(restore_info_dict["connections_from"], list) and len(restore_info_dict["connections_from"]) > 0:
+        if "connections_from" in restore_info_dict and isinstance(restore_info_dict["connections_from"], list) and len(restore_info_dict["connections_from"]) > 0:
             for attr in restore_info_dict["connections_from"]:
                 cmds.connectAttr(attr, key_name)
 
@@ -227,12 +230,38 @@ def restore_settable_modification(restore_info):
             key_name, keyable=restore_info_dict["keyable"], lock=restore_info_dict["lock"])
 
 
+def set_blendshape_weight(blendshape_node_name, blendshape_key, value, key_time=None):
+    """
+    Set the weight value of a blendshape key (name of target-shape/morphing-target).
+
+    Args:
+        blendshape_node_name: str
+            Name of blend shape deformer (blendShape Node) in Maya.
+        blendshape_key: str
+            Blendshape key (weight name).
+        value: float
+            Weight value.
+        key_time: int or None
+            If not None, also set a keyframe of the weight value at this time.
+
+    Returns: 
+        None.
+    """
+    key_name = "{}.{}".format(blendshape_node_name, blendshape_key)
+    cmds.setAttr(key_name, value)
+
+    if key_time is not None:
+        cmds.setKeyframe(key_name, time=key_time, value=value)
+
+
 def export_blendshape_target_shapes(blendshape_node_name,
                                     mesh_node_name,
                                     save_dir='./',
                                     blendshape_keys_list=None,
                                     force_triangulate=False,
-                                    skip_existing_files=True):
+                                    skip_existing_files=True,
+                                    set_keyframe=False,
+                                    num_writer_threads=0):
     """
     Export target shapes into .obj files for a blendshape node (name of target-shapes/morphing-targets).
 
@@ -245,6 +274,18 @@ def export_blendshape_target_shapes(blendshape_node_name,
             Directory to save .obj files for all target shapes of a blendshape node.
         blendshape_keys_list: list of str or None
             List of blendshape keys  (names of target shapes) to export. If =None, export all target shapes.
+        force_triangulate: bool
+            Whether to export triangulated meshes.
+        skip_existing_files: bool
+            Whether to skip the target shapes whose .obj files are up to date,
+            i.e. their input state (blendshape key, weight and mesh vertices) and output hash
+            match those recorded in the export manifest.
+        set_keyframe: bool
+            Whether to key the weights of each exported pose on the timeline (one frame per target shape).
+            Only the weights changed between two successive poses are set (and keyed).
+        num_writer_threads: int
+            If > 0, the main thread only sets the weights and copies the vertex positions of each pose,
+            while this number of threads write the .obj files (with the cached face-index tables).
 
     Returns: 
         None.
@@ -280,92 +321,89 @@ def export_blendshape_target_shapes(blendshape_node_name,
     if need_restore < 0:
         exit()
 
-    # 1. Export the neutral pose.
-    obj_filename = osp.join(save_dir, '00_neutral.obj')
-    pprint('===> Export the neutral pose into {}.'.format(obj_filename))
-
-    curr_time = 0
-    cmds.currentTime(curr_time)
-
-    if osp.isfile(obj_filename) and skip_existing_files:
-        pprint('===> skip existing file: {}'.format(obj_filename))
-    else:
-        for k in blendshape_keys_list:
-            v = 0.
-            key_name = "{}.{}".format(blendshape_node_name, k)
-
-            cmds.setAttr(key_name, v)
-            cmds.setKeyframe(key_name)
+    # Existing files are only skipped if their input state recorded in the manifest is unchanged.
+    manifest_filename = osp.join(
+        save_dir, '{}.blendshape.{}.export_manifest.json'.format(scene_name, blendshape_node_name))
+    manifest = load_export_manifest(manifest_filename)
+    writer_pool = None
 
-        # Select Mesh before export
-        cmds.select(mesh_node_name)
+    # the settable modification is restored even if the export fails
+    try:
+        # 1. Export the neutral pose.
+        obj_filename = osp.join(save_dir, '00_neutral.obj')
+        pprint('===> Export the neutral pose into {}.'.format(obj_filename))
 
+        face_tables = None
         if force_triangulate:
             pprint('===> Force to export triangulated mesh')
-            if isinstance(mesh_node_name, list):
-                cmd = "polyTriangulate -ch 1 " + ' '.join(mesh_node_name)
-            else:
-                cmd = "polyTriangulate -ch 1 " + mesh_node_name
-
-            pprint('===> run MEL command: ')
-            pprint(cmd)
-
-            mel.eval(cmd)
 
-        cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-                    -typ "OBJexport" -pr -es " {}";""".format(obj_filename)
+        if force_triangulate or num_writer_threads > 0:
+            # Triangulate once for each mesh, without adding polyTriangulate nodes into the history.
+            face_tables = get_mesh_face_tables(mesh_node_name, triangulate=force_triangulate)
 
-        # cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-        #             -typ "OBJexport" -pr -es " {}/{}.obj";""".format(save_dir, "00_neutral")
-        pprint('===> run MEL command: ')
-        pprint(cmd)
-        mel.eval(cmd)
+        if num_writer_threads > 0:
+            writer_pool = ObjWriterPool(num_writer_threads, max_pending=4 * num_writer_threads)
 
-    # 2. Export blendshape target shapes.
-    # for curr_k in blendshape_keys_list[:5]:
-    for curr_k in blendshape_keys_list:
-        obj_filename = osp.join(save_dir, curr_k+'.obj')
+        num_poses = 0
 
-        # if not curr_k.startswith('jaw'):
-        #     continue
-        pprint('===> Export the blendshape key: {}'.format(curr_k))
-
-        curr_time += 1
+        curr_time = 0
         cmds.currentTime(curr_time)
+        key_time = curr_time if set_keyframe else None
 
-        if osp.isfile(obj_filename) and skip_existing_files:
-            pprint('===> skip existing file: {}'.format(obj_filename))
-        else:
-            for k in blendshape_keys_list:
-                v = 1.0 if curr_k == k else 0.
-                key_name = "{}.{}".format(blendshape_node_name, k)
-                cmds.setAttr(key_name, v)
-                cmds.setKeyframe(key_name)
-
-            # Select Mesh before export
-            cmds.select(mesh_node_name)
-
-            if force_triangulate:
-                pprint('===> Force to export triangulated mesh')
-                if isinstance(mesh_node_name, list):
-                    cmd = "polyTriangulate -ch 1 " + ' '.join(mesh_node_name)
-                else:
-                    cmd = "polyTriangulate -ch 1 " + mesh_node_name
-
-                pprint('===> run MEL command: ')
-                pprint(cmd)
-                mel.eval(cmd)
-
-            cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-                        -typ "OBJexport" -pr -es " {}";""".format(obj_filename)
-            # cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-            #               -typ "OBJexport" -pr -es " {}/{}.obj";""".format(save_dir, curr_k)
-            pprint('===> run MEL command: ')
-            pprint(cmd)
-            mel.eval(cmd)
-
-    if need_restore==1:
-        restore_settable_modification(restore_info)
+        # Reset all the weights once, each pose below only switches the weights that differ
+        # from the previous pose.
+        for k in blendshape_keys_list:
+            set_blendshape_weight(blendshape_node_name, k, 0., key_time)
+
+        active_key = None
+
+        export_pose_into_obj(obj_filename, mesh_node_name, manifest, '00_neutral', 0.,
+                             face_tables, skip_existing_files, writer_pool)
+
+        # 2. Export blendshape target shapes.
+        # for curr_k in blendshape_keys_list[:5]:
+        for curr_k in blendshape_keys_list:
+            obj_filename = osp.join(save_dir, curr_k+'.obj')
+
+            # if not curr_k.startswith('jaw'):
+            #     continue
+            pprint('===> Export the blendshape key: {}'.format(curr_k))
+
+            # Only move along the timeline when keying, otherwise changing time would
+            # re-evaluate (and override) the weights set below.
+            if set_keyframe:
+                curr_time += 1
+                cmds.currentTime(curr_time)
+                key_time = curr_time
+
+                # hold the weight at 0 until the previous frame
+                set_blendshape_weight(blendshape_node_name, curr_k, 0., key_time - 1)
+
+            if active_key is not None:
+                set_blendshape_weight(blendshape_node_name, active_key, 0., key_time)
+
+            set_blendshape_weight(blendshape_node_name, curr_k, 1.0, key_time)
+            active_key = curr_k
+
+            export_pose_into_obj(obj_filename, mesh_node_name, manifest, curr_k, 1.0,
+                                 face_tables, skip_existing_files, writer_pool)
+            num_poses += 1
+
+            # save the manifest now and then, so an interrupted export can be resumed
+            if num_poses % 20 == 0:
+                save_export_manifest(manifest_filename, manifest)
+    finally:
+        try:
+            if writer_pool is not None:
+                # wait for the pending files to be written
+                writer_pool.close()
+        finally:
+            pprint('\n===> save export manifest into file: ')
+            pprint(manifest_filename)
+            save_export_manifest(manifest_filename, manifest)
+
+            if need_restore==1:
+                restore_settable_modification(restore_info)
 
 
 if __name__ == '__main__':
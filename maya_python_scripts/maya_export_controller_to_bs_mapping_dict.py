@@ -11,6 +11,8 @@ import maya.cmds as cmds
 import maya.mel as mel
 from pprint import pprint
 
+from controller_bs_response import save_controller_bs_response
+
 
 def get_current_scene_name():
     """
@@ -97,7 +99,9 @@ def export_controller_to_bs_mapping(
         blendshape_node_name, 
         save_dir='./'):
     """
-    Get and save attributes list of a node.
+    Probe the blendshape weights driven by each controller attribute at the values [1, -1, 0.5, -0.5]
+    (those within its range), and save them into {scene}.{bs}.controller_to_bs_mapping_dict.json.
+    See export_controller_to_bs_response() for a dense sampling of the whole range.
 
     Args:
         controller_node_name: str
@@ -105,7 +109,7 @@ def export_controller_to_bs_mapping(
         blendshape_node_name: str
             blendshape Node Name in Maya.
         save_dir: str
-            Directory to save attributes list.
+            Directory to save the mapping dict.
 
     Returns: 
         None.
@@ -181,6 +185,193 @@ def export_controller_to_bs_mapping(
     fp.close()
 
 
+def get_attribute_range(controller_node_name, attribute, default_range=(-1.0, 1.0)):
+    """
+    Get the value range of an attribute, the missing limits are taken from default_range.
+
+    Args:
+        controller_node_name: str
+            controller Node Name in Maya.
+        attribute: str
+            Attribute name.
+        default_range: (float, float)
+            Range used if the attribute has no min/max.
+
+    Returns:
+        list of [min, max]
+    """
+    val_range = list(default_range)
+
+    if cmds.attributeQuery(attribute, node=controller_node_name, minExists=True):
+        val_range[0] = cmds.attributeQuery(attribute, node=controller_node_name, minimum=True)[0]
+    if cmds.attributeQuery(attribute, node=controller_node_name, maxExists=True):
+        val_range[1] = cmds.attributeQuery(attribute, node=controller_node_name, maximum=True)[0]
+
+    return val_range
+
+
+def get_sampling_grid(val_range, num_samples=21):
+    """
+    Get evenly spaced sample values in a range, plus the rest value 0 if it is in the range.
+
+    Args:
+        val_range: (float, float)
+            min and max values.
+        num_samples: int
+            Number of evenly spaced samples.
+
+    Returns:
+        list of float
+            Sorted sample values.
+    """
+    lo, hi = val_range
+    if num_samples < 2 or hi <= lo:
+        grid = set([lo])
+    else:
+        grid = set(lo + (hi - lo) * i / float(num_samples - 1) for i in range(num_samples))
+
+    if lo <= 0 <= hi:
+        grid.add(0.)
+
+    return sorted(grid)
+
+
+def export_controller_to_bs_response(
+        controller_node_name,
+        blendshape_node_name,
+        save_dir='./',
+        num_samples=21,
+        tolerance=1e-3,
+        zero_threshold=1e-6,
+        check_coupling=True):
+    """
+    Sample the response of blendshape weights to each controller attribute on a dense grid,
+    fit them piecewise-linearly, and save them as sparse arrays into an .npz file
+    (see controller_bs_response.py), with a report of non-linear and cross-coupled controllers.
+    This replaces the four probe values [1, -1, 0.5, -0.5] of export_controller_to_bs_mapping().
+
+    Args:
+        controller_node_name: str
+            controller Node Name in Maya.
+        blendshape_node_name: str
+            blendshape Node Name in Maya.
+        save_dir: str
+            Directory to save the .npz file and the report.
+        num_samples: int
+            Number of evenly spaced samples in the range of each controller (0 is always sampled).
+        tolerance: float
+            Max abs error of the piecewise-linear fit, and of the additive model for cross-coupling.
+        zero_threshold: float
+            Weight changes with abs value <= zero_threshold are treated as zeros.
+        check_coupling: bool
+            Whether to check the pairs of controllers driving the same blendshapes,
+            by setting both to the ends of their ranges.
+
+    Returns:
+        None.
+    """
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    attribute_name_pattern = 'CTRL*'
+    scene_name = get_current_scene_name()
+    prefix = osp.join(save_dir, '{}.{}.controller_to_bs_response'.format(scene_name, blendshape_node_name))
+
+    attributes_list = get_attributes_list(controller_node_name, attribute_name_pattern)
+    blendshape_keys_list = get_blendshape_keys_list(blendshape_node_name, sort_keys=False)
+
+    for attribute in attributes_list:
+        cmds.setAttr(controller_node_name + '.' + attribute, 0)
+
+    # getAttr returns: [tuple(weights),]
+    baseline = list(cmds.getAttr(blendshape_node_name + '.weight')[0])
+
+    def get_weight_changes():
+        bs_weights_list = cmds.getAttr(blendshape_node_name + '.weight')[0]
+        return [w - w0 for w, w0 in zip(bs_weights_list, baseline)]
+
+    pprint('===> sample {} attributes x {} values'.format(len(attributes_list), num_samples))
+
+    ranges = []
+    grids = []
+    responses = []
+    for attribute in attributes_list:
+        val_range = get_attribute_range(controller_node_name, attribute)
+        grid = get_sampling_grid(val_range, num_samples)
+
+        ctrl_responses = []
+        for val in grid:
+            cmds.setAttr(controller_node_name + '.' + attribute, val)
+            changes = get_weight_changes()
+            ctrl_responses.append(dict((b, d) for b, d in enumerate(changes) if abs(d) > zero_threshold))
+
+        cmds.setAttr(controller_node_name + '.' + attribute, 0)
+
+        ranges.append(val_range)
+        grids.append(grid)
+        responses.append(ctrl_responses)
+
+    # Check pairs of controllers driving the same blendshapes:
+    # the response to both should be the sum of the responses to each.
+    cross_coupled = []
+    if check_coupling:
+        driven_bs_list = [set(b for bs_dict in ctrl_responses for b in bs_dict) for ctrl_responses in responses]
+
+        for c1 in range(len(attributes_list)):
+            for c2 in range(c1 + 1, len(attributes_list)):
+                if not driven_bs_list[c1] & driven_bs_list[c2]:
+                    continue
+
+                max_dev = 0.
+                coupled_bs = set()
+                for s1 in set([0, len(grids[c1]) - 1]):
+                    for s2 in set([0, len(grids[c2]) - 1]):
+                        if grids[c1][s1] == 0 or grids[c2][s2] == 0:
+                            continue
+
+                        cmds.setAttr(controller_node_name + '.' + attributes_list[c1], grids[c1][s1])
+                        cmds.setAttr(controller_node_name + '.' + attributes_list[c2], grids[c2][s2])
+                        changes = get_weight_changes()
+
+                        for b, d in enumerate(changes):
+                            dev = abs(d - responses[c1][s1].get(b, 0.) - responses[c2][s2].get(b, 0.))
+                            if dev > tolerance:
+                                coupled_bs.add(blendshape_keys_list[b])
+                                max_dev = max(max_dev, dev)
+
+                cmds.setAttr(controller_node_name + '.' + attributes_list[c1], 0)
+                cmds.setAttr(controller_node_name + '.' + attributes_list[c2], 0)
+
+                if coupled_bs:
+                    cross_coupled.append([attributes_list[c1], attributes_list[c2], max_dev, sorted(coupled_bs)])
+
+    header = {
+        'controller_node': controller_node_name,
+        'blendshape_node': blendshape_node_name,
+        'controllers': attributes_list,
+        'blendshapes': blendshape_keys_list,
+        'num_samples': num_samples,
+        'tolerance': tolerance,
+        'zero_threshold': zero_threshold,
+        'cross_coupled': cross_coupled
+    }
+
+    pprint('===> save controller-to-blendshape response into file: ')
+    pprint(prefix + '.npz')
+    non_linear = save_controller_bs_response(prefix + '.npz', header, ranges, baseline, grids, responses, tolerance)
+
+    report = {
+        'non_linear_controllers': non_linear,
+        'cross_coupled_controllers': cross_coupled
+    }
+    pprint('===> {} non-linear controllers, {} cross-coupled controller pairs, see report: '.format(
+        len(non_linear), len(cross_coupled)))
+    pprint(prefix + '_report.json')
+    fp = open(prefix + '_report.json', 'w')
+    json.dump(report, fp, indent=2, sort_keys=True)
+    fp.close()
+
+
 if __name__ == '__main__':
     controller_node_name = r'Root_M'
     blendshape_node_name = r'head_lod0_mesh_blendShape'
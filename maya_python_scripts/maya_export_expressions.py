@@ -2,12 +2,27 @@
 # """
 # Export all expression in a scene/project in Maya.
 
+# export_expression_archive() writes all expressions into one archive {scene}.expressions.zip:
+#     expressions/{node}.mel: expression strings;
+#     index.json: per expression: inputs/outputs (parsed from the string, and the connected plugs),
+#                 expressions it depends on, cost estimate, driven blendShape weights;
+#                 topological order of the expressions, and per blendShape weight:
+#                 the expressions it is computed from (following the input plugs each output depends on)
+#                 and their total cost (hot path).
+# The cost estimate counts the operations (1) and function calls (4) of an expression,
+# see mel_expression_evaluator.py, which also loads the archive.
+
 # Author: Zhao Yafei (zhaoyafei0210@gmail.com)
 # """
 import os
 import os.path as osp
+import json
+import zipfile
+from collections import OrderedDict
 import maya.cmds as cmds
 from pprint import pprint
+from mel_expression_evaluator import (MelExpression, MelSyntaxError, canonical_plug_name,
+                                      get_expression_dependencies, get_expression_order)
 
 
 def get_current_scene_name():
@@ -109,6 +124,217 @@ def export_all_expressions(save_dir):
         export_expression(exp_name, save_dir)
 
 
+def get_connected_plugs(expression_node_name):
+    """
+    Get the plugs connected to the inputs and outputs of an expression node.
+
+    Returns:
+        tuple of (list of str, list of str)
+            Source plugs of the inputs, destination plugs of the outputs.
+    """
+    inputs = cmds.listConnections(expression_node_name + '.input', source=True, destination=False,
+                                  plugs=True, skipConversionNodes=True) or []
+    outputs = cmds.listConnections(expression_node_name + '.output', source=False, destination=True,
+                                   plugs=True, skipConversionNodes=True) or []
+
+    return sorted(set(inputs)), sorted(set(outputs))
+
+
+def get_driven_blendshape_weights(plugs, max_depth=8):
+    """
+    Follow the connections from plugs down to blendShape weights, through DAG node attributes (plug by plug)
+    and utility nodes (set driven keys, blendWeighted, ..., all their outputs), not through other expressions.
+
+    Args:
+        plugs: list of str
+            Driven plugs, e.g. the destination plugs of an expression.
+        max_depth: int
+            Max number of nodes between a plug and the blendShape weights.
+
+    Returns:
+        list of str
+            blendShape weight plugs.
+    """
+    node_types = {}
+
+    def get_node_type(node):
+        if node not in node_types:
+            node_types[node] = cmds.nodeType(node)
+        return node_types[node]
+
+    weights = set()
+    visited = set(plugs)
+    frontier = list(plugs)
+    for _ in range(max_depth):
+        next_plugs = []
+        for plug in frontier:
+            node = plug.split('.')[0]
+            node_type = get_node_type(node)
+            if node_type == 'blendShape':
+                weights.add(plug)
+                continue
+            elif node_type == 'expression':
+                continue
+
+            if cmds.objectType(node, isAType='dagNode'):
+                source = plug
+            else:
+                source = node
+            next_plugs.extend(cmds.listConnections(source, source=False, destination=True,
+                                                   plugs=True, skipConversionNodes=True) or [])
+
+        frontier = [plug for plug in set(next_plugs) if plug not in visited]
+        visited.update(frontier)
+        if not frontier:
+            break
+
+    return sorted(weights)
+
+
+def get_expression_graph(expression_list):
+    """
+    Parse the expressions and build their dependency graph, see the module docstring for the items.
+
+    Args:
+        expression_list: list of str
+            Expression node names.
+
+    Returns:
+        tuple of (OrderedDict, dict)
+            index (saved as index.json), and (k=expression name, v=expression string).
+    """
+    texts = {}
+    items = OrderedDict()
+    expressions = []
+    driven_weights = {}
+
+    for name in expression_list:
+        texts[name] = cmds.getAttr(name + '.expression') or ''
+        connected_inputs, connected_outputs = get_connected_plugs(name)
+
+        item = OrderedDict()
+        item['file'] = 'expressions/{}.mel'.format(name.replace(':', '_'))
+        item['connected_inputs'] = connected_inputs
+        item['connected_outputs'] = connected_outputs
+        try:
+            expression = MelExpression(texts[name], name)
+            expressions.append(expression)
+            item['inputs'] = expression.inputs
+            item['outputs'] = expression.outputs
+            item['output_dependencies'] = expression.output_dependencies
+            item['cost'] = expression.cost
+            item['parse_error'] = None
+        except MelSyntaxError as e:
+            # unsupported syntax: the dependencies are taken from the connections
+            item['inputs'] = [canonical_plug_name(plug) for plug in connected_inputs]
+            item['outputs'] = [canonical_plug_name(plug) for plug in connected_outputs]
+            item['output_dependencies'] = None
+            item['cost'] = None
+            item['parse_error'] = str(e)
+            pprint('---> failed to parse {}: {}'.format(name, e))
+            expression = MelExpression('', name)
+            expression.inputs = item['inputs']
+            expression.outputs = item['outputs']
+            expressions.append(expression)
+
+        # (k=output plug, v=blendShape weights driven by it)
+        driven_weights[name] = dict((canonical_plug_name(plug), get_driven_blendshape_weights([plug]))
+                                    for plug in connected_outputs)
+        item['driven_blendshape_weights'] = sorted(set(w for ws in driven_weights[name].values() for w in ws))
+        items[name] = item
+
+    dependencies = get_expression_dependencies(expressions)
+    order, cycles = get_expression_order(dependencies)
+    for name, deps in dependencies.items():
+        items[name]['dependencies'] = deps
+
+    writers = {}
+    for expression in expressions:
+        for plug in expression.outputs:
+            writers.setdefault(plug, []).append(expression)
+
+    upstream = {}
+
+    def get_upstream_expressions(expression, plug):
+        # the expressions evaluated for an output plug: the expression itself,
+        # and (recursively) the writers of the inputs the plug depends on
+        key = (expression.name, plug)
+        if key not in upstream:
+            upstream[key] = set([expression.name])
+            names = set([expression.name])
+            for input_plug in expression.output_dependencies.get(plug, expression.inputs):
+                for writer in writers.get(input_plug, []):
+                    if writer is not expression:
+                        names.update(get_upstream_expressions(writer, input_plug))
+            upstream[key] = names
+        return upstream[key]
+
+    blendshape_weights = {}
+    for expression in expressions:
+        for plug, weights in driven_weights[expression.name].items():
+            names = get_upstream_expressions(expression, plug if plug in expression.outputs else None)
+            for weight in weights:
+                blendshape_weights.setdefault(weight, set()).update(names)
+
+    weights_index = OrderedDict()
+    for weight in sorted(blendshape_weights):
+        names = [name for name in order if name in blendshape_weights[weight]]
+        weight_item = OrderedDict()
+        weight_item['expressions'] = names
+        weight_item['cost'] = sum(items[name]['cost'] or 0 for name in names)
+        weights_index[weight] = weight_item
+
+    index = OrderedDict()
+    index['scene_name'] = get_current_scene_name()
+    index['order'] = order
+    index['cycles'] = cycles
+    index['expressions'] = items
+    index['blendshape_weights'] = weights_index
+
+    return index, texts
+
+
+def export_expression_archive(save_dir='./'):
+    """
+    Export all expressions and their dependency graph into one archive {save_dir}/{scene}.expressions.zip,
+    see the module docstring.
+
+    Args:
+        save_dir: str
+            Directory to save the archive.
+
+    Returns:
+        str
+            Path to the archive.
+    """
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    scene_name = get_current_scene_name()
+    archive_filename = osp.join(save_dir, '{}.expressions.zip'.format(scene_name))
+
+    expression_list = get_all_expression_nodes()
+    index, texts = get_expression_graph(expression_list)
+
+    pprint('===> {} expressions, {} in dependency cycles, {} driven blendShape weights'.format(
+        len(index['order']), len(index['cycles']), len(index['blendshape_weights'])))
+
+    costs = sorted(((item['cost'] or 0, name) for name, item in index['expressions'].items()), reverse=True)
+    for cost, name in costs[:10]:
+        pprint('---> cost {}: {}'.format(cost, name))
+
+    pprint('===> save expressions archive into file: ')
+    pprint(archive_filename)
+    archive = zipfile.ZipFile(archive_filename, 'w', zipfile.ZIP_DEFLATED)
+    for name, item in index['expressions'].items():
+        archive.writestr(item['file'], texts[name].encode('utf-8'))
+    archive.writestr('index.json', json.dumps(index, indent=2).encode('utf-8'))
+    archive.close()
+
+    return archive_filename
+
+
 if __name__ == '__main__':
     save_dir = '/Users/zhaoyafei/work/maya-scripts-zyf/maya_exports/'
     export_all_expressions(save_dir)
+    export_expression_archive(save_dir)
@@ -10,6 +10,9 @@ import json
 import maya.cmds as cmds
 import maya.mel as mel
 from pprint import pprint
+
+from keyframe_weight_matrix import WeightMatrixWriter
+from maya_attr_sampler import sample_attrs
 from collections import OrderedDict
 
 
@@ -132,7 +135,9 @@ def get_blendshape_geometry_name(blendshape_node_name):
 
 def export_keyframe_blendshape_weight_values(blendshape_node_name, save_dir='./',
                                              start_frame=1, end_frame=10,
-                                             keyframe_names=None):
+                                             keyframe_names=None,
+                                             output_format='json',
+                                             sampling_mode='auto'):
     """
     Export keyframe meshes into .json files.
 
@@ -147,6 +152,14 @@ def export_keyframe_blendshape_weight_values(blendshape_node_name, save_dir='./'
             Frame Number of the end keyframe;
         keyframe_names: None or a dict. (optional)
             If a dict, elements should be (k=str(keyframe_number), v=keyframe_name).
+        output_format: str
+            'json': one .json file per frame (weights with abs value > 1e-4);
+            'raw', 'npz' or 'npz_sparse': one weight matrix file (num_frames x num_keys) per blendshape node
+            for the whole range, with the keyframe names in its header, see keyframe_weight_matrix.py.
+        sampling_mode: str
+            'auto': sample the weights without scrubbing the timeline where possible,
+            'context': never scrub the timeline, 'scrub': cmds.currentTime() for every frame,
+            see maya_attr_sampler.py.
 
     Returns: 
         None.
@@ -158,14 +171,35 @@ def export_keyframe_blendshape_weight_values(blendshape_node_name, save_dir='./'
 
     scene_name = get_current_scene_name()
 
-    if isinstance(blendshape_node_name, str):
+    if not isinstance(blendshape_node_name, list):
         blendshape_node_name = [blendshape_node_name]
 
+    # the keys do not change over frames, query them once
+    keys_dict = {}
+    for node in blendshape_node_name:
+        keys_dict[node] = get_blendshape_keys_list(node, sort_keys=False)
+
+    matrix_writers = {}
+    if output_format != 'json':
+        for node in blendshape_node_name:
+            prefix = "{}/{}.keyframe.{}".format(save_dir, scene_name, node)
+            matrix_writers[node] = WeightMatrixWriter(prefix, keys_dict[node],
+                                                      start_frame=start_frame, frame_step=1,
+                                                      matrix_format=output_format)
+            pprint('---> write weight matrix into: {}'.format(matrix_writers[node].filename))
+
+    # Sample the weights of all nodes for the whole range at once.
+    plug_names = []
+    for node in blendshape_node_name:
+        plug_names.extend('{}.{}'.format(node, k) for k in keys_dict[node])
+
+    frames, rows = sample_attrs(plug_names, start_frame, end_frame, mode=sampling_mode)
+
     # Export keyframe blendshape weight values.
-    for curr_time in range(start_frame, end_frame+1):
+    for curr_time, row in zip(frames, rows):
         pprint('===> Export at time: #{}'.format(curr_time))
-        cmds.currentTime(curr_time)
 
+        offset = 0
         for node in blendshape_node_name:
             pprint('---> blendshape: {}'.format(node))
 
@@ -178,8 +212,13 @@ def export_keyframe_blendshape_weight_values(blendshape_node_name, save_dir='./'
             # save_filename = "{}/{}.keyframe.{}.{}.json".format(
             #     save_dir, scene_name, node, frame_name)
             save_filename = "{}/arkit_{}.json".format(save_dir, frame_name)
-            blendshape_keys_list = get_blendshape_keys_list(node, sort_keys=False)
-            weight_values = cmds.getAttr(node+'.weight')[0]
+            blendshape_keys_list = keys_dict[node]
+            weight_values = row[offset:offset + len(blendshape_keys_list)]
+            offset += len(blendshape_keys_list)
+
+            if node in matrix_writers:
+                matrix_writers[node].append_frame(weight_values, frame_name)
+                continue
             # pprint(len(blendshape_keys_list))
             # pprint(len(weight_values[0]))
             # pprint(type(weight_values))
@@ -195,6 +234,9 @@ def export_keyframe_blendshape_weight_values(blendshape_node_name, save_dir='./'
             json.dump(kv_dict, fp, indent=2)
             fp.close()
 
+    for writer in matrix_writers.values():
+        writer.close()
+
 
 if __name__ == '__main__':
     save_dir = r'/Users/zhaoyafei/Downloads/bs_definition_3D_face/maya_exports'
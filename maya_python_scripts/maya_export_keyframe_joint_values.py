@@ -12,6 +12,21 @@ import maya.mel as mel
 from pprint import pprint
 from collections import OrderedDict
 
+import maya.api.OpenMaya as om
+
+from maya_attr_sampler import sample_attrs, get_plug, read_plug_matrices
+from frame_arrays import FrameArraysWriter
+
+# per-frame channels of a joint: (array name, attributes), in UI units
+JOINT_CHANNEL_ATTRS = OrderedDict([
+    ('translate', ['translateX', 'translateY', 'translateZ']),
+    ('rotate', ['rotateX', 'rotateY', 'rotateZ']),
+    ('scale', ['scaleX', 'scaleY', 'scaleZ']),
+    ('joint_orient', ['jointOrientX', 'jointOrientY', 'jointOrientZ']),
+    ('rotate_axis', ['rotateAxisX', 'rotateAxisY', 'rotateAxisZ']),
+])
+
+
 def get_current_scene_name():
     """
     Get current scene name.
@@ -80,8 +95,114 @@ def get_all_joint_nodes_under_root_joint(root_joint_node_name, show_type=True):
     return joint_nodes_list
 
 
+def get_joint_static_values(joint_nodes_list):
+    """
+    Get values of joints that are not animated, and their parents.
+
+    Args:
+        joint_nodes_list: list of str
+            Full path names of joints, parents before children.
+
+    Returns:
+        OrderedDict
+            A dict with elements (k=name, v=list of values of all joints), names:
+            parent (index of the parent joint in joint_nodes_list, or -1),
+            degreeOfFreedom, scaleCompensate, rotationOrder.
+    """
+    joint_index = dict((joint_node, i) for i, joint_node in enumerate(joint_nodes_list))
+
+    static_values = OrderedDict([
+        ('parent', []),
+        ('degreeOfFreedom', []),
+        ('scaleCompensate', []),
+        ('rotationOrder', [])
+    ])
+
+    for joint_node in joint_nodes_list:
+        parent = joint_node.rsplit('|', 1)[0]
+        static_values['parent'].append(joint_index.get(parent, -1))
+        static_values['degreeOfFreedom'].append(cmds.joint(joint_node, q=True, degreeOfFreedom=True))
+        static_values['scaleCompensate'].append(cmds.joint(joint_node, q=True, scaleCompensate=True))
+        static_values['rotationOrder'].append(cmds.joint(joint_node, q=True, rotationOrder=True))
+
+    return static_values
+
+
+def sample_joint_states(joint_nodes_list, parents, start_frame=1, end_frame=10, sampling_mode='auto'):
+    """
+    Sample channels, local and world matrices of all joints for a frame range.
+    Channels are sampled by maya_attr_sampler.sample_attrs(). For each frame, the local matrices
+    (and the parent matrices of the top joints) are read in one pass in a DG context,
+    and the world matrices are composed along the hierarchy, instead of querying each joint.
+
+    Args:
+        joint_nodes_list: list of str
+            Full path names of joints, parents before children.
+        parents: list of int
+            Index of the parent joint in joint_nodes_list, or -1, see get_joint_static_values().
+        start_frame: int
+            Frame Number of the start keyframe;
+        end_frame: int
+            Frame Number of the end keyframe;
+        sampling_mode: str
+            See maya_attr_sampler.AttrSampler. If 'scrub', the matrices are read after cmds.currentTime().
+
+    Returns:
+        tuple of (list of frame numbers, generator of dict)
+            Each dict holds flat lists of a frame: translate/rotate/scale/joint_orient/rotate_axis
+            (num_joints x 3, UI units), local_matrix/world_matrix (num_joints x 16, row-major, cm).
+    """
+    plug_names = []
+    for joint_node in joint_nodes_list:
+        for attrs in JOINT_CHANNEL_ATTRS.values():
+            plug_names.extend('{}.{}'.format(joint_node, attr) for attr in attrs)
+
+    frames, rows = sample_attrs(plug_names, start_frame, end_frame, mode=sampling_mode)
+
+    matrix_plugs = [get_plug('{}.matrix'.format(joint_node)) for joint_node in joint_nodes_list]
+    top_indices = [i for i, parent in enumerate(parents) if parent < 0]
+    parent_matrix_plugs = [get_plug('{}.parentMatrix[0]'.format(joint_nodes_list[i])) for i in top_indices]
+
+    def generate_frames():
+        curr_time = cmds.currentTime(query=True)
+        try:
+            for frame, row in zip(frames, rows):
+                if sampling_mode == 'scrub':
+                    cmds.currentTime(frame)
+                    matrices = [om.MFnMatrixData(plug.asMObject()).matrix()
+                                for plug in matrix_plugs + parent_matrix_plugs]
+                else:
+                    matrices = read_plug_matrices(matrix_plugs + parent_matrix_plugs, frame)
+
+                local_matrices = matrices[:len(matrix_plugs)]
+                world_matrices = [None] * len(local_matrices)
+                for i, parent_matrix in zip(top_indices, matrices[len(matrix_plugs):]):
+                    world_matrices[i] = local_matrices[i] * parent_matrix
+                for i, parent in enumerate(parents):
+                    if parent >= 0:
+                        world_matrices[i] = local_matrices[i] * world_matrices[parent]
+
+                frame_values = {
+                    'local_matrix': [v for m in local_matrices for v in m],
+                    'world_matrix': [v for m in world_matrices for v in m]
+                }
+
+                values = iter(row)
+                for name, attrs in JOINT_CHANNEL_ATTRS.items():
+                    frame_values[name] = [next(values) for _ in range(len(joint_nodes_list) * len(attrs))]
+
+                yield frame, frame_values
+        finally:
+            if sampling_mode == 'scrub':
+                cmds.currentTime(curr_time)
+
+    return frames, generate_frames()
+
+
 def export_keyframe_joint_values(root_joint_node_name, save_dir='./',
-                                     start_frame=1, end_frame=10):
+                                     start_frame=1, end_frame=10,
+                                     sampling_mode='auto',
+                                     output_format='json'):
     """
     Export keyframe meshes into .json files.
 
@@ -90,6 +211,19 @@ def export_keyframe_joint_values(root_joint_node_name, save_dir='./',
             Name of blendshape node;
         save_dir: str
             Directory to save .json files for weight values of a blendshape node.
+        start_frame: int
+            Frame Number of the start keyframe;
+        end_frame: int
+            Frame Number of the end keyframe;
+        sampling_mode: str
+            'auto': sample the joint values without scrubbing the timeline where possible,
+            'context': never scrub the timeline, 'scrub': cmds.currentTime() for every frame,
+            see maya_attr_sampler.py.
+        output_format: str
+            'json': one .json file per frame;
+            'raw' or 'npz': num_frames x num_joints arrays (translate, rotate, scale, joint_orient,
+            rotate_axis, local_matrix, world_matrix) for the whole range, with the joint names,
+            parents and static values in the header, see frame_arrays.py.
 
     Returns: 
         None.
@@ -110,43 +244,75 @@ def export_keyframe_joint_values(root_joint_node_name, save_dir='./',
 
     scene_name = get_current_scene_name()
 
-    # Export keyframe blendshape weight values.
-    for curr_time in range(start_frame, end_frame+1):
+    # full path names (short names may not be unique), parents before children
+    joint_paths_list = [cmds.ls(joint_node, long=True)[0] for joint_node in joint_nodes_list]
+    order = sorted(range(len(joint_paths_list)), key=lambda i: joint_paths_list[i].count('|'))
+    joint_nodes_list = [joint_nodes_list[i] for i in order]
+    joint_paths_list = [joint_paths_list[i] for i in order]
+
+    # Attributes that are not animated, read once.
+    static_values = get_joint_static_values(joint_paths_list)
+
+    frames, frame_values_iter = sample_joint_states(joint_paths_list, static_values['parent'],
+                                                    start_frame, end_frame, sampling_mode)
+
+    if output_format != 'json':
+        num_joints = len(joint_nodes_list)
+        frame_shapes = OrderedDict((name, (num_joints, len(attrs))) for name, attrs in JOINT_CHANNEL_ATTRS.items())
+        frame_shapes['local_matrix'] = (num_joints, 16)
+        frame_shapes['world_matrix'] = (num_joints, 16)
+
+        header = OrderedDict([
+            ('joints', joint_nodes_list),
+            ('joint_paths', joint_paths_list),
+            ('start_frame', start_frame),
+            ('frame_step', 1),
+            ('linear_unit', cmds.currentUnit(query=True, linear=True)),
+            ('angle_unit', cmds.currentUnit(query=True, angle=True)),
+            ('matrix_linear_unit', 'cm')
+        ])
+        header.update(static_values)
+
+        prefix = "{}/{}.keyframe.{}".format(save_dir, scene_name, 'joints')
+        pprint('===> export {} frames of {} joints into: {}.*'.format(len(frames), num_joints, prefix))
+
+        writer = FrameArraysWriter(prefix, frame_shapes, header, output_format)
+        for _, frame_values in frame_values_iter:
+            writer.append_frame(frame_values)
+        writer.close()
+
+        return
+
+    # world positions are exported in UI units as "joint -q -position"
+    linear_unit = om.MDistance.uiUnit()
+
+    # Export keyframe joint values.
+    for curr_time, frame_values in frame_values_iter:
         pprint('===> Export at time: #{}'.format(curr_time))
-        cmds.currentTime(curr_time)
 
         save_filename = "{}/{}.keyframe.{}.frame_{}.json".format(save_dir, scene_name, 'joints', curr_time)
-        
-        joints_values_dict = OrderedDict()
 
-        for joint_node in joint_nodes_list:
-            pprint('---> joint_node: {}'.format(joint_node))
+        joints_values_dict = OrderedDict()
 
-            position = cmds.joint(joint_node, q=True, position=True)
-            scale = cmds.joint(joint_node, q=True, scale=True)
-            orientation = cmds.joint(joint_node, q=True, orientation=True)
-            angle_x, angle_y, angle_z = cmds.joint(joint_node, q=True, ax=True, ay=True, az=True)
-            
-            degreeOfFreedom = cmds.joint(joint_node, q=True, degreeOfFreedom=True)
-            scaleCompensate = cmds.joint(joint_node, q=True, scaleCompensate=True)
-            rotationOrder = cmds.joint(joint_node, q=True, rotationOrder=True)
-            scaleOrientation = cmds.joint(joint_node, q=True, scaleOrientation=True)
+        for i, joint_node in enumerate(joint_nodes_list):
+            world_matrix = frame_values['world_matrix'][i * 16:(i + 1) * 16]
+            channels = dict((name, frame_values[name][i * 3:(i + 1) * 3]) for name in JOINT_CHANNEL_ATTRS)
 
             joints_values_dict[joint_node] = {
-                "position": position,
-                "scale": scale,
-                "orientation": orientation,
-                "angleX": angle_x,
-                "angleY": angle_y,
-                "angleZ": angle_z,
-                "degreeOfFreedom": degreeOfFreedom,
-                "scaleCompensate": scaleCompensate,
-                "rotationOrder": rotationOrder,
-                "scaleOrientation": scaleOrientation
+                "position": [om.MDistance(v).asUnits(linear_unit) for v in world_matrix[12:15]],
+                "scale": channels['scale'],
+                "orientation": channels['joint_orient'],
+                "angleX": channels['rotate'][0],
+                "angleY": channels['rotate'][1],
+                "angleZ": channels['rotate'][2],
+                "degreeOfFreedom": static_values['degreeOfFreedom'][i],
+                "scaleCompensate": static_values['scaleCompensate'][i],
+                "rotationOrder": static_values['rotationOrder'][i],
+                "scaleOrientation": channels['rotate_axis']
             }
 
         fp = open(save_filename, 'w')
-        json.dump(joints_values_dict, fp, indent=2)
+        json.dump(joints_values_dict, fp)
         fp.close()
 
 
@@ -11,6 +11,10 @@ import maya.cmds as cmds
 import maya.mel as mel
 from pprint import pprint
 
+from maya_mesh_export_utils import get_mesh_face_tables, get_meshes_points, get_meshes_normals, export_meshes_into_obj
+from maya_mesh_export_utils import ObjWriterPool
+from mesh_point_cache import PointCacheWriter
+
 
 def get_current_scene_name():
     """
@@ -82,8 +86,41 @@ def get_blendshape_geometry_name(blendshape_node_name):
     return geometry_list
 
 
+def append_frame_into_point_cache(cache_writer, face_tables, save_dir, scene_name):
+    """
+    Append the vertex positions of the current frame into a point cache file,
+    and write the topology .obj file for the first frame.
+
+    Args:
+        cache_writer: PointCacheWriter
+            Writer of the point cache file.
+        face_tables: OrderedDict
+            A dict with elements (k=mesh_node_name, v=face_table), see get_mesh_face_tables().
+        save_dir: str
+            Directory to save the topology .obj file.
+        scene_name: str
+            Scene name, used as the prefix of the topology .obj file.
+
+    Returns:
+        None.
+    """
+    meshes_points = get_meshes_points(list(face_tables.keys()))
+
+    if cache_writer.num_frames == 0:
+        # vertices of the topology .obj file are in the same order as the point cache
+        obj_filename = '{}/{}_topology.obj'.format(save_dir, scene_name)
+        pprint('===> export topology into: {}'.format(obj_filename))
+        export_meshes_into_obj(obj_filename, face_tables, meshes_points,
+                               get_meshes_normals(list(face_tables.keys())))
+
+    cache_writer.append_frame([p for points in meshes_points.values() for p in points])
+
+
 def export_keyframe_meshes_into_objs(mesh_node_name, save_dir='./',
-                                     start_frame=1, end_frame=10):
+                                     start_frame=1, end_frame=10,
+                                     force_triangulate=True,
+                                     num_writer_threads=0,
+                                     point_cache=False):
     """
     Export keyframe meshes into .obj files.
 
@@ -92,6 +129,19 @@ def export_keyframe_meshes_into_objs(mesh_node_name, save_dir='./',
             Name of mesh/shape in Maya;
         save_dir: str
             Directory to save .obj files for all target shapes of a blendshape node.
+        start_frame: int
+            Frame Number of the start keyframe;
+        end_frame: int
+            Frame Number of the end keyframe;
+        force_triangulate: bool
+            Whether to export triangulated meshes.
+        num_writer_threads: int
+            If > 0, the main thread only evaluates each frame and copies the vertex positions,
+            while this number of threads write the .obj files (with the cached face-index tables).
+        point_cache: bool
+            If True, write the topology into one .obj file (mesh at start_frame) and the vertex
+            positions of all frames into one point cache file (see mesh_point_cache.py),
+            instead of one .obj file per frame.
 
     Returns: 
         None.
@@ -107,27 +157,54 @@ def export_keyframe_meshes_into_objs(mesh_node_name, save_dir='./',
     if not osp.exists(save_dir):
         os.makedirs(save_dir)
 
+    writer_pool = None
+    cache_writer = None
+    if force_triangulate or num_writer_threads > 0 or point_cache:
+        # Triangulate once for each mesh, without adding polyTriangulate nodes into the history.
+        face_tables = get_mesh_face_tables(mesh_node_name, triangulate=force_triangulate)
+
+    if point_cache:
+        num_verts = sum(face_table['num_vertices'] for face_table in face_tables.values())
+        cache_filename = '{}/{}_points.pcache'.format(save_dir, scene_name)
+        pprint('===> write vertex positions of {} frames into: {}'.format(
+            end_frame - start_frame + 1, cache_filename))
+        cache_writer = PointCacheWriter(cache_filename, num_verts, start_frame=start_frame, frame_step=1)
+    elif num_writer_threads > 0:
+        writer_pool = ObjWriterPool(num_writer_threads, max_pending=4 * num_writer_threads)
+
     # Export keyframe meshes.
     for curr_time in range(start_frame, end_frame+1):
         pprint('===> Export mesh at time: #{}'.format(curr_time))
         cmds.currentTime(curr_time)
 
-        if isinstance(mesh_node_name, list):
-            cmd = "polyTriangulate -ch 1 " + ' '.join(mesh_node_name)
+        obj_filename = '{}/frame_{}.obj'.format(save_dir, curr_time)
+
+        if cache_writer is not None:
+            append_frame_into_point_cache(cache_writer, face_tables, save_dir, scene_name)
+        elif writer_pool is not None:
+            # copy the vertex positions and normals, and leave the writing to the writer threads
+            writer_pool.submit(export_meshes_into_obj, obj_filename, face_tables,
+                               get_meshes_points(mesh_node_name), get_meshes_normals(mesh_node_name))
+        elif force_triangulate:
+            # write the triangulated mesh with the cached face-index tables
+            pprint('===> export triangulated mesh into: {}'.format(obj_filename))
+            export_meshes_into_obj(obj_filename, face_tables)
         else:
-            cmd = "polyTriangulate -ch 1 " + mesh_node_name
-        pprint('===> run MEL command: ')
-        pprint(cmd)
-        mel.eval(cmd)
-
-        # obj_filename = osp.join(save_dir, curr_k+'.obj')
-        # cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
-        #               -typ "OBJexport" -pr -es " {}";""".format(obj_filename)
-        cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1" 
-                      -typ "OBJexport" -pr -es " {}/frame_{}.obj";""".format(save_dir, curr_time)
-        pprint('===> run MEL command: ')
-        pprint(cmd)
-        mel.eval(cmd)
+            # Select Mesh before export
+            cmds.select(mesh_node_name)
+
+            cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1" 
+                          -typ "OBJexport" -pr -es " {}";""".format(obj_filename)
+            pprint('===> run MEL command: ')
+            pprint(cmd)
+            mel.eval(cmd)
+
+    if writer_pool is not None:
+        # wait for the pending files to be written
+        writer_pool.close()
+
+    if cache_writer is not None:
+        cache_writer.close()
 
 
 if __name__ == '__main__':
@@ -10,7 +10,7 @@ import os
 import os.path as osp
 
 import json
-import maya.cmds
+import maya.cmds as cmds
 
 
 
@@ -76,7 +76,7 @@ def export_node_attr_list(node_name,
     print(dump_str)
 
     fn = osp.join(
-        save_dir, '{}.node_attr_list.{}.json'.format(scene_name, node))
+        save_dir, '{}.node_attr_list.{}.json'.format(scene_name, node_name))
 
     # fn = osp.join(save_dir, node_name + '_attr_list.json')
     fp = open(fn, 'w')
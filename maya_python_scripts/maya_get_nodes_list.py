@@ -10,6 +10,39 @@ import json
 import maya.cmds as cmds
 import maya.mel as mel
 from pprint import pprint
+from collections import OrderedDict
+
+
+NODE_CATEGORIES = ('transform', 'shape',
+                   'geometry', 'mesh',
+                   'blendshape', 'joint',
+                   'camera', 'light',
+                   'material', 'texture',
+                   'set', 'partition',
+                   'plane',
+                   'container')
+
+# categories derived from the inherited node types (the same nodes as listed by cmds.ls(<flag>=True))
+CATEGORY_BASE_TYPES = {
+    'transform': 'transform',
+    'shape': 'shape',
+    'geometry': 'geometryShape',
+    'mesh': 'mesh',
+    'blendshape': 'blendShape',
+    'joint': 'joint',
+    'camera': 'camera',
+    'light': 'light',
+    'set': 'objectSet',
+    'partition': 'partition',
+    'plane': 'plane',
+    'container': 'container'
+}
+
+# categories derived from the classification of the node types (cmds.getClassification())
+CATEGORY_CLASSIFICATIONS = {
+    'material': ('shader/surface', 'shader/volume', 'shader/displacement'),
+    'texture': ('texture/', )
+}
 
 
 def get_current_scene_name():
@@ -399,16 +432,108 @@ def get_all_set_nodes(show_type=True):
     return set_nodes_list
 
 
-def export_nodes_list(save_dir='./', show_type=True):
+def get_node_type_categories(node_type):
     """
-    Export differnet type of nodes.
+    Get the categories (see NODE_CATEGORIES) of a node type, from its inherited types and classification.
+
+    Args:
+        node_type: str
+            Node type name, e.g. 'mesh'.
+
+    Returns:
+        list of str
+            Categories of the node type.
+    """
+    inherited = cmds.nodeType(node_type, inherited=True, isTypeName=True) or [node_type]
+    classifications = []
+    for classification in cmds.getClassification(node_type) or []:
+        classifications.extend(classification.split(':'))
+
+    categories = []
+    for category in NODE_CATEGORIES:
+        if category in CATEGORY_BASE_TYPES:
+            if CATEGORY_BASE_TYPES[category] in inherited:
+                categories.append(category)
+        elif any(c.startswith(prefix) for c in classifications for prefix in CATEGORY_CLASSIFICATIONS[category]):
+            categories.append(category)
+
+    return categories
+
+
+def get_nodes_inventory(scene_index=None):
+    """
+    Get all nodes and their categories in one scene traversal (a single cmds.ls(long=True, showType=True)),
+    the categories of each node type are queried once.
+
+    Args:
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
+
+    Returns:
+        OrderedDict
+            'nodes': list of str, long names of all nodes;
+            'node_types': list of str, node types in the scene;
+            'types': list of int, index into node_types of every node;
+            'categories': OrderedDict, (k=category, v=list of indices into nodes, sorted by name);
+            'type_categories': dict, (k=node type, v=list of categories).
+    """
+    if scene_index is not None:
+        nodes_and_types = scene_index.get_all_nodes(show_type=True, long_names=True)
+    else:
+        nodes_and_types = cmds.ls(long=True, showType=True) or []
+    nodes = nodes_and_types[0::2]
+
+    node_types = []
+    type_index = {}
+    types = []
+    for node_type in nodes_and_types[1::2]:
+        if node_type not in type_index:
+            type_index[node_type] = len(node_types)
+            node_types.append(node_type)
+        types.append(type_index[node_type])
+
+    type_categories = dict((node_type, get_node_type_categories(node_type)) for node_type in node_types)
+
+    categories = OrderedDict((category, []) for category in NODE_CATEGORIES)
+    for type_idx, node_type in enumerate(node_types):
+        for category in type_categories[node_type]:
+            categories[category].append(type_idx)
+
+    # bucket the nodes by type once, then the types into categories
+    nodes_of_type = [[] for _ in node_types]
+    for node_idx, type_idx in enumerate(types):
+        nodes_of_type[type_idx].append(node_idx)
+
+    for category, type_indices in categories.items():
+        node_indices = [node_idx for type_idx in type_indices for node_idx in nodes_of_type[type_idx]]
+        node_indices.sort(key=lambda i: nodes[i])
+        categories[category] = node_indices
+
+    inventory = OrderedDict()
+    inventory['nodes'] = nodes
+    inventory['node_types'] = node_types
+    inventory['types'] = types
+    inventory['categories'] = categories
+    inventory['type_categories'] = type_categories
+
+    return inventory
+
+
+def export_nodes_list(save_dir='./', show_type=True, split_files=False, scene_index=None):
+    """
+    Export differnet type of nodes into one inventory file {scene}.nodes_inventory.json
+    (see get_nodes_inventory()), from a single scene traversal.
 
     Args:
         save_dir: str
-            Directory to save .obj files for all target shapes of a blendshape node.
+            Directory to save the node lists.
         show_type: boolean
-            Whether to show the node type of each shape node.
+            Whether to show the node type of each shape node in the .txt files.
             If show_type==True, every second line in the saved file shows the node type.
+        split_files: boolean
+            Whether to save the node list of every category into a .txt file as well.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         None.
@@ -426,8 +551,6 @@ def export_nodes_list(save_dir='./', show_type=True):
 
     node_types_list = get_node_types()
 
-    pprint('---> all node types:')
-    # pprint(node_types_list)
     pprint('\n===> {} node types in total'.format(len(node_types_list)))
 
     pprint('\n===> save node types into file: ')
@@ -438,54 +561,46 @@ def export_nodes_list(save_dir='./', show_type=True):
     fp.close()
 
     pprint('\n===> get all nodes')
-    nodes_list_filename = osp.join(
-        save_dir, '{}.{}_nodes.txt'.format(scene_name, 'all'))
-
-    nodes_list = get_all_nodes_list(show_type)
-
-    # for idx, node in enumerate(nodes_list):
-    #     pprint('---> {}: {}'.format(idx+1, node))
-    # pprint(nodes_list)
-
-    pprint('\n===> {} node keys in total'.format(len(nodes_list)))
-
-    pprint('\n===> save all nodes list into file: ')
-    pprint(nodes_list_filename)
-    fp = open(nodes_list_filename, 'w')
-    if len(nodes_list) > 0:
-        fp.write('\n'.join(nodes_list) + '\n')
+    inventory = get_nodes_inventory(scene_index)
+    nodes = inventory['nodes']
+    node_types = inventory['node_types']
+    types = inventory['types']
+
+    pprint('\n===> {} nodes of {} types in total'.format(len(nodes), len(node_types)))
+    for category, node_indices in inventory['categories'].items():
+        pprint('---> {}: {} nodes'.format(category, len(node_indices)))
+
+    inventory_filename = osp.join(save_dir, '{}.nodes_inventory.json'.format(scene_name))
+    pprint('\n===> save nodes inventory into file: ')
+    pprint(inventory_filename)
+    fp = open(inventory_filename, 'w')
+    json.dump(inventory, fp)
     fp.close()
 
-    node_types_list = ['transform', 'shape',
-                       'geometry', 'mesh',
-                       'blendshape', 'joint',
-                       'camera', 'light',
-                       'material', 'texture',
-                       'set', 'partition',
-                       'plane',
-                       'container'
-                       ]
-
-    for node_type in node_types_list:
-        pprint('\n===> save nodes of type {}'.format(node_type))
-        nodes_list_filename = osp.join(
-            save_dir, '{}.nodes_list.{}_nodes.txt'.format(scene_name, node_type))
+    if not split_files:
+        return
 
-        get_func_name = "get_all_{}_nodes".format(node_type)
-        nodes_list = eval(get_func_name)(show_type)
+    def write_nodes_list(filename, node_indices):
+        lines = []
+        for idx in node_indices:
+            lines.append(nodes[idx])
+            if show_type:
+                lines.append(node_types[types[idx]])
 
-        # for idx, node in enumerate(nodes_list):
-        #     pprint('---> {}: {}'.format(idx+1, node))
-        # pprint(nodes_list)
+        fp = open(filename, 'w')
+        if len(lines) > 0:
+            fp.write('\n'.join(lines) + '\n')
+        fp.close()
 
-        pprint('\n===> {} nodes in total'.format(len(nodes_list)))
+    nodes_list_filename = osp.join(
+        save_dir, '{}.{}_nodes.txt'.format(scene_name, 'all'))
+    all_indices = range(len(nodes)) if show_type else sorted(range(len(nodes)), key=lambda i: nodes[i])
+    write_nodes_list(nodes_list_filename, all_indices)
 
-        pprint('\n===> save list of nodes (type: {}) into file: '.format(node_type))
-        pprint(nodes_list_filename)
-        fp = open(nodes_list_filename, 'w')
-        if len(nodes_list) > 0:
-            fp.write('\n'.join(nodes_list) + '\n')
-        fp.close()
+    for category, node_indices in inventory['categories'].items():
+        nodes_list_filename = osp.join(
+            save_dir, '{}.nodes_list.{}_nodes.txt'.format(scene_name, category))
+        write_nodes_list(nodes_list_filename, node_indices)
 
 
 if __name__ == '__main__':
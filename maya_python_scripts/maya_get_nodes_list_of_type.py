@@ -49,13 +49,15 @@ def get_node_types():
     return node_types_list
 
 
-def get_all_nodes_list(show_type=True):
+def get_all_nodes_list(show_type=True, scene_index=None):
     """
     Get name list of all available nodes in current scene/projects. 
 
     Args:
         show_type: boolean
             Whether to show the node type of each shape node.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         list of str
@@ -64,6 +66,9 @@ def get_all_nodes_list(show_type=True):
 
     """
 
+    if scene_index is not None:
+        return scene_index.get_all_nodes(show_type=show_type)
+
     nodes_list = cmds.ls(showType=show_type)
 
     if not show_type:
@@ -72,7 +77,7 @@ def get_all_nodes_list(show_type=True):
     return nodes_list
 
 
-def get_nodes_list_of_type(node_type, show_type=True):
+def get_nodes_list_of_type(node_type, show_type=True, scene_index=None):
     """
     Get name list of all shape nodes. 
     (Shapes in Maya are selectable DAG objects that display in 3D views. 
@@ -83,6 +88,8 @@ def get_nodes_list_of_type(node_type, show_type=True):
             node type, for example: mesh, transform, texture, geometryShape, blendShape.
         show_type: boolean
             Whether to show the node type of each shape node.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         list of str
@@ -91,6 +98,9 @@ def get_nodes_list_of_type(node_type, show_type=True):
 
     """
 
+    if scene_index is not None:
+        return scene_index.get_nodes_of_type(node_type, show_type=show_type)
+
     nodes_list = cmds.ls(type=node_type, showType=show_type)
 
     if not show_type:
@@ -99,7 +109,7 @@ def get_nodes_list_of_type(node_type, show_type=True):
     return nodes_list
 
 
-def export_nodes_list(save_dir='./', show_type=True, node_types_list=None):
+def export_nodes_list(save_dir='./', show_type=True, node_types_list=None, scene_index=None):
     """
     Export nodes list of specified type.
 
@@ -109,6 +119,8 @@ def export_nodes_list(save_dir='./', show_type=True, node_types_list=None):
         show_type: boolean
             Whether to show the node type of each shape node.
             If show_type==True, every second line in the saved file shows the node type.
+        scene_index: SceneIndex or None
+            Query the scene index (see maya_scene_index.py) instead of the scene.
 
     Returns: 
         None.
@@ -141,7 +153,7 @@ def export_nodes_list(save_dir='./', show_type=True, node_types_list=None):
     nodes_list_filename = osp.join(
         save_dir, '{}.{}_nodes.txt'.format(scene_name, 'all'))
 
-    nodes_list = get_all_nodes_list(show_type)
+    nodes_list = get_all_nodes_list(show_type, scene_index)
 
     # for idx, node in enumerate(nodes_list):
     #     pprint('---> {}: {}'.format(idx+1, node))
@@ -219,7 +231,7 @@ def export_nodes_list(save_dir='./', show_type=True, node_types_list=None):
         nodes_list_filename = osp.join(
             save_dir, '{}.nodes_list_of_type.{}_nodes.txt'.format(scene_name, node_type))
 
-        nodes_list = get_nodes_list_of_type(node_type, show_type)
+        nodes_list = get_nodes_list_of_type(node_type, show_type, scene_index)
 
         # for idx, node in enumerate(nodes_list):
         #     pprint('---> {}: {}'.format(idx+1, node))
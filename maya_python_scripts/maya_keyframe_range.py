@@ -0,0 +1,81 @@
+# coding=utf-8
+# """
+# Detect the keyframe range of an imported animation clip with a single query over its animCurves.
+
+# The clip imported by load_animation_from_fbx() has its animCurves under the clip namespace: they are listed by
+# one cmds.ls() call and all their key times are read by one cmds.keyframe() call,
+# instead of counting the keys of every attribute of a node (keyframe_count - 1 is wrong for sparse keys).
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import maya.cmds as cmds
+from pprint import pprint
+
+
+def get_namespace_anim_curves(name_space):
+    """
+    Get all the animCurves under a namespace (and its nested namespaces).
+
+    Returns:
+        list of str
+    """
+    return cmds.ls('{}:*'.format(name_space), type='animCurve', recursive=True) or []
+
+
+def get_key_times(anim_curves):
+    """
+    Get the sorted unique key times of animCurves, in a single query.
+
+    Returns:
+        list of float
+    """
+    if not anim_curves:
+        return []
+
+    times = cmds.keyframe(anim_curves, query=True, timeChange=True) or []
+
+    # keys of different curves at the same frame may differ by float noise
+    return sorted(set(round(t, 6) for t in times))
+
+
+def get_keyframe_range(name_space=None, node_name=None):
+    """
+    Get the true keyframe range of an imported clip.
+
+    Args:
+        name_space: str or None
+            Namespace of the clip (returned by load_animation_from_fbx()), all its animCurves are queried.
+        node_name: str or None
+            Keyframed node, its animCurves are queried if no animCurve is found under the namespace
+            (e.g. the clip keys were merged onto the existing rig joints).
+
+    Returns:
+        tuple of (start_time, end_time, step) or None
+            start_time, end_time: first and last key time;
+            step: smallest interval between key times (the sampling step), 1 if there is a single key time.
+            Times are int when they are whole frames.
+            None if no key is found.
+    """
+    anim_curves = []
+    if name_space:
+        anim_curves = get_namespace_anim_curves(name_space)
+    if not anim_curves and node_name:
+        anim_curves = cmds.keyframe(node_name, query=True, name=True) or []
+
+    key_times = get_key_times(anim_curves)
+    if not key_times:
+        pprint('---> no keyframes found under namespace: {}, node: {}'.format(name_space, node_name))
+        return None
+
+    step = 1
+    if len(key_times) > 1:
+        step = min(t1 - t0 for t0, t1 in zip(key_times[:-1], key_times[1:]))
+
+    def to_frame(t):
+        return int(t) if t == int(t) else t
+
+    keyframe_range = (to_frame(key_times[0]), to_frame(key_times[-1]), to_frame(round(step, 6)))
+    pprint('===> {} animCurves, {} key times, keyframe range: {}'.format(
+        len(anim_curves), len(key_times), keyframe_range))
+
+    return keyframe_range
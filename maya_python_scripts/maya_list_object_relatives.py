@@ -1,25 +1,184 @@
 # coding=utf-8
 # """
-# Maya python scripts.
+# Export the DAG hierarchy of the scene (or of the selected roots) into a compact tree file.
+
+# All the long DAG paths (and node types) are listed by one cmds.ls() call,
+# the parent of every node is derived from its path string instead of calling cmds.listRelatives() for every node.
+
+# Tree file {scene}.dag_hierarchy.json:
+#     names: short names of the nodes, ordered by DAG path (every parent comes before its children);
+#     parents: index of the parent of every node, -1 for the roots (world children, or the selected roots);
+#     types: node types, type_indices: index of the type of every node.
+# Instanced nodes appear once per DAG path.
 
 # Author: Zhao Yafei (zhaoyafei0210@gmail.com)
 # """
-from __future__ import print_function
+import os
+import os.path as osp
+import json
+import time
+from collections import OrderedDict
 from maya import cmds
+from pprint import pprint
+
+
+def get_current_scene_name():
+    """
+    Get current scene name.
+
+    Args:
+        None.
+
+    Returns:
+        str
+            Scene name.
+    """
+
+    scene_name = cmds.file(query=True, sceneName=True, shortName=True)
+    scene_name = osp.splitext(scene_name)[0]
+
+    return scene_name
+
+
+def get_dag_paths(root_nodes=None):
+    """
+    Get the long DAG paths and node types of all DAG nodes, or of the root nodes and their descendants.
+
+    Args:
+        root_nodes: list of str or None
+            Root nodes, None for the whole scene.
+
+    Returns:
+        tuple of (list of str, list of str)
+            DAG paths and node types, sorted by DAG path.
+    """
+    if root_nodes:
+        nodes_list = cmds.ls(root_nodes, dag=True, long=True, showType=True) or []
+    else:
+        nodes_list = cmds.ls(dag=True, long=True, showType=True) or []
+
+    # a path sorts before the paths starting with it: parents come before their children
+    pairs = sorted(set(zip(nodes_list[0::2], nodes_list[1::2])))
+
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def get_hierarchy(dag_paths):
+    """
+    Get the parent of every node from the DAG paths.
+
+    Args:
+        dag_paths: list of str
+            Long DAG paths, e.g. ['|group1', '|group1|pSphere1', '|group1|pSphere1|pSphereShape1'].
+
+    Returns:
+        tuple of (list of str, list of int)
+            names: short names;
+            parents: index of the parent of every node in dag_paths, -1 if the parent is not in dag_paths.
+    """
+    path_indices = dict((path, idx) for idx, path in enumerate(dag_paths))
+
+    names = []
+    parents = []
+    for path in dag_paths:
+        parent_path, _, name = path.rpartition('|')
+        names.append(name)
+        parents.append(path_indices.get(parent_path, -1))
+
+    return names, parents
+
+
+def get_children_lists(parents):
+    """
+    Get the children of every node from the parent index array.
+
+    Returns:
+        list of list of int
+    """
+    children = [[] for _ in parents]
+    for idx, parent in enumerate(parents):
+        if parent >= 0:
+            children[parent].append(idx)
+
+    return children
+
+
+def get_dag_paths_from_hierarchy(names, parents):
+    """
+    Rebuild the DAG paths from a tree file (parents come before their children).
+    """
+    dag_paths = []
+    for name, parent in zip(names, parents):
+        dag_paths.append((dag_paths[parent] if parent >= 0 else '') + '|' + name)
+
+    return dag_paths
+
+
+def load_hierarchy(hierarchy_filename):
+    """
+    Load a tree file written by export_hierarchy().
+
+    Returns:
+        dict
+            See the module docstring.
+    """
+    fp = open(hierarchy_filename, 'r')
+    hierarchy = json.load(fp)
+    fp.close()
+
+    return hierarchy
+
+
+def export_hierarchy(save_dir='./', root_nodes=None):
+    """
+    Export the DAG hierarchy into {save_dir}/{scene}.dag_hierarchy.json.
+
+    Args:
+        save_dir: str
+            Directory to save the tree file.
+        root_nodes: list of str or None
+            Export only these nodes and their descendants, None for the whole scene.
+
+    Returns:
+        None.
+    """
+
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+
+    start_time = time.time()
+    pprint('===> list DAG nodes under: {}'.format(root_nodes or 'world'))
+
+    dag_paths, node_types = get_dag_paths(root_nodes)
+    names, parents = get_hierarchy(dag_paths)
+
+    types = sorted(set(node_types))
+    type_index = dict((t, idx) for idx, t in enumerate(types))
+
+    hierarchy = OrderedDict()
+    hierarchy['roots'] = [dag_paths[idx] for idx, parent in enumerate(parents) if parent < 0]
+    hierarchy['names'] = names
+    hierarchy['parents'] = parents
+    hierarchy['types'] = types
+    hierarchy['type_indices'] = [type_index[t] for t in node_types]
+
+    pprint('---> {} DAG nodes, {} roots, in {:.2f} seconds'.format(
+        len(names), len(hierarchy['roots']), time.time() - start_time))
+
+    scene_name = get_current_scene_name()
+    hierarchy_filename = osp.join(save_dir, '{}.dag_hierarchy.json'.format(scene_name))
+
+    pprint('===> save DAG hierarchy into file: ')
+    pprint(hierarchy_filename)
+    fp = open(hierarchy_filename, 'w')
+    json.dump(hierarchy, fp, separators=(',', ':'))
+    fp.close()
 
-selection = cmds.ls(selection=True)
-print('===> selection: ', selection)
 
-if len(selection) == 0:
-  selection = cmds.ls(dag=True, long=True)
+if __name__ == '__main__':
+    save_dir = r'D:/zhaoyafei/maya_exports'
 
-selection.sort(key=len, reverse=True)
-print('===> selection: ', selection)
+    selection = cmds.ls(selection=True, long=True)
+    pprint('===> selection: {}'.format(selection))
 
-for obj in selection:
-  shortName = obj.split("|")[-1]
-  # Lets create a new variable to store the relatives:
-  # We want to list the relatives, we only want the children, and we want the full path
-  children = cmds.listRelatives(obj, children=True, fullPath=True)
-  # Lets print the new variable on each iteration through the loop
-  print("---> children", children)
\ No newline at end of file
+    export_hierarchy(save_dir, root_nodes=selection or None)
@@ -79,7 +79,8 @@ def load_animation_from_fbx(fbx_path):
             Path to .fbx file.
 
     Returns: 
-        No returns.
+        name_space: str
+            Namespace of the imported nodes.
     """
     base_name = osp.splitext(osp.basename(fbx_path))[0]
     name_space = base_name.replace(' ', '_')
@@ -92,6 +93,8 @@ def load_animation_from_fbx(fbx_path):
 
     cmds.currentTime(0)
 
+    return name_space
+
 
 def export_animation_into_video(
     root_node_name,
@@ -0,0 +1,721 @@
+# coding=utf-8
+# """
+# Utils to export meshes into .obj files in Maya without touching the scene graph.
+
+# The .obj files written from the face-index tables (write_obj_file()) have one group (g) per mesh,
+# vertices (v), UVs of the current UV set (vt), per-corner normals of the pose in world space (vn) and faces (f),
+# but no materials (no .mtl file) and no smoothing groups, unlike the Maya OBJexport plugin.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import json
+import array
+import hashlib
+import shutil
+import threading
+from collections import OrderedDict
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+import maya.cmds as cmds
+import maya.mel as mel
+import maya.api.OpenMaya as om
+from pprint import pprint
+
+
+def get_mesh_fn(mesh_node_name):
+    """
+    Get the function set (MFnMesh) of a mesh.
+
+    Args:
+        mesh_node_name: str
+            Name of mesh/shape (or its transform) in Maya.
+
+    Returns:
+        maya.api.OpenMaya.MFnMesh
+    """
+    sel_list = om.MSelectionList()
+    sel_list.add(mesh_node_name)
+    dag_path = sel_list.getDagPath(0)
+
+    if not dag_path.hasFn(om.MFn.kMesh):
+        raise ValueError('{} is not a mesh'.format(mesh_node_name))
+
+    if dag_path.apiType() != om.MFn.kMesh:
+        dag_path.extendToShape()
+
+    return om.MFnMesh(dag_path)
+
+
+def get_mesh_face_table(mesh_node_name, triangulate=False):
+    """
+    Get the face-index table of a mesh.
+    The triangulation is computed from the mesh itself (MFnMesh.getPolygonTriangleVertices()),
+    so no polyTriangulate node is added into the construction history.
+    Normal ids only depend on the topology (hard/soft edges), the normals themselves are read with
+    each pose, see get_mesh_normals().
+
+    Args:
+        mesh_node_name: str
+            Name of mesh/shape in Maya.
+        triangulate: bool
+            If True, split every polygon into triangles.
+
+    Returns:
+        dict
+            'faces': list of faces, each face is a tuple of (vertex_index, uv_index, normal_index) corners,
+                uv_index is None if no UV is assigned to the corner,
+                normal_index is the index into the normals returned by get_mesh_normals().
+            'uvs': list of (u, v) of the current UV set.
+            'num_vertices': number of vertices of the mesh.
+            'triangulated': whether the polygons are split into triangles.
+    """
+    mesh_fn = get_mesh_fn(mesh_node_name)
+
+    us, vs = mesh_fn.getUVs()
+    uvs = list(zip(us, vs))
+
+    # normal ids of all the face-vertices, polygon after polygon
+    normal_counts, normal_ids = mesh_fn.getNormalIds()
+    normal_offset = 0
+
+    faces = []
+    for poly_id in range(mesh_fn.numPolygons):
+        poly_verts = list(mesh_fn.getPolygonVertices(poly_id))
+        poly_normals = list(normal_ids[normal_offset:normal_offset + normal_counts[poly_id]])
+        normal_offset += normal_counts[poly_id]
+
+        uv_ids = []
+        for i in range(len(poly_verts)):
+            try:
+                uv_ids.append(mesh_fn.getPolygonUVid(poly_id, i))
+            except RuntimeError:
+                uv_ids.append(None)
+
+        corners = list(zip(poly_verts, uv_ids, poly_normals))
+
+        if triangulate and len(poly_verts) > 3:
+            corner_dict = dict(zip(poly_verts, corners))
+            for tri_id in range(mesh_fn.polygonTriangleCount(poly_id)):
+                tri_verts = mesh_fn.getPolygonTriangleVertices(poly_id, tri_id)
+                faces.append(tuple(corner_dict[v] for v in tri_verts))
+        else:
+            faces.append(tuple(corners))
+
+    face_table = {
+        'faces': faces,
+        'uvs': uvs,
+        'num_vertices': mesh_fn.numVertices,
+        'triangulated': triangulate
+    }
+
+    return face_table
+
+
+def get_mesh_face_tables(mesh_node_name, triangulate=False):
+    """
+    Get the face-index tables of one or more meshes, computed once for each mesh.
+
+    Args:
+        mesh_node_name: str or list of str
+            Name of mesh/shape in Maya;
+        triangulate: bool
+            If True, split every polygon into triangles.
+
+    Returns:
+        OrderedDict
+            A dict with elements (k=mesh_node_name, v=face_table), see get_mesh_face_table().
+    """
+    if not isinstance(mesh_node_name, list):
+        mesh_node_name = [mesh_node_name]
+
+    face_tables = OrderedDict()
+    for mesh in mesh_node_name:
+        face_tables[mesh] = get_mesh_face_table(mesh, triangulate)
+
+    return face_tables
+
+
+def get_mesh_points(mesh_node_name):
+    """
+    Get (a copy of) vertex positions of the evaluated mesh in world space.
+
+    Args:
+        mesh_node_name: str
+            Name of mesh/shape in Maya.
+
+    Returns:
+        list of (x, y, z)
+    """
+    mesh_fn = get_mesh_fn(mesh_node_name)
+    points = mesh_fn.getPoints(om.MSpace.kWorld)
+
+    return [(p.x, p.y, p.z) for p in points]
+
+
+def get_mesh_normals(mesh_node_name):
+    """
+    Get (a copy of) the normals of the evaluated mesh in world space, indexed by the normal_index
+    of the face-index table (see get_mesh_face_table()).
+
+    Args:
+        mesh_node_name: str
+            Name of mesh/shape in Maya.
+
+    Returns:
+        list of (x, y, z)
+    """
+    mesh_fn = get_mesh_fn(mesh_node_name)
+    normals = mesh_fn.getNormals(om.MSpace.kWorld)
+
+    return [(n.x, n.y, n.z) for n in normals]
+
+
+def get_meshes_normals(mesh_node_name):
+    """
+    Get (copies of) the normals of one or more evaluated meshes in world space.
+
+    Args:
+        mesh_node_name: str or list of str
+            Name of mesh/shape in Maya;
+
+    Returns:
+        OrderedDict
+            A dict with elements (k=mesh_node_name, v=list of (x, y, z)).
+    """
+    if not isinstance(mesh_node_name, list):
+        mesh_node_name = [mesh_node_name]
+
+    meshes_normals = OrderedDict()
+    for mesh in mesh_node_name:
+        meshes_normals[mesh] = get_mesh_normals(mesh)
+
+    return meshes_normals
+
+
+def get_meshes_points(mesh_node_name):
+    """
+    Get (copies of) vertex positions of one or more evaluated meshes in world space.
+
+    Args:
+        mesh_node_name: str or list of str
+            Name of mesh/shape in Maya;
+
+    Returns:
+        OrderedDict
+            A dict with elements (k=mesh_node_name, v=list of (x, y, z)).
+    """
+    if not isinstance(mesh_node_name, list):
+        mesh_node_name = [mesh_node_name]
+
+    meshes_points = OrderedDict()
+    for mesh in mesh_node_name:
+        meshes_points[mesh] = get_mesh_points(mesh)
+
+    return meshes_points
+
+
+def replace_file(src_filename, dst_filename):
+    """
+    Move a file onto another one, replacing the destination (atomic on the same file system).
+
+    Args:
+        src_filename: str
+            Path to the source file.
+        dst_filename: str
+            Path to the destination file.
+
+    Returns:
+        None.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src_filename, dst_filename)
+    else:
+        # python 2: os.rename() can not overwrite an existing file on Windows
+        if os.name == 'nt' and osp.isfile(dst_filename):
+            os.remove(dst_filename)
+        os.rename(src_filename, dst_filename)
+
+
+def write_obj_file(obj_filename, mesh_data_list):
+    """
+    Write meshes into an .obj file (see the module docstring for what is written).
+    The file is written into a temporary file first, and then renamed,
+    so that a partially written .obj file never shows up.
+
+    Args:
+        obj_filename: str
+            Path to the .obj file.
+        mesh_data_list: list of (mesh_name, points, face_table, normals)
+            points: list of (x, y, z), see get_mesh_points();
+            face_table: see get_mesh_face_table();
+            normals: list of (x, y, z), see get_mesh_normals(), or None to write no normals.
+
+    Returns:
+        None.
+    """
+    lines = []
+    vert_offset = 1
+    uv_offset = 1
+    normal_offset = 1
+
+    for mesh_name, points, face_table, normals in mesh_data_list:
+        uvs = face_table['uvs']
+
+        lines.append('g {}'.format(mesh_name))
+        lines.extend('v %.6f %.6f %.6f' % p for p in points)
+        lines.extend('vt %.6f %.6f' % uv for uv in uvs)
+        if normals is not None:
+            lines.extend('vn %.6f %.6f %.6f' % n for n in normals)
+
+        for face in face_table['faces']:
+            corners = []
+            for vert_idx, uv_idx, normal_idx in face:
+                corner = '%d' % (vert_idx + vert_offset)
+                if uv_idx is not None:
+                    corner += '/%d' % (uv_idx + uv_offset)
+                if normals is not None:
+                    corner += ('/%d' if uv_idx is not None else '//%d') % (normal_idx + normal_offset)
+                corners.append(corner)
+            lines.append('f ' + ' '.join(corners))
+
+        vert_offset += len(points)
+        uv_offset += len(uvs)
+        if normals is not None:
+            normal_offset += len(normals)
+
+    tmp_filename = obj_filename + '.tmp'
+    fp = open(tmp_filename, 'w')
+    fp.write('\n'.join(lines) + '\n')
+    fp.close()
+
+    replace_file(tmp_filename, obj_filename)
+
+
+def export_meshes_into_obj(obj_filename, face_tables, meshes_points=None, meshes_normals=None):
+    """
+    Export the current (evaluated) state of meshes into an .obj file,
+    using their cached face-index tables.
+
+    Args:
+        obj_filename: str
+            Path to the .obj file.
+        face_tables: OrderedDict
+            A dict with elements (k=mesh_node_name, v=face_table), see get_mesh_face_tables().
+        meshes_points: OrderedDict or None
+            Vertex positions already read by get_meshes_points(). If None, read them (and the normals)
+            from the meshes.
+        meshes_normals: OrderedDict or None
+            Normals already read by get_meshes_normals(). If None and meshes_points is given, no normals
+            are written (a writer thread can not read them from Maya).
+
+    Returns:
+        None.
+    """
+    mesh_data_list = []
+    for mesh, face_table in face_tables.items():
+        if meshes_points is not None:
+            points = meshes_points[mesh]
+            normals = meshes_normals[mesh] if meshes_normals is not None else None
+        else:
+            points = get_mesh_points(mesh)
+            normals = get_mesh_normals(mesh)
+        mesh_data_list.append((mesh, points, face_table, normals))
+
+    write_obj_file(obj_filename, mesh_data_list)
+
+
+def export_meshes_into_obj_with_maya(obj_filename, mesh_node_name):
+    """
+    Export meshes into an .obj file with the Maya OBJexport plugin.
+    The files are exported into a temporary directory first, and then moved into place,
+    so that a partially written .obj file never shows up.
+
+    Args:
+        obj_filename: str
+            Path to the .obj file.
+        mesh_node_name: str or list of str
+            Name of mesh/shape in Maya;
+
+    Returns:
+        None.
+    """
+    save_dir, base_name = osp.split(osp.abspath(obj_filename))
+    tmp_dir = osp.join(save_dir, '.tmp_export')
+    if not osp.exists(tmp_dir):
+        os.makedirs(tmp_dir)
+
+    # Select Mesh before export
+    cmds.select(mesh_node_name)
+
+    cmd = """file -force -options "groups=1;ptgroups=1;materials=1;smoothing=1;normals=1"
+                -typ "OBJexport" -pr -es " {}";""".format(osp.join(tmp_dir, base_name).replace('\\', '/'))
+    pprint('===> run MEL command: ')
+    pprint(cmd)
+    mel.eval(cmd)
+
+    # the .mtl file (if any) goes first, so the .obj file only appears when everything is in place
+    mtl_name = osp.splitext(base_name)[0] + '.mtl'
+    for name in [mtl_name, base_name]:
+        if osp.isfile(osp.join(tmp_dir, name)):
+            replace_file(osp.join(tmp_dir, name), osp.join(save_dir, name))
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def compute_file_hash(filename):
+    """
+    Compute the SHA-1 hash of a file.
+
+    Args:
+        filename: str
+            Path to the file.
+
+    Returns:
+        str
+            Hex digest, or None if the file does not exist.
+    """
+    if not osp.isfile(filename):
+        return None
+
+    sha1 = hashlib.sha1()
+    fp = open(filename, 'rb')
+    for chunk in iter(lambda: fp.read(1 << 20), b''):
+        sha1.update(chunk)
+    fp.close()
+
+    return sha1.hexdigest()
+
+
+def compute_points_checksum(meshes_points):
+    """
+    Compute the checksum of vertex positions of meshes.
+
+    Args:
+        meshes_points: OrderedDict
+            A dict with elements (k=mesh_node_name, v=list of (x, y, z)), see get_meshes_points().
+
+    Returns:
+        str
+            Hex digest.
+    """
+    sha1 = hashlib.sha1()
+    for mesh, points in meshes_points.items():
+        sha1.update(mesh.encode('utf-8'))
+        # round to the precision written into .obj files
+        values = array.array('d', [round(x, 6) for p in points for x in p])
+        sha1.update(values.tobytes() if hasattr(values, 'tobytes') else values.tostring())
+
+    return sha1.hexdigest()
+
+
+def compute_input_hash(blendshape_key, weight, points_checksum, export_options=''):
+    """
+    Compute the hash of the input state of an exported target shape.
+
+    Args:
+        blendshape_key: str
+            Blendshape key (name of target shape).
+        weight: float
+            Weight value of the blendshape key.
+        points_checksum: str
+            Checksum of the mesh vertices, see compute_points_checksum().
+        export_options: str
+            Options which change the exported file, e.g. 'triangulate=1'.
+
+    Returns:
+        str
+            Hex digest.
+    """
+    input_str = '{}|{!r}|{}|{}'.format(blendshape_key, float(weight), points_checksum, export_options)
+
+    return hashlib.sha1(input_str.encode('utf-8')).hexdigest()
+
+
+# the manifest may be updated by the writer threads of ObjWriterPool
+_manifest_lock = threading.Lock()
+
+
+def load_export_manifest(manifest_filename):
+    """
+    Load the manifest of exported files.
+
+    Args:
+        manifest_filename: str
+            Path to the manifest (.json) file.
+
+    Returns:
+        dict
+            A dict with elements (k=export name, v={'filename', 'input_hash', 'output_hash'}).
+            An empty dict if the manifest does not exist or can not be parsed.
+    """
+    if not osp.isfile(manifest_filename):
+        return {}
+
+    try:
+        with open(manifest_filename, 'r') as fp:
+            manifest = json.load(fp)
+    except ValueError:
+        pprint('===> broken manifest, all files will be exported again: {}'.format(manifest_filename))
+        manifest = {}
+
+    return manifest
+
+
+def save_export_manifest(manifest_filename, manifest):
+    """
+    Save the manifest of exported files (atomically).
+
+    Args:
+        manifest_filename: str
+            Path to the manifest (.json) file.
+        manifest: dict
+            See load_export_manifest().
+
+    Returns:
+        None.
+    """
+    tmp_filename = manifest_filename + '.tmp'
+    fp = open(tmp_filename, 'w')
+    with _manifest_lock:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    fp.close()
+
+    replace_file(tmp_filename, manifest_filename)
+
+
+def is_export_up_to_date(manifest, export_name, input_hash, obj_filename):
+    """
+    Check whether an exported file is up to date:
+    its input state is unchanged and the file is the complete one recorded in the manifest.
+
+    Args:
+        manifest: dict
+            See load_export_manifest().
+        export_name: str
+            Name of the export (e.g. blendshape key).
+        input_hash: str
+            See compute_input_hash().
+        obj_filename: str
+            Path to the exported file.
+
+    Returns:
+        bool
+    """
+    with _manifest_lock:
+        entry = manifest.get(export_name)
+
+    if not entry or entry.get('input_hash') != input_hash:
+        return False
+
+    return compute_file_hash(obj_filename) == entry.get('output_hash')
+
+
+def update_export_manifest(manifest, export_name, input_hash, obj_filename):
+    """
+    Record an exported file into the manifest.
+
+    Args:
+        manifest: dict
+            See load_export_manifest().
+        export_name: str
+            Name of the export (e.g. blendshape key).
+        input_hash: str
+            See compute_input_hash().
+        obj_filename: str
+            Path to the exported file.
+
+    Returns:
+        None.
+    """
+    entry = {
+        'filename': osp.basename(obj_filename),
+        'input_hash': input_hash,
+        'output_hash': compute_file_hash(obj_filename)
+    }
+
+    with _manifest_lock:
+        manifest[export_name] = entry
+
+
+class ObjWriterPool(object):
+    """
+    A bounded pool of writer threads, so that formatting and writing files overlaps with
+    the evaluation on the Maya main thread.
+    The tasks must not call any Maya command, they only work on the data copied from Maya.
+    """
+
+    def __init__(self, num_threads=4, max_pending=16):
+        """
+        Args:
+            num_threads: int
+                Number of writer threads.
+            max_pending: int
+                Max number of queued tasks. submit() blocks when the queue is full,
+                which bounds the memory held by the copied vertex arrays.
+        """
+        self.task_queue = Queue(maxsize=max_pending)
+        self.errors = []
+        self.errors_lock = threading.Lock()
+
+        self.threads = []
+        for i in range(num_threads):
+            thread = threading.Thread(target=self._run, name='obj_writer_{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self):
+        while True:
+            task = self.task_queue.get()
+            try:
+                if task is None:
+                    return
+
+                func, args = task
+                func(*args)
+            except Exception as e:
+                with self.errors_lock:
+                    self.errors.append('{}{}: {}'.format(func.__name__, args[:1], e))
+            finally:
+                self.task_queue.task_done()
+
+    def submit(self, func, *args):
+        """
+        Queue a task func(*args), block if there are already max_pending tasks in the queue.
+        """
+        self.task_queue.put((func, args))
+
+    def close(self):
+        """
+        Wait for all the queued tasks to finish, and stop the writer threads.
+        Raise RuntimeError if any task failed.
+        """
+        for _ in self.threads:
+            self.task_queue.put(None)
+
+        for thread in self.threads:
+            thread.join()
+
+        if self.errors:
+            raise RuntimeError('{} writer tasks failed:\n{}'.format(
+                len(self.errors), '\n'.join(self.errors)))
+
+
+def write_pose_into_obj(obj_filename,
+                        meshes_points,
+                        face_tables,
+                        manifest,
+                        export_name,
+                        weight,
+                        skip_existing_files=True,
+                        meshes_normals=None):
+    """
+    Write a pose (copied vertex positions and normals) of meshes into an .obj file, and record it into the manifest.
+    This does not call any Maya command, so it can run in the writer threads of ObjWriterPool.
+
+    Args:
+        obj_filename: str
+            Path to the .obj file.
+        meshes_points: OrderedDict
+            See get_meshes_points().
+        face_tables: OrderedDict
+            See get_mesh_face_tables().
+        manifest: dict
+            See load_export_manifest().
+        export_name: str
+            Name of the export (e.g. blendshape key).
+        weight: float
+            Weight value of the blendshape key.
+        skip_existing_files: bool
+            Whether to skip up-to-date files.
+        meshes_normals: OrderedDict or None
+            See get_meshes_normals(), None to write no normals.
+
+    Returns:
+        bool
+            True if the file is (re-)exported.
+    """
+    triangulated = any(face_table['triangulated'] for face_table in face_tables.values())
+    export_options = 'writer=face_table;triangulate={};normals={}'.format(
+        int(triangulated), int(meshes_normals is not None))
+    input_hash = compute_input_hash(
+        export_name, weight, compute_points_checksum(meshes_points), export_options)
+
+    if skip_existing_files and is_export_up_to_date(manifest, export_name, input_hash, obj_filename):
+        pprint('===> skip up-to-date file: {}'.format(obj_filename))
+        return False
+
+    pprint('===> export into: {}'.format(obj_filename))
+    export_meshes_into_obj(obj_filename, face_tables, meshes_points, meshes_normals)
+    update_export_manifest(manifest, export_name, input_hash, obj_filename)
+
+    return True
+
+
+def export_pose_into_obj(obj_filename,
+                         mesh_node_name,
+                         manifest,
+                         export_name,
+                         weight,
+                         face_tables=None,
+                         skip_existing_files=True,
+                         writer_pool=None):
+    """
+    Export the current pose of meshes into an .obj file, and record it into the manifest.
+    The export is skipped if its input state (export name, weight and mesh vertices) is unchanged
+    and the existing file is the complete one recorded in the manifest.
+
+    Args:
+        obj_filename: str
+            Path to the .obj file.
+        mesh_node_name: str or list of str
+            Name of mesh/shape in Maya;
+        manifest: dict
+            See load_export_manifest().
+        export_name: str
+            Name of the export (e.g. blendshape key).
+        weight: float
+            Weight value of the blendshape key.
+        face_tables: OrderedDict or None
+            If not None, write meshes with these cached face-index tables (see get_mesh_face_tables()),
+            otherwise export with the Maya OBJexport plugin.
+        skip_existing_files: bool
+            Whether to skip up-to-date files.
+        writer_pool: ObjWriterPool or None
+            If not None (and face_tables is not None), only copy the vertex positions and normals here,
+            and leave the checking and writing to the writer threads.
+
+    Returns:
+        bool or None
+            True if the file is (re-)exported, None if it is left to the writer threads.
+    """
+    meshes_points = get_meshes_points(mesh_node_name)
+
+    if face_tables is not None:
+        meshes_normals = get_meshes_normals(list(face_tables.keys()))
+        if writer_pool is not None:
+            writer_pool.submit(write_pose_into_obj, obj_filename, meshes_points, face_tables,
+                               manifest, export_name, weight, skip_existing_files, meshes_normals)
+            return None
+
+        return write_pose_into_obj(obj_filename, meshes_points, face_tables,
+                                   manifest, export_name, weight, skip_existing_files, meshes_normals)
+
+    input_hash = compute_input_hash(
+        export_name, weight, compute_points_checksum(meshes_points), 'writer=maya')
+
+    if skip_existing_files and is_export_up_to_date(manifest, export_name, input_hash, obj_filename):
+        pprint('===> skip up-to-date file: {}'.format(obj_filename))
+        return False
+
+    pprint('===> export into: {}'.format(obj_filename))
+    export_meshes_into_obj_with_maya(obj_filename, mesh_node_name)
+    update_export_manifest(manifest, export_name, input_hash, obj_filename)
+
+    return True
@@ -0,0 +1,842 @@
+# coding=utf-8
+# """
+# Persistent scene index in a local SQLite database: nodes, types (with inherited types), DAG parent links,
+# blendShape targets and keyable attributes, so that repeated queries (node lists by type, blendshape keys,
+# attribute lists, ...) are indexed lookups instead of walks over the whole scene.
+
+# The index is built once per scene (one pass over all nodes), then kept up to date by Maya callbacks:
+#     node added/removed (MDGMessage), renamed (MNodeMessage), reparented (MDagMessage),
+#     attribute added/removed/renamed/keyable changed (MNodeMessage, on the nodes with indexed attributes).
+# Callbacks only record the changed nodes, the database is updated in one transaction on idle
+# (scriptJob idleEvent, runOnce), or before the next query (e.g. in batch mode without idle events).
+# The first update after a build marks the index dirty (the scene file on disk does not have the changes),
+# saving the scene clears it; dirty indices, or indices of a modified scene, are rebuilt when opened again.
+# Opening or creating another scene switches a tracking index to the database of that scene.
+
+# Nodes are keyed by an integer row id, parent links are row ids too, renaming or reparenting a node only updates
+# its own row. UUIDs are not unique (a file referenced or imported twice gives the same UUIDs to its nodes), a node is
+# identified by its UUID and name (and DAG path if needed) the first time it is met, then by its MObjectHandle.
+# Keyable attributes of the nodes of attribute_node_types are indexed with the scene,
+# the ones of other nodes on their first query.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import time
+import shutil
+import sqlite3
+import fnmatch
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+from pprint import pprint
+
+
+# databases of another schema version are rebuilt
+SCHEMA_VERSION = 2
+
+TABLES = ('info', 'nodes', 'type_bases', 'blendshape_targets', 'keyable_attributes')
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS nodes ('
+    '    id INTEGER PRIMARY KEY, uuid TEXT NOT NULL, name TEXT NOT NULL, type TEXT NOT NULL, dag INTEGER NOT NULL,'
+    '    parent INTEGER, attributes_indexed INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS nodes_uuid ON nodes (uuid)',
+    'CREATE INDEX IF NOT EXISTS nodes_name ON nodes (name)',
+    'CREATE INDEX IF NOT EXISTS nodes_type ON nodes (type)',
+    'CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent)',
+    'CREATE TABLE IF NOT EXISTS type_bases (type TEXT NOT NULL, base TEXT NOT NULL, PRIMARY KEY (type, base))',
+    'CREATE INDEX IF NOT EXISTS type_bases_base ON type_bases (base)',
+    'CREATE TABLE IF NOT EXISTS blendshape_targets ('
+    '    node_id INTEGER NOT NULL, idx INTEGER NOT NULL, target TEXT NOT NULL, PRIMARY KEY (node_id, idx))',
+    'CREATE TABLE IF NOT EXISTS keyable_attributes ('
+    '    node_id INTEGER NOT NULL, attribute TEXT NOT NULL, PRIMARY KEY (node_id, attribute))',
+]
+
+# attribute changes which change the indexed attributes or blendshape targets
+ATTRIBUTE_MESSAGES = (om.MNodeMessage.kAttributeAdded | om.MNodeMessage.kAttributeRemoved |
+                      om.MNodeMessage.kAttributeRenamed | om.MNodeMessage.kAttributeKeyable |
+                      om.MNodeMessage.kAttributeUnkeyable | om.MNodeMessage.kAttributeArrayAdded |
+                      om.MNodeMessage.kAttributeArrayRemoved)
+
+# SceneIndex objects tracking the scene, by database filename (running a script twice does not add callbacks)
+_tracking_indices = {}
+
+
+def get_current_scene_name():
+    """
+    Get current scene name.
+
+    Args:
+        None.
+
+    Returns:
+        str
+            Scene name.
+    """
+
+    scene_name = cmds.file(query=True, sceneName=True, shortName=True)
+    scene_name = osp.splitext(scene_name)[0]
+
+    return scene_name
+
+
+def get_scene_index_filename(save_dir='./'):
+    """
+    Get the database filename of the current scene: {save_dir}/{scene}.scene_index.sqlite
+    """
+    return osp.join(save_dir, '{}.scene_index.sqlite'.format(get_current_scene_name() or 'untitled'))
+
+
+def get_scene_file_stamp():
+    """
+    Get the path and modification time of the current scene file, to check whether an index is stale.
+    """
+    scene_filename = cmds.file(query=True, sceneName=True)
+    mtime = osp.getmtime(scene_filename) if scene_filename and osp.isfile(scene_filename) else 0
+
+    return '{}@{}'.format(scene_filename, mtime)
+
+
+class SceneIndex(object):
+    """
+    SQLite index of the current scene, see the module docstring.
+    """
+
+    def __init__(self, db_filename, attribute_node_types=('blendShape', )):
+        """
+        Args:
+            db_filename: str
+                Path to the SQLite database file, created if it does not exist.
+            attribute_node_types: tuple of str
+                Keyable attributes of the nodes of these types (and their sub-types) are indexed
+                with the scene, the ones of other nodes on their first query.
+        """
+        self.attribute_node_types = tuple(attribute_node_types or ())
+        self._open_database(db_filename)
+
+        # node ids of the nodes met so far: {MObjectHandle.hashCode(): [(MObjectHandle, node_id), ...]}
+        self.node_ids = {}
+        self.node_handles = {}
+        self.callback_ids = []
+        self.attribute_callback_ids = {}
+        # {MObjectHandle.hashCode(): [[MObjectHandle, added], ...]}, added nodes get a new row,
+        # the others are resolved to their row
+        self.dirty_nodes = {}
+        self.dirty_attributes = set()
+        self.removed_nodes = set()
+        self.rebuild_pending = False
+        self.loading_scene = False
+        self.flush_job = None
+
+    def _open_database(self, db_filename):
+        save_dir = osp.dirname(db_filename)
+        if save_dir and not osp.exists(save_dir):
+            os.makedirs(save_dir)
+
+        self.db_filename = db_filename
+        self.db = sqlite3.connect(db_filename)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            for table in TABLES:
+                self.db.execute('DROP TABLE IF EXISTS {}'.format(table))
+            self.db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+        for sql in SCHEMA:
+            self.db.execute(sql)
+        self.db.commit()
+
+        self.type_bases = {}
+        for node_type, base in self.db.execute('SELECT type, base FROM type_bases'):
+            self.type_bases.setdefault(node_type, set()).add(base)
+
+        # whether the index has changes which are not in the saved scene file
+        self.dirty = self.get_info('dirty') == '1'
+
+    def _switch_database(self, db_filename, copy=False):
+        """
+        Switch to the database of another scene, copy the current database into it if copy==True.
+        """
+        self.db.close()
+        if copy:
+            shutil.copyfile(self.db_filename, db_filename)
+
+        if _tracking_indices.get(self.db_filename) is self:
+            _tracking_indices.pop(self.db_filename)
+            _tracking_indices[db_filename] = self
+        self._open_database(db_filename)
+
+    def get_info(self, key, default=None):
+        row = self.db.execute('SELECT value FROM info WHERE key = ?', (key, )).fetchone()
+
+        return row[0] if row else default
+
+    def is_stale(self):
+        """
+        Check whether the index was built from another scene file (or another version of it),
+        or has changes which are not in the scene file, or the scene has unsaved changes.
+        """
+        return (self.get_info('dirty') == '1' or cmds.file(query=True, modified=True) or
+                self.get_info('scene_file') != get_scene_file_stamp())
+
+    def _get_type_bases(self, cursor, node_type):
+        """
+        Get the inherited types of a node type (including itself), queried once per type.
+        """
+        if node_type not in self.type_bases:
+            bases = set(cmds.nodeType(node_type, inherited=True, isTypeName=True) or []) | set([node_type])
+            cursor.executemany('INSERT OR IGNORE INTO type_bases (type, base) VALUES (?, ?)',
+                               [(node_type, base) for base in bases])
+            self.type_bases[node_type] = bases
+
+        return self.type_bases[node_type]
+
+    def _get_node_id(self, obj):
+        """
+        Get the row id of a node met before (indexed by rebuild(), flush() or _resolve_node_id()), None otherwise.
+        """
+        for handle, node_id in self.node_ids.get(om.MObjectHandle(obj).hashCode(), []):
+            if handle.isValid() and handle.object() == obj:
+                return node_id
+
+        return None
+
+    def _set_node_id(self, obj, node_id):
+        handle = om.MObjectHandle(obj)
+        self.node_ids.setdefault(handle.hashCode(), []).append((handle, node_id))
+        self.node_handles[node_id] = handle
+
+    def _pop_node_id(self, obj):
+        handles = self.node_ids.get(om.MObjectHandle(obj).hashCode(), [])
+        for i, (handle, node_id) in enumerate(handles):
+            if handle.isValid() and handle.object() == obj:
+                del handles[i]
+                self.node_handles.pop(node_id, None)
+                return node_id
+
+        return None
+
+    def _resolve_node_id(self, obj, name=None):
+        """
+        Get the row id of a node, matched by UUID, then name, then DAG path if several rows share its UUID.
+
+        Args:
+            obj: MObject
+                Node.
+            name: str or None
+                Name of the node in the index if it was just renamed, else its current name.
+
+        Returns:
+            int or None
+                None if the node is not in the index, or can not be told apart from the other nodes with its UUID.
+        """
+        node_id = self._get_node_id(obj)
+        if node_id is not None:
+            return node_id
+
+        fn = om.MFnDependencyNode(obj)
+        name = name or fn.name()
+        rows = self.db.execute('SELECT id, name FROM nodes WHERE uuid = ?', (fn.uuid().asString(), )).fetchall()
+        if len(rows) > 1:
+            rows = [row for row in rows if row[1] == name]
+        if len(rows) > 1 and obj.hasFn(om.MFn.kDagNode):
+            long_name = om.MFnDagNode(obj).fullPathName().rpartition('|')[0] + '|' + name
+            rows = [row for row, row_long_name in zip(rows, self._get_long_names([row[0] for row in rows]))
+                    if row_long_name == long_name]
+        if len(rows) != 1:
+            return None
+
+        # a row already matched to another node is not reused
+        handle = self.node_handles.get(rows[0][0])
+        if handle is not None and handle.isValid():
+            return None
+
+        self._set_node_id(obj, rows[0][0])
+
+        return rows[0][0]
+
+    def _get_node_row(self, obj):
+        fn = om.MFnDependencyNode(obj)
+        dag = obj.hasFn(om.MFn.kDagNode)
+
+        parent = None
+        if dag:
+            dag_fn = om.MFnDagNode(obj)
+            if dag_fn.parentCount() > 0:
+                parent_obj = dag_fn.parent(0)
+                if not parent_obj.hasFn(om.MFn.kWorld):
+                    parent = self._resolve_node_id(parent_obj)
+
+        return fn.uuid().asString(), fn.name(), fn.typeName, int(dag), parent
+
+    def _get_unique_name(self, obj):
+        if obj.hasFn(om.MFn.kDagNode):
+            return om.MFnDagNode(obj).fullPathName()
+
+        return om.MFnDependencyNode(obj).name()
+
+    def _index_attributes(self, cursor, obj, node_id):
+        """
+        Index the keyable attributes (and the targets of a blendShape node) of a node.
+        """
+        node_name = self._get_unique_name(obj)
+
+        cursor.execute('DELETE FROM keyable_attributes WHERE node_id = ?', (node_id, ))
+        attributes = cmds.listAttr(node_name, multi=True, keyable=True) or []
+        cursor.executemany('INSERT OR IGNORE INTO keyable_attributes (node_id, attribute) VALUES (?, ?)',
+                           [(node_id, attribute) for attribute in attributes])
+
+        if obj.hasFn(om.MFn.kBlendShape):
+            # aliasAttr returns [alias, 'weight[idx]', alias, 'weight[idx]', ...]
+            aliases = cmds.aliasAttr(node_name, query=True) or []
+            targets = []
+            for alias, attr in zip(aliases[0::2], aliases[1::2]):
+                if attr.startswith('weight['):
+                    targets.append((node_id, int(attr[len('weight['):-1]), alias))
+
+            cursor.execute('DELETE FROM blendshape_targets WHERE node_id = ?', (node_id, ))
+            cursor.executemany('INSERT OR REPLACE INTO blendshape_targets (node_id, idx, target) VALUES (?, ?, ?)',
+                               targets)
+
+        cursor.execute('UPDATE nodes SET attributes_indexed = 1 WHERE id = ?', (node_id, ))
+
+        if node_id not in self.attribute_callback_ids and self.callback_ids:
+            self._add_attribute_callback(obj, node_id)
+
+    def _need_attributes(self, node_type):
+        return bool(self.type_bases[node_type] & set(self.attribute_node_types))
+
+    def rebuild(self):
+        """
+        Rebuild the whole index from the current scene, in one pass over all the nodes.
+
+        Returns:
+            None.
+        """
+        start_time = time.time()
+        pprint('===> build scene index: {}'.format(self.db_filename))
+
+        self._remove_attribute_callbacks()
+        self.node_ids.clear()
+        self.node_handles.clear()
+        self.dirty_nodes.clear()
+        self.dirty_attributes.clear()
+        self.removed_nodes.clear()
+        self.rebuild_pending = False
+
+        cursor = self.db.cursor()
+        for table in ('nodes', 'blendshape_targets', 'keyable_attributes', 'info'):
+            cursor.execute('DELETE FROM {}'.format(table))
+
+        # ids are given before the rows are read, the parent links need the ids of all the nodes
+        objs = []
+        it = om.MItDependencyNodes()
+        while not it.isDone():
+            obj = it.thisNode()
+            objs.append(obj)
+            self._set_node_id(obj, len(objs))
+            it.next()
+
+        rows = []
+        attribute_nodes = []
+        for node_id, obj in enumerate(objs, 1):
+            row = self._get_node_row(obj)
+            rows.append((node_id, ) + row)
+            self._get_type_bases(cursor, row[2])
+            if self._need_attributes(row[2]):
+                attribute_nodes.append((obj, node_id))
+
+        cursor.executemany('INSERT INTO nodes (id, uuid, name, type, dag, parent) VALUES (?, ?, ?, ?, ?, ?)', rows)
+        for obj, node_id in attribute_nodes:
+            self._index_attributes(cursor, obj, node_id)
+
+        # built from a modified scene: the scene file does not have the indexed nodes
+        self.dirty = bool(cmds.file(query=True, modified=True))
+        cursor.executemany('INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)', [
+            ('scene_file', get_scene_file_stamp()),
+            ('build_time', str(time.time())),
+            ('dirty', str(int(self.dirty)))
+        ])
+        self.db.commit()
+
+        pprint('---> {} nodes indexed in {:.2f} seconds'.format(len(rows), time.time() - start_time))
+
+    def flush(self):
+        """
+        Write the changes recorded by the callbacks into the database, in one transaction.
+
+        Returns:
+            None.
+        """
+        self.flush_job = None
+
+        if self.rebuild_pending:
+            self.rebuild()
+            return
+
+        if not (self.dirty_nodes or self.dirty_attributes or self.removed_nodes):
+            return
+
+        cursor = self.db.cursor()
+        if not self.dirty:
+            cursor.execute('INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)', ('dirty', '1'))
+
+        for node_id in self.removed_nodes:
+            cursor.execute('DELETE FROM nodes WHERE id = ?', (node_id, ))
+            for table in ('blendshape_targets', 'keyable_attributes'):
+                cursor.execute('DELETE FROM {} WHERE node_id = ?'.format(table), (node_id, ))
+            if node_id in self.attribute_callback_ids:
+                om.MMessage.removeCallback(self.attribute_callback_ids.pop(node_id))
+
+        # added nodes get their rows first, so that the parent links of their children can be set
+        dirty_objs = {}
+        for handle, added in [item for items in self.dirty_nodes.values() for item in items]:
+            if not handle.isValid():
+                continue
+            obj = handle.object()
+            node_id = self._get_node_id(obj) if added else self._resolve_node_id(obj)
+            if node_id is None and added:
+                fn = om.MFnDependencyNode(obj)
+                cursor.execute('INSERT INTO nodes (uuid, name, type, dag) VALUES (?, ?, ?, ?)',
+                               (fn.uuid().asString(), fn.name(), fn.typeName, int(obj.hasFn(om.MFn.kDagNode))))
+                node_id = cursor.lastrowid
+                self._set_node_id(obj, node_id)
+            elif node_id is None:
+                # renamed or reparented, but several indexed nodes with its UUID match it
+                self.db.rollback()
+                self.rebuild()
+                return
+            dirty_objs[node_id] = obj
+
+        for node_id, obj in dirty_objs.items():
+            row = self._get_node_row(obj)
+            self._get_type_bases(cursor, row[2])
+            cursor.execute('UPDATE nodes SET uuid = ?, name = ?, type = ?, dag = ?, parent = ? WHERE id = ?',
+                           row + (node_id, ))
+            # an added node, or renamed/reparented: the attributes are re-indexed if they were indexed
+            if self._need_attributes(row[2]) or node_id in self.attribute_callback_ids:
+                self.dirty_attributes.add(node_id)
+
+        for node_id in self.dirty_attributes:
+            obj = dirty_objs.get(node_id)
+            if obj is None:
+                obj = self._get_node_by_id(node_id)
+
+            if obj is not None:
+                self._index_attributes(cursor, obj, node_id)
+
+        self.db.commit()
+        self.dirty = True
+
+        self.dirty_nodes.clear()
+        self.dirty_attributes.clear()
+        self.removed_nodes.clear()
+
+    def _get_node_by_id(self, node_id):
+        handle = self.node_handles.get(node_id)
+        if handle is not None and handle.isValid():
+            return handle.object()
+
+        row = self.db.execute('SELECT uuid FROM nodes WHERE id = ?', (node_id, )).fetchone()
+        if row is None:
+            return None
+
+        # all the nodes with the UUID
+        for node_name in cmds.ls(row[0], long=True) or []:
+            sel_list = om.MSelectionList()
+            sel_list.add(node_name)
+            obj = sel_list.getDependNode(0)
+            if self._resolve_node_id(obj) == node_id:
+                return obj
+
+        return None
+
+    # ---------------------------------------------------------------- callbacks
+
+    def start_tracking(self):
+        """
+        Keep the index up to date with Maya callbacks, see the module docstring.
+
+        Returns:
+            None.
+        """
+        if self.callback_ids:
+            return
+
+        self.callback_ids = [
+            om.MDGMessage.addNodeAddedCallback(self._on_node_added, 'dependNode'),
+            om.MDGMessage.addNodeRemovedCallback(self._on_node_removed, 'dependNode'),
+            om.MNodeMessage.addNameChangedCallback(om.MObject.kNullObj, self._on_name_changed),
+            om.MDagMessage.addAllDagChangesCallback(self._on_dag_changed),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, self._on_before_scene_load),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, self._on_after_scene_load),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, self._on_before_scene_load),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, self._on_after_scene_load),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterSave, self._on_after_save),
+        ]
+        self._add_attribute_callbacks()
+
+        _tracking_indices[self.db_filename] = self
+
+    def stop_tracking(self):
+        """
+        Remove all the callbacks, changes not flushed yet are written.
+
+        Returns:
+            None.
+        """
+        for callback_id in self.callback_ids:
+            om.MMessage.removeCallback(callback_id)
+        self.callback_ids = []
+        self._remove_attribute_callbacks()
+
+        if self.flush_job is not None and cmds.scriptJob(exists=self.flush_job):
+            cmds.scriptJob(kill=self.flush_job, force=True)
+        self.flush()
+
+        _tracking_indices.pop(self.db_filename, None)
+
+    def _add_attribute_callback(self, obj, node_id):
+        self.attribute_callback_ids[node_id] = om.MNodeMessage.addAttributeChangedCallback(
+            obj, self._on_attribute_changed, node_id)
+
+    def _add_attribute_callbacks(self):
+        rows = self.db.execute('SELECT id FROM nodes WHERE attributes_indexed = 1').fetchall()
+        for (node_id, ) in rows:
+            obj = self._get_node_by_id(node_id)
+            if obj is not None:
+                self._add_attribute_callback(obj, node_id)
+
+    def _remove_attribute_callbacks(self):
+        for callback_id in self.attribute_callback_ids.values():
+            om.MMessage.removeCallback(callback_id)
+        self.attribute_callback_ids.clear()
+
+    def _schedule_flush(self):
+        if self.flush_job is None and not self.loading_scene:
+            self.flush_job = cmds.scriptJob(idleEvent=self.flush, runOnce=True)
+
+    def _mark_dirty(self, obj, added=False):
+        if self.loading_scene or obj.isNull():
+            return
+
+        handle = om.MObjectHandle(obj)
+        self.dirty_nodes.setdefault(handle.hashCode(), []).append([handle, added])
+        self._schedule_flush()
+
+    def _on_node_added(self, node, client_data):
+        self._mark_dirty(node, added=True)
+
+    def _on_node_removed(self, node, client_data):
+        if self.loading_scene:
+            return
+
+        # a node added since the last flush has no row yet
+        added = False
+        items = self.dirty_nodes.get(om.MObjectHandle(node).hashCode(), [])
+        for item in list(items):
+            if item[0].isValid() and item[0].object() == node:
+                added = added or item[1]
+                items.remove(item)
+
+        node_id = self._pop_node_id(node)
+        if node_id is None and not added:
+            node_id = self._resolve_node_id(node)
+            self._pop_node_id(node)
+        if node_id is not None:
+            self.dirty_attributes.discard(node_id)
+            self.removed_nodes.add(node_id)
+        self._schedule_flush()
+
+    def _on_name_changed(self, node, prev_name, client_data):
+        if not self.loading_scene and not node.isNull() and prev_name:
+            # matched with the name in the index before it is lost
+            self._resolve_node_id(node, prev_name)
+        self._mark_dirty(node)
+
+    def _on_dag_changed(self, msg_type, child, parent, client_data):
+        self._mark_dirty(child)
+
+    def _on_attribute_changed(self, msg, plug, other_plug, node_id):
+        if msg & ATTRIBUTE_MESSAGES and not self.loading_scene:
+            self.dirty_attributes.add(node_id)
+            self._schedule_flush()
+
+    def _on_before_scene_load(self, client_data):
+        self.loading_scene = True
+
+    def _on_after_scene_load(self, client_data):
+        # the nodes of the previous scene and their callbacks are gone
+        self.loading_scene = False
+        self.attribute_callback_ids.clear()
+        self.node_ids.clear()
+        self.node_handles.clear()
+        self.dirty_nodes.clear()
+        self.dirty_attributes.clear()
+        self.removed_nodes.clear()
+        self.rebuild_pending = False
+
+        # another scene: its own database, the one of the previous scene is left as it is
+        db_filename = get_scene_index_filename(osp.dirname(self.db_filename))
+        if db_filename != self.db_filename:
+            self._switch_database(db_filename)
+
+        if self.is_stale():
+            # rebuilt on idle
+            self.rebuild_pending = True
+            self._schedule_flush()
+        else:
+            self._add_attribute_callbacks()
+
+    def _on_after_save(self, client_data):
+        if self.flush_job is not None and cmds.scriptJob(exists=self.flush_job):
+            cmds.scriptJob(kill=self.flush_job, force=True)
+        self.flush()
+
+        # saved as another scene: the index goes with it, the one of the previous scene is left as it is
+        db_filename = get_scene_index_filename(osp.dirname(self.db_filename))
+        if db_filename != self.db_filename:
+            self._switch_database(db_filename, copy=True)
+
+        # an autosave does not save the scene file itself, the scene stays modified
+        self.dirty = bool(cmds.file(query=True, modified=True))
+        self.db.executemany('INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)', [
+            ('scene_file', get_scene_file_stamp()),
+            ('dirty', str(int(self.dirty)))
+        ])
+        self.db.commit()
+
+    # ---------------------------------------------------------------- queries
+
+    def _get_long_names(self, node_ids):
+        """
+        Get the long names of nodes (DAG paths for DAG nodes), walking up the indexed parent links.
+        """
+        parents = {}
+        names = {}
+        pending = set(node_ids)
+        while pending:
+            rows = []
+            pending = list(pending)
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                rows.extend(self.db.execute(
+                    'SELECT id, name, dag, parent FROM nodes WHERE id IN ({})'.format(
+                        ', '.join('?' * len(chunk))), chunk).fetchall())
+            pending = set()
+            for node_id, name, dag, parent in rows:
+                names[node_id] = (name, dag)
+                parents[node_id] = parent
+                if parent is not None and parent not in names:
+                    pending.add(parent)
+
+        long_names = {}
+
+        def get_long_name(node_id):
+            if node_id not in long_names:
+                name, dag = names[node_id]
+                parent = parents[node_id]
+                if not dag:
+                    long_names[node_id] = name
+                elif parent is None or parent not in names:
+                    long_names[node_id] = '|' + name
+                else:
+                    long_names[node_id] = get_long_name(parent) + '|' + name
+            return long_names[node_id]
+
+        return [get_long_name(node_id) for node_id in node_ids]
+
+    def _find_node_ids(self, node_name):
+        self.flush()
+
+        short_name = node_name.split('|')[-1]
+        node_ids = [row[0] for row in self.db.execute('SELECT id FROM nodes WHERE name = ?', (short_name, ))]
+
+        if '|' in node_name and node_ids:
+            suffix = node_name if node_name.startswith('|') else '|' + node_name
+            node_ids = [node_id for node_id, long_name in zip(node_ids, self._get_long_names(node_ids))
+                        if long_name.endswith(suffix)]
+
+        return node_ids
+
+    def find_nodes(self, node_name):
+        """
+        Get the UUIDs of the nodes matching a name: short name, or (partial) DAG path like 'group1|pSphere1'.
+        The nodes of a file referenced twice share their UUIDs, the list may repeat a UUID.
+
+        Returns:
+            list of str
+        """
+        node_ids = self._find_node_ids(node_name)
+
+        uuids = dict(self.db.execute('SELECT id, uuid FROM nodes WHERE id IN ({})'.format(
+            ', '.join('?' * len(node_ids))), node_ids).fetchall()) if node_ids else {}
+
+        return [uuids[node_id] for node_id in node_ids]
+
+    def _find_node(self, node_name):
+        node_ids = self._find_node_ids(node_name)
+        if len(node_ids) != 1:
+            raise ValueError('{} nodes match the name {} in the scene index'.format(len(node_ids), node_name))
+
+        return node_ids[0]
+
+    def get_nodes_of_type(self, node_type, show_type=False, long_names=False):
+        """
+        Get the nodes of a type and its sub-types, like cmds.ls(type=node_type, showType=show_type).
+
+        Args:
+            node_type: str
+                Node type, for example: mesh, transform, geometryShape, blendShape.
+            show_type: boolean
+                If True, every second item in the list is the node type of its previous item.
+            long_names: boolean
+                Whether to return DAG paths of DAG nodes, otherwise short names (paths if not unique).
+
+        Returns:
+            list of str
+        """
+        self.flush()
+
+        rows = self.db.execute(
+            'SELECT id, name, type, dag FROM nodes WHERE type IN (SELECT type FROM type_bases WHERE base = ?)',
+            (node_type, )).fetchall()
+
+        return self._get_nodes_list(rows, show_type, long_names)
+
+    def _get_nodes_list(self, rows, show_type, long_names):
+        names = [row[1] for row in rows]
+        if long_names or any(row[3] for row in rows):
+            long_name_list = self._get_long_names([row[0] for row in rows])
+            for i, row in enumerate(rows):
+                if row[3] and (long_names or self._is_name_ambiguous(row[1])):
+                    names[i] = long_name_list[i]
+
+        order = sorted(range(len(rows)), key=lambda i: names[i])
+        if not show_type:
+            return [names[i] for i in order]
+
+        nodes_list = []
+        for i in order:
+            nodes_list.extend([names[i], rows[i][2]])
+
+        return nodes_list
+
+    def _is_name_ambiguous(self, name):
+        row = self.db.execute('SELECT COUNT(*) FROM nodes WHERE name = ?', (name, )).fetchone()
+
+        return row[0] > 1
+
+    def get_all_nodes(self, show_type=False, long_names=False):
+        """
+        Get all nodes, like cmds.ls(showType=show_type), see get_nodes_of_type().
+        """
+        self.flush()
+
+        rows = self.db.execute('SELECT id, name, type, dag FROM nodes').fetchall()
+
+        return self._get_nodes_list(rows, show_type, long_names)
+
+    def get_node_type(self, node_name):
+        """
+        Get the type of a node.
+        """
+        node_id = self._find_node(node_name)
+
+        return self.db.execute('SELECT type FROM nodes WHERE id = ?', (node_id, )).fetchone()[0]
+
+    def get_children(self, node_name, long_names=False):
+        """
+        Get the DAG children of a node.
+        """
+        node_id = self._find_node(node_name)
+        rows = self.db.execute('SELECT id, name FROM nodes WHERE parent = ?', (node_id, )).fetchall()
+        if long_names:
+            return self._get_long_names([row[0] for row in rows])
+
+        return [row[1] for row in rows]
+
+    def _ensure_attributes(self, node_id):
+        row = self.db.execute('SELECT attributes_indexed FROM nodes WHERE id = ?', (node_id, )).fetchone()
+        if row and not row[0]:
+            obj = self._get_node_by_id(node_id)
+            if obj is not None:
+                cursor = self.db.cursor()
+                self._index_attributes(cursor, obj, node_id)
+                self.db.commit()
+
+    def get_blendshape_targets(self, blendshape_node_name):
+        """
+        Get the target names (blendshape keys) of a blendShape node, in the order of weight indices.
+
+        Returns:
+            list of str
+        """
+        node_id = self._find_node(blendshape_node_name)
+        self._ensure_attributes(node_id)
+
+        return [row[0] for row in self.db.execute(
+            'SELECT target FROM blendshape_targets WHERE node_id = ? ORDER BY idx', (node_id, ))]
+
+    def get_keyable_attributes(self, node_name, attribute_name_pattern=None):
+        """
+        Get the keyable attributes of a node, like cmds.listAttr(node_name, multi=True, keyable=True).
+
+        Args:
+            node_name: str
+                Node name.
+            attribute_name_pattern: str or None
+                Wildcard pattern of the attribute names, e.g. 'CTRL*'.
+
+        Returns:
+            list of str
+        """
+        node_id = self._find_node(node_name)
+        self._ensure_attributes(node_id)
+
+        attributes = [row[0] for row in self.db.execute(
+            'SELECT attribute FROM keyable_attributes WHERE node_id = ?', (node_id, ))]
+        if attribute_name_pattern is not None:
+            attributes = [attr for attr in attributes if fnmatch.fnmatchcase(attr, attribute_name_pattern)]
+
+        return attributes
+
+    def close(self):
+        if self.callback_ids:
+            self.stop_tracking()
+        self.db.close()
+
+
+def open_scene_index(save_dir='./', track=True, attribute_node_types=('blendShape', )):
+    """
+    Open the index of the current scene, (re)built if it is new or stale.
+
+    Args:
+        save_dir: str
+            Directory of the database file, see get_scene_index_filename().
+        track: boolean
+            Whether to keep the index up to date with callbacks.
+        attribute_node_types: tuple of str
+            See SceneIndex().
+
+    Returns:
+        SceneIndex
+    """
+    db_filename = get_scene_index_filename(save_dir)
+    if db_filename in _tracking_indices:
+        return _tracking_indices[db_filename]
+
+    scene_index = SceneIndex(db_filename, attribute_node_types)
+    if scene_index.is_stale():
+        scene_index.rebuild()
+
+    if track:
+        scene_index.start_tracking()
+
+    return scene_index
+
+
+if __name__ == '__main__':
+    save_dir = r'D:/zhaoyafei/maya_exports'
+
+    scene_index = open_scene_index(save_dir)
+    pprint(scene_index.get_nodes_of_type('blendShape'))
@@ -0,0 +1,173 @@
+# coding=utf-8
+# """
+# Reset the rig scene to a clean state between clips in the batch converters.
+
+# Every clip imported by load_animation_from_fbx() adds a skeleton and animCurves under a new namespace
+# (and may connect animCurves to the existing rig joints), so without a reset every clip makes the scene,
+# its memory and its evaluation time grow.
+
+# Two reset modes:
+#     'delete': delete every node created since get_scene_state() (found by UUID), restore the values of the rig
+#         attributes these nodes were driving, remove the clip namespace and flush the undo queue;
+#     'reopen': reopen the template scene file (slower, but also discards any other change made to the rig).
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import time
+import maya.cmds as cmds
+
+
+RESET_MODES = ('delete', 'reopen')
+
+
+def get_scene_state(node_type='transform'):
+    """
+    Get the clean state of the rig scene, before importing any clip.
+
+    Args:
+        node_type: str or list of str
+            Type of the nodes whose keyable attribute values are restored by reset_scene(), joints are transforms.
+
+    Returns:
+        dict
+            'scene_file': path to the scene file;
+            'uuids': set of the UUIDs of all the nodes;
+            'values': dict (k=long plug name, v=value) of the keyable scalar attributes.
+    """
+    values = {}
+    for node_name in cmds.ls(type=node_type, long=True) or []:
+        for attr in cmds.listAttr(node_name, keyable=True, scalar=True) or []:
+            plug_name = node_name + '.' + attr
+            try:
+                values[plug_name] = cmds.getAttr(plug_name)
+            except (RuntimeError, ValueError):
+                continue
+
+    return {
+        'scene_file': cmds.file(query=True, sceneName=True),
+        'uuids': set(cmds.ls(uuid=True) or []),
+        'values': values
+    }
+
+
+def get_new_nodes(scene_state):
+    """
+    Get the nodes created since get_scene_state().
+
+    Returns:
+        list of str
+            Long node names.
+    """
+    new_uuids = [uuid for uuid in cmds.ls(uuid=True) or [] if uuid not in scene_state['uuids']]
+    if not new_uuids:
+        return []
+
+    return cmds.ls(new_uuids, long=True) or []
+
+
+def get_driven_plugs(new_nodes):
+    """
+    Get the plugs of the rig (nodes not in new_nodes) driven by the new nodes, e.g. joints keyed by imported animCurves.
+
+    Returns:
+        list of str
+            Long plug names.
+    """
+    connections = cmds.listConnections(new_nodes, plugs=True, connections=True,
+                                       source=False, destination=True) or []
+
+    new_node_set = set(new_nodes)
+    driven_plugs = set()
+    for dst_plug in connections[1::2]:
+        node_name, _, attr = dst_plug.partition('.')
+        long_names = cmds.ls(node_name, long=True) or []
+        if long_names and long_names[0] not in new_node_set:
+            driven_plugs.add(long_names[0] + '.' + attr)
+
+    return sorted(driven_plugs)
+
+
+def delete_nodes(node_names):
+    """
+    Delete nodes, one by one for the nodes that can not be deleted in a single call (e.g. locked or default nodes).
+
+    Returns:
+        int
+            Number of nodes which could not be deleted.
+    """
+    # deleting a DAG parent deletes its children too
+    node_names = cmds.ls(node_names, long=True) or []
+    if not node_names:
+        return 0
+
+    try:
+        cmds.delete(node_names)
+        return 0
+    except (RuntimeError, ValueError):
+        pass
+
+    num_failed = 0
+    for node_name in node_names:
+        if not cmds.objExists(node_name):
+            continue
+        try:
+            cmds.delete(node_name)
+        except (RuntimeError, ValueError):
+            num_failed += 1
+
+    return num_failed
+
+
+def reset_scene(scene_state, name_space=None, mode='delete'):
+    """
+    Reset the rig scene to the state returned by get_scene_state().
+
+    Args:
+        scene_state: dict
+            Returned by get_scene_state().
+        name_space: str or None
+            Namespace of the clip, returned by load_animation_from_fbx().
+        mode: str
+            'delete' or 'reopen', see the module docstring.
+
+    Returns:
+        dict
+            'mode', 'seconds', and for mode 'delete': 'deleted_nodes', 'undeletable_nodes', 'restored_plugs'.
+    """
+    if mode not in RESET_MODES:
+        raise ValueError('Unknown reset mode: {}, should be in {}'.format(mode, RESET_MODES))
+
+    start_time = time.time()
+    stats = {'mode': mode}
+
+    if mode == 'reopen':
+        cmds.file(scene_state['scene_file'], open=True, force=True)
+    else:
+        new_nodes = get_new_nodes(scene_state)
+        driven_plugs = get_driven_plugs(new_nodes) if new_nodes else []
+
+        stats['undeletable_nodes'] = delete_nodes(new_nodes)
+        stats['deleted_nodes'] = len(new_nodes) - stats['undeletable_nodes']
+
+        num_restored = 0
+        for plug_name in driven_plugs:
+            if plug_name not in scene_state['values']:
+                continue
+            try:
+                cmds.setAttr(plug_name, scene_state['values'][plug_name])
+                num_restored += 1
+            except RuntimeError:
+                # locked, or still connected
+                continue
+        stats['restored_plugs'] = num_restored
+
+        if name_space and cmds.namespace(exists=name_space):
+            cmds.namespace(removeNamespace=name_space, deleteNamespaceContent=True)
+
+        cmds.flushUndo()
+
+    cmds.currentTime(0)
+    stats['seconds'] = time.time() - start_time
+
+    return stats
+
@@ -0,0 +1,374 @@
+# coding=utf-8
+# """
+# Split the frame range of a keyframe export into shards, run each shard in its own mayapy
+# process on the same scene, and merge the outputs of all shards into one output set.
+
+# Launcher (plain python, outside Maya):
+#     python maya_sharded_frame_export.py scene.mb --task meshes --start-frame 1 --end-frame 5000
+#         --save-dir ./maya_exports --num-workers 16 --task-kwargs '{"mesh_node_name": "Head01Shape"}'
+# Worker (started by the launcher):
+#     mayapy maya_sharded_frame_export.py --worker <shard_dir>/job.json
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+from __future__ import print_function
+import os
+import os.path as osp
+import sys
+import json
+import time
+import shutil
+import argparse
+import traceback
+import subprocess
+from pprint import pprint
+
+from mesh_point_cache import merge_point_caches
+from keyframe_weight_matrix import merge_weight_matrices
+
+
+# task name: (module name, export function name)
+# the export function is called as func(save_dir=..., start_frame=..., end_frame=..., **task_kwargs)
+SHARD_TASKS = {
+    'meshes': ('maya_export_keyframe_meshes_to_objs', 'export_keyframe_meshes_into_objs'),
+    'meshes_with_names': ('maya_export_keyframe_meshes_to_objs_with_names', 'export_keyframe_meshes_into_objs'),
+    'blendshape_weights': ('maya_export_keyframe_blendshape_weight_values', 'export_keyframe_blendshape_weight_values'),
+    'blendshape_weights_with_names': ('maya_export_keyframe_blendshape_weight_values_with_names',
+                                      'export_keyframe_blendshape_weight_values'),
+}
+
+
+def split_frame_range(start_frame, end_frame, num_shards=None, frames_per_shard=None):
+    """
+    Split a frame range into contiguous shards.
+
+    Args:
+        start_frame: int
+            Frame Number of the start keyframe;
+        end_frame: int
+            Frame Number of the end keyframe (included);
+        num_shards: int or None
+            Number of shards, used if frames_per_shard is None.
+        frames_per_shard: int or None
+            Number of frames per shard (the last shard may be shorter).
+
+    Returns:
+        list of (shard_start_frame, shard_end_frame)
+    """
+    num_frames = end_frame - start_frame + 1
+    if num_frames <= 0:
+        return []
+
+    if not frames_per_shard:
+        num_shards = max(1, min(num_shards or 1, num_frames))
+        frames_per_shard = (num_frames + num_shards - 1) // num_shards
+
+    shards = []
+    for shard_start in range(start_frame, end_frame + 1, frames_per_shard):
+        shards.append((shard_start, min(shard_start + frames_per_shard - 1, end_frame)))
+
+    return shards
+
+
+def is_shard_done(shard_dir, job):
+    """
+    Check whether a shard was already exported by the same job (e.g. before the launcher was interrupted).
+    """
+    done_filename = osp.join(shard_dir, 'done.json')
+    if not osp.isfile(done_filename):
+        return False
+
+    fp = open(done_filename, 'r')
+    try:
+        done = json.load(fp)
+    except ValueError:
+        return False
+    finally:
+        fp.close()
+
+    return done.get('job') == job
+
+
+def run_worker(job_filename):
+    """
+    Export a shard in mayapy: open the scene, call the export function of the task
+    for the frame range of the shard, and write done.json into the shard directory.
+
+    Args:
+        job_filename: str
+            Path to the job.json written by the launcher.
+
+    Returns:
+        None.
+    """
+    fp = open(job_filename, 'r')
+    job = json.load(fp)
+    fp.close()
+
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+
+    import maya.cmds as cmds
+    import importlib
+
+    # the non-triangulated path of the mesh exporters uses the OBJexport file translator
+    cmds.loadPlugin('objExport', quiet=True)
+
+    pprint('===> open scene: {}'.format(job['scene_file']))
+    cmds.file(job['scene_file'], open=True, force=True)
+
+    module_name, func_name = SHARD_TASKS[job['task']]
+    export_func = getattr(importlib.import_module(module_name), func_name)
+
+    start_time = time.time()
+    export_func(save_dir=job['shard_dir'],
+                start_frame=job['start_frame'],
+                end_frame=job['end_frame'],
+                **job['task_kwargs'])
+
+    done = {
+        'job': job,
+        'seconds': time.time() - start_time
+    }
+    fp = open(osp.join(job['shard_dir'], 'done.json'), 'w')
+    json.dump(done, fp, indent=2)
+    fp.close()
+
+    try:
+        maya.standalone.uninitialize()
+    except AttributeError:
+        pass
+
+
+def merge_shard_outputs(shard_dir_list, save_dir):
+    """
+    Merge the outputs of shards into save_dir, in shard (frame) order:
+        - point caches (*.pcache) are concatenated;
+        - frame name lists (*_frame_names.json) are concatenated;
+        - weight matrices (*.weights.f32 with its .weights.json header, *.weights.npz) are concatenated;
+        - topology .obj files (*_topology.obj) are taken from the first shard;
+        - any other file (one file per frame) is moved to the same relative path.
+
+    Args:
+        shard_dir_list: list of str
+            Output directories of the shards, in frame order.
+        save_dir: str
+            Directory of the merged outputs.
+
+    Returns:
+        None.
+    """
+    # relative path: list of shard files, in shard order
+    merge_dict = {}
+    for shard_dir in shard_dir_list:
+        for root, _, filenames in os.walk(shard_dir):
+            for fn in sorted(filenames):
+                rel_path = osp.relpath(osp.join(root, fn), shard_dir)
+                if rel_path in ('job.json', 'done.json', 'worker.log'):
+                    continue
+                merge_dict.setdefault(rel_path, []).append(osp.join(root, fn))
+
+    for rel_path in sorted(merge_dict.keys()):
+        shard_filenames = merge_dict[rel_path]
+        save_filename = osp.join(save_dir, rel_path)
+        if not osp.isdir(osp.dirname(save_filename)):
+            os.makedirs(osp.dirname(save_filename))
+
+        if rel_path.endswith('.weights.json') and rel_path[:-len('.json')] + '.f32' in merge_dict:
+            # header of a raw weight matrix, merged with the matrix
+            continue
+        elif rel_path.endswith('.weights.f32') or rel_path.endswith('.weights.npz'):
+            pprint('===> merge {} weight matrices into: {}'.format(len(shard_filenames), save_filename))
+            merge_weight_matrices(shard_filenames, save_filename)
+        elif rel_path.endswith('.pcache'):
+            pprint('===> merge {} point caches into: {}'.format(len(shard_filenames), save_filename))
+            merge_point_caches(shard_filenames, save_filename)
+        elif rel_path.endswith('_frame_names.json'):
+            frame_names = []
+            for fn in shard_filenames:
+                fp = open(fn, 'r')
+                frame_names.extend(json.load(fp))
+                fp.close()
+
+            fp = open(save_filename, 'w')
+            json.dump(frame_names, fp, indent=2)
+            fp.close()
+        else:
+            # per-frame files are unique across shards, topology files are identical
+            if len(shard_filenames) > 1 and not rel_path.endswith('_topology.obj'):
+                pprint('---> {} is exported by {} shards, keep the first one'.format(
+                    rel_path, len(shard_filenames)))
+            if osp.isfile(save_filename):
+                os.remove(save_filename)
+            shutil.move(shard_filenames[0], save_filename)
+
+
+def run_sharded_export(scene_file, task, save_dir, start_frame, end_frame,
+                       task_kwargs=None, num_workers=4, frames_per_shard=None,
+                       mayapy=None, max_retries=2, keep_shards=False):
+    """
+    Export a frame range in parallel mayapy processes, and merge the outputs.
+
+    Args:
+        scene_file: str
+            Path to the Maya scene file, opened by every worker.
+        task: str
+            One of SHARD_TASKS.
+        save_dir: str
+            Directory to save the merged outputs, as save_dir of the export function.
+        start_frame: int
+            Frame Number of the start keyframe;
+        end_frame: int
+            Frame Number of the end keyframe;
+        task_kwargs: dict or None
+            Other (json serializable) arguments of the export function,
+            e.g. {'mesh_node_name': 'Head01Shape', 'point_cache': True}.
+        num_workers: int
+            Number of mayapy processes running at the same time.
+        frames_per_shard: int or None
+            Number of frames per shard. If None, split the range into num_workers shards.
+            Smaller shards balance the load better and are cheaper to retry,
+            but every shard pays the time to start mayapy and open the scene.
+        mayapy: str or None
+            Path to mayapy. If None, use env MAYAPY, or 'mayapy' in PATH.
+        max_retries: int
+            Max number of times a failed shard is restarted.
+        keep_shards: bool
+            Whether to keep the shard directories after merging.
+
+    Returns:
+        None.
+    """
+    if task not in SHARD_TASKS:
+        raise ValueError('unknown task: {}, expect one of {}'.format(task, sorted(SHARD_TASKS.keys())))
+
+    if task_kwargs is None:
+        task_kwargs = {}
+
+    if mayapy is None:
+        mayapy = os.environ.get('MAYAPY', 'mayapy')
+
+    scene_file = osp.abspath(scene_file)
+    save_dir = osp.abspath(save_dir)
+    scene_name = osp.splitext(osp.basename(scene_file))[0]
+
+    shards = split_frame_range(start_frame, end_frame, num_workers, frames_per_shard)
+    pprint('===> {} frames, {} shards, {} workers'.format(end_frame - start_frame + 1, len(shards), num_workers))
+
+    shards_root = osp.join(save_dir, '.shards', '{}_{}'.format(scene_name, task))
+
+    # shard index: (job, attempts)
+    pending = []
+    shard_dir_list = []
+    for shard_idx, (shard_start, shard_end) in enumerate(shards):
+        shard_dir = osp.join(shards_root, 'shard_{:04d}_{}_{}'.format(shard_idx, shard_start, shard_end))
+        shard_dir_list.append(shard_dir)
+
+        job = {
+            'scene_file': scene_file,
+            'task': task,
+            'task_kwargs': task_kwargs,
+            'shard_dir': shard_dir,
+            'start_frame': shard_start,
+            'end_frame': shard_end
+        }
+
+        if is_shard_done(shard_dir, job):
+            pprint('---> shard #{} (frames {}-{}) is already exported'.format(shard_idx, shard_start, shard_end))
+            continue
+
+        pending.append((shard_idx, job, 0))
+
+    script_filename = osp.abspath(__file__)
+    running = {}
+    failed = []
+
+    while pending or running:
+        while pending and len(running) < num_workers:
+            shard_idx, job, attempts = pending.pop(0)
+
+            # start a retry from a clean directory
+            if osp.isdir(job['shard_dir']):
+                shutil.rmtree(job['shard_dir'])
+            os.makedirs(job['shard_dir'])
+
+            job_filename = osp.join(job['shard_dir'], 'job.json')
+            fp = open(job_filename, 'w')
+            json.dump(job, fp, indent=2)
+            fp.close()
+
+            log_fp = open(osp.join(job['shard_dir'], 'worker.log'), 'w')
+            proc = subprocess.Popen([mayapy, script_filename, '--worker', job_filename],
+                                    stdout=log_fp, stderr=subprocess.STDOUT,
+                                    cwd=osp.dirname(script_filename))
+            running[shard_idx] = (proc, log_fp, job, attempts, time.time())
+            pprint('===> start shard #{} (frames {}-{}), attempt #{}'.format(
+                shard_idx, job['start_frame'], job['end_frame'], attempts + 1))
+
+        time.sleep(1)
+
+        for shard_idx in sorted(running.keys()):
+            proc, log_fp, job, attempts, shard_start_time = running[shard_idx]
+            if proc.poll() is None:
+                continue
+
+            log_fp.close()
+            del running[shard_idx]
+
+            if proc.returncode == 0 and is_shard_done(job['shard_dir'], job):
+                pprint('===> shard #{} finished in {:.1f} seconds'.format(shard_idx, time.time() - shard_start_time))
+            elif attempts < max_retries:
+                pprint('---> shard #{} failed (exit code {}), retry, see log: {}'.format(
+                    shard_idx, proc.returncode, osp.join(job['shard_dir'], 'worker.log')))
+                pending.append((shard_idx, job, attempts + 1))
+            else:
+                pprint('---> shard #{} failed (exit code {}) after {} attempts'.format(
+                    shard_idx, proc.returncode, attempts + 1))
+                failed.append(shard_idx)
+
+    if failed:
+        raise RuntimeError('{} shards failed: {}, the outputs are not merged, see worker.log in {}'.format(
+            len(failed), sorted(failed), shards_root))
+
+    merge_shard_outputs(shard_dir_list, save_dir)
+
+    if not keep_shards:
+        shutil.rmtree(shards_root)
+        if not os.listdir(osp.dirname(shards_root)):
+            os.rmdir(osp.dirname(shards_root))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a frame range with parallel mayapy workers.')
+    parser.add_argument('scene_file', nargs='?', help='Maya scene file')
+    parser.add_argument('--worker', metavar='JOB_JSON', help='(internal) run a shard in mayapy')
+    parser.add_argument('--task', choices=sorted(SHARD_TASKS.keys()), default='meshes')
+    parser.add_argument('--save-dir', default='./maya_exports')
+    parser.add_argument('--start-frame', type=int, default=1)
+    parser.add_argument('--end-frame', type=int, default=10)
+    parser.add_argument('--task-kwargs', default='{}', help='json dict of other arguments of the export function')
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--frames-per-shard', type=int, default=None)
+    parser.add_argument('--mayapy', default=None)
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--keep-shards', action='store_true')
+    args = parser.parse_args()
+
+    if args.worker:
+        try:
+            run_worker(args.worker)
+        except Exception:
+            traceback.print_exc()
+            sys.exit(1)
+    else:
+        if not args.scene_file:
+            parser.error('scene_file is required')
+
+        run_sharded_export(args.scene_file, args.task, args.save_dir,
+                           args.start_frame, args.end_frame,
+                           task_kwargs=json.loads(args.task_kwargs),
+                           num_workers=args.num_workers,
+                           frames_per_shard=args.frames_per_shard,
+                           mayapy=args.mayapy,
+                           max_retries=args.max_retries,
+                           keep_shards=args.keep_shards)
@@ -0,0 +1,738 @@
+# coding=utf-8
+# """
+# Parse the MEL expressions exported by maya_export_expressions.py, and compile them into vectorized NumPy
+# functions, to evaluate the expressions (e.g. controllers -> blendshape weights) for all frames at once, without Maya.
+
+# Supported MEL subset:
+#     statements: float/int declarations, assignments (=, +=, -=, *=, /=) to $variables and node.attribute plugs,
+#                 if/else if/else, { blocks };
+#     expressions: numbers, $variables, node.attribute plugs, time, frame, true/false/on/off/yes/no,
+#                  + - * / %, comparisons, && || !, ?:, and the functions in FUNCTIONS;
+#     comments: // and /* */.
+# Branches are evaluated for all frames and merged with masks (np.where).
+# A plug assigned only in some branches keeps its input value (or 0) in the other frames,
+# a Maya expression would keep the value of the previous evaluation instead.
+# Values are in UI units, like cmds.getAttr() (e.g. rotations in degrees).
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os.path as osp
+import re
+import glob
+import json
+import zipfile
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    # parsing (inputs, outputs, dependencies) does not need NumPy, e.g. in Maya 2019
+    np = None
+
+
+class MelSyntaxError(ValueError):
+    pass
+
+
+# short names of transform attributes -> long names, plugs are referred by long names
+ATTRIBUTE_ALIASES = {
+    'tx': 'translateX', 'ty': 'translateY', 'tz': 'translateZ',
+    'rx': 'rotateX', 'ry': 'rotateY', 'rz': 'rotateZ',
+    'sx': 'scaleX', 'sy': 'scaleY', 'sz': 'scaleZ',
+    'v': 'visibility',
+}
+
+CONSTANTS = {'true': 1, 'false': 0, 'on': 1, 'off': 0, 'yes': 1, 'no': 0}
+
+# built-in inputs of expressions
+TIME_INPUTS = ('time', 'frame')
+
+
+def _clamp(low, high, value):
+    return np.minimum(np.maximum(value, low), high)
+
+
+def _linstep(start, end, value):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (np.asarray(value, dtype=np.float64) - start) / (end - start)
+    return np.where(value <= start, 0., np.where(value >= end, 1., t))
+
+
+def _smoothstep(start, end, value):
+    t = _linstep(start, end, value)
+    return t * t * (3. - 2. * t)
+
+
+# (k=MEL function, v=(expression of the NumPy function, number of arguments))
+FUNCTIONS = {
+    'abs': ('np.abs', 1),
+    'sign': ('np.sign', 1),
+    'min': ('np.minimum', 2),
+    'max': ('np.maximum', 2),
+    'clamp': ('_clamp', 3),
+    'linstep': ('_linstep', 3),
+    'smoothstep': ('_smoothstep', 3),
+    'pow': ('np.power', 2),
+    'sqrt': ('np.sqrt', 1),
+    'exp': ('np.exp', 1),
+    'log': ('np.log', 1),
+    'log10': ('np.log10', 1),
+    'floor': ('np.floor', 1),
+    'ceil': ('np.ceil', 1),
+    'trunc': ('np.trunc', 1),
+    'fmod': ('np.fmod', 2),
+    'hypot': ('np.hypot', 2),
+    'sin': ('np.sin', 1),
+    'cos': ('np.cos', 1),
+    'tan': ('np.tan', 1),
+    'asin': ('np.arcsin', 1),
+    'acos': ('np.arccos', 1),
+    'atan': ('np.arctan', 1),
+    'atan2': ('np.arctan2', 2),
+    'sind': ('(lambda x: np.sin(np.radians(x)))', 1),
+    'cosd': ('(lambda x: np.cos(np.radians(x)))', 1),
+    'tand': ('(lambda x: np.tan(np.radians(x)))', 1),
+    'asind': ('(lambda x: np.degrees(np.arcsin(x)))', 1),
+    'acosd': ('(lambda x: np.degrees(np.arccos(x)))', 1),
+    'atand': ('(lambda x: np.degrees(np.arctan(x)))', 1),
+    'atan2d': ('(lambda y, x: np.degrees(np.arctan2(y, x)))', 2),
+    'deg_to_rad': ('np.radians', 1),
+    'rad_to_deg': ('np.degrees', 1),
+}
+
+# relative cost of the nodes of an expression, see MelExpression.cost
+FUNCTION_COST = 4
+OPERATION_COST = 1
+
+TOKEN_RE = re.compile(r'''
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?)
+  | (?P<var>\$[A-Za-z_]\w*)
+  | (?P<name>[A-Za-z_][\w:]*(?:\[\d+\])?(?:\.[A-Za-z_]\w*(?:\[\d+\])?)*)
+  | (?P<op>\+=|-=|\*=|/=|==|!=|<=|>=|&&|\|\||[-+*/%<>=!?:;,(){}])
+''', re.S | re.X)
+
+
+def tokenize(text):
+    """
+    Split an expression into tokens.
+
+    Returns:
+        list of (kind, text, line number)
+            kind: 'number', 'var', 'name' or 'op'.
+    """
+    tokens = []
+    pos = 0
+    line = 1
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            raise MelSyntaxError('line {}: unexpected character {!r}'.format(line, text[pos]))
+
+        kind = match.lastgroup
+        if kind != 'skip':
+            tokens.append((kind, match.group(kind), line))
+        line += match.group(0).count('\n')
+        pos = match.end()
+
+    return tokens
+
+
+def canonical_plug_name(plug_name):
+    """
+    Canonical name of a plug: transform attribute short names replaced by long names, e.g. 'ctrl.ty' -> 'ctrl.translateY'.
+    """
+    node, _, attr = plug_name.partition('.')
+
+    return '{}.{}'.format(node, ATTRIBUTE_ALIASES.get(attr, attr))
+
+
+class Parser(object):
+    """
+    Recursive descent parser, statements and expressions are nested tuples:
+        ('decl', type, [(variable, expression or None), ...]), ('assign', target, op, expression),
+        ('if', condition, statements, statements), ('block', statements);
+        ('num', value, type), ('var', name), ('plug', name), ('input', 'time'|'frame'), ('call', function, args),
+        ('unary', op, a), ('binary', op, a, b), ('ternary', condition, a, b).
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        idx = self.pos + offset
+        return self.tokens[idx] if idx < len(self.tokens) else ('eof', '', self.tokens[-1][2] if self.tokens else 0)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def error(self, message, token=None):
+        token = token or self.peek()
+        raise MelSyntaxError('line {}: {} (at {!r})'.format(token[2], message, token[1]))
+
+    def accept(self, text):
+        if self.peek()[0] in ('op', 'name') and self.peek()[1] == text:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, text):
+        if not self.accept(text):
+            self.error('expect {!r}'.format(text))
+
+    def parse(self):
+        statements = []
+        while self.peek()[0] != 'eof':
+            statement = self.parse_statement()
+            if statement is not None:
+                statements.append(statement)
+        return statements
+
+    def parse_statement(self):
+        kind, text, _ = self.peek()
+
+        if kind == 'op' and text == ';':
+            self.next()
+            return None
+
+        if kind == 'op' and text == '{':
+            self.next()
+            statements = []
+            while not self.accept('}'):
+                if self.peek()[0] == 'eof':
+                    self.error('expect }')
+                statement = self.parse_statement()
+                if statement is not None:
+                    statements.append(statement)
+            return ('block', statements)
+
+        if kind == 'name' and text in ('float', 'int'):
+            self.next()
+            declarations = []
+            while True:
+                var = self.next()
+                if var[0] != 'var':
+                    self.error('expect a variable', var)
+                if self.accept('['):
+                    self.error('arrays are not supported')
+                value = self.parse_expression() if self.accept('=') else None
+                declarations.append((var[1][1:], value))
+                if not self.accept(','):
+                    break
+            self.expect(';')
+            return ('decl', text, declarations)
+
+        if kind == 'name' and text == 'if':
+            self.next()
+            self.expect('(')
+            condition = self.parse_expression()
+            self.expect(')')
+            then_statements = self.parse_body()
+            else_statements = self.parse_body() if self.accept('else') else []
+            return ('if', condition, then_statements, else_statements)
+
+        if kind == 'name' and text in ('for', 'while', 'do', 'switch', 'proc', 'global', 'string', 'vector', 'matrix'):
+            self.error('{} is not supported'.format(text))
+
+        target = self.parse_primary()
+        if target[0] in ('var', 'plug') and self.peek()[0] == 'op' and self.peek()[1] in ('=', '+=', '-=', '*=', '/='):
+            op = self.next()[1]
+            value = self.parse_expression()
+            self.expect(';')
+            return ('assign', target, op, value)
+
+        self.error('expect an assignment')
+
+    def parse_body(self):
+        statement = self.parse_statement()
+        if statement is None:
+            return []
+        return statement[1] if statement[0] == 'block' else [statement]
+
+    def parse_expression(self):
+        condition = self.parse_binary(0)
+        if self.accept('?'):
+            a = self.parse_expression()
+            self.expect(':')
+            b = self.parse_expression()
+            return ('ternary', condition, a, b)
+        return condition
+
+    BINARY_PRECEDENCE = [('||', ), ('&&', ), ('==', '!='), ('<', '>', '<=', '>='), ('+', '-'), ('*', '/', '%')]
+
+    def parse_binary(self, level):
+        if level == len(self.BINARY_PRECEDENCE):
+            return self.parse_unary()
+
+        a = self.parse_binary(level + 1)
+        while self.peek()[0] == 'op' and self.peek()[1] in self.BINARY_PRECEDENCE[level]:
+            op = self.next()[1]
+            b = self.parse_binary(level + 1)
+            a = ('binary', op, a, b)
+        return a
+
+    def parse_unary(self):
+        if self.peek()[0] == 'op' and self.peek()[1] in ('-', '+', '!'):
+            op = self.next()[1]
+            return ('unary', op, self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.next()
+        kind, text, _ = token
+
+        if kind == 'number':
+            is_int = re.match(r'^\d+$', text) is not None
+            return ('num', int(text) if is_int else float(text), 'int' if is_int else 'float')
+
+        if kind == 'var':
+            return ('var', text[1:])
+
+        if kind == 'op' and text == '(':
+            value = self.parse_expression()
+            self.expect(')')
+            return value
+
+        if kind == 'name':
+            if '.' in text:
+                return ('plug', canonical_plug_name(text))
+            if text in CONSTANTS:
+                return ('num', CONSTANTS[text], 'int')
+            if text in TIME_INPUTS:
+                return ('input', text)
+            if self.accept('('):
+                if text not in FUNCTIONS:
+                    self.error('unsupported function {}'.format(text), token)
+                args = []
+                if not self.accept(')'):
+                    while True:
+                        args.append(self.parse_expression())
+                        if self.accept(')'):
+                            break
+                        self.expect(',')
+                if len(args) != FUNCTIONS[text][1]:
+                    self.error('{}() takes {} arguments, got {}'.format(text, FUNCTIONS[text][1], len(args)), token)
+                return ('call', text, args)
+
+        self.error('unexpected token', token)
+
+
+class MelExpression(object):
+    """
+    A MEL expression compiled into a NumPy function.
+    """
+
+    def __init__(self, text, name=None):
+        """
+        Args:
+            text: str
+                Expression string.
+            name: str or None
+                Name of the expression node.
+        """
+        self.name = name
+        self.text = text
+        self.statements = Parser(text).parse()
+
+        self.inputs = []
+        self.outputs = []
+        self.undefined_variables = []
+        self.cost = 0
+        self.int_variables = set()
+        self.variables = []
+        # (k=output plug, v=input plugs it depends on, through variables and if conditions)
+        self.output_dependencies = OrderedDict()
+
+        lines = []
+        self._num_masks = 0
+        self._written = set()
+        self._variable_dependencies = {}
+        self._mask_dependencies = {None: frozenset()}
+        self._compile_statements(self.statements, None, lines, 1)
+
+        header = ['def _expression(_in, _n):']
+        header.extend('    v_{} = 0.'.format(var) for var in self.variables)
+        header.append('    _out = OrderedDict()')
+        for plug, dependencies in self.output_dependencies.items():
+            self.output_dependencies[plug] = sorted(dependencies)
+
+        footer = ['    return _out']
+        self.source = '\n'.join(header + lines + footer) + '\n'
+
+        namespace = {'np': np, 'OrderedDict': OrderedDict, '_clamp': _clamp,
+                     '_linstep': _linstep, '_smoothstep': _smoothstep}
+        exec(compile(self.source, '<expression {}>'.format(name or ''), 'exec'), namespace)
+        self._function = namespace['_expression']
+
+    # ---------------------------------------------------------------- compiler
+
+    def _add_variable(self, var):
+        if var not in self.variables:
+            self.variables.append(var)
+
+    def _get_dependencies(self, node):
+        """
+        Get the input plugs an expression node depends on.
+        """
+        kind = node[0]
+        if kind == 'plug':
+            if node[1] in self._written:
+                return set(self.output_dependencies[node[1]])
+            return set([node[1]])
+        elif kind == 'input':
+            return set([node[1]])
+        elif kind == 'var':
+            return set(self._variable_dependencies.get(node[1], ()))
+        elif kind == 'call':
+            children = node[2]
+        elif kind in ('unary', 'binary', 'ternary'):
+            children = [child for child in node[1:] if isinstance(child, tuple)]
+        else:
+            children = []
+
+        dependencies = set()
+        for child in children:
+            dependencies.update(self._get_dependencies(child))
+        return dependencies
+
+    def _compile_statements(self, statements, mask, lines, depth):
+        indent = '    ' * depth
+        for statement in statements:
+            kind = statement[0]
+
+            if kind == 'decl':
+                for var, value in statement[2]:
+                    self._add_variable(var)
+                    if statement[1] == 'int':
+                        self.int_variables.add(var)
+                    if value is not None:
+                        self._compile_assign(('var', var), '=', value, mask, lines, indent)
+            elif kind == 'assign':
+                self._compile_assign(statement[1], statement[2], statement[3], mask, lines, indent)
+            elif kind == 'block':
+                self._compile_statements(statement[1], mask, lines, depth)
+            elif kind == 'if':
+                condition, _ = self._compile_expression(statement[1])
+                self._num_masks += 1
+                condition_name = '_c{}'.format(self._num_masks)
+                mask_name = '_m{}'.format(self._num_masks)
+                mask_dependencies = self._mask_dependencies[mask] | self._get_dependencies(statement[1])
+                self._mask_dependencies[mask_name] = mask_dependencies
+                self._mask_dependencies[mask_name + 'e'] = mask_dependencies
+                parent = '' if mask is None else '{} & '.format(mask)
+                lines.append('{}{} = np.asarray({}) != 0'.format(indent, condition_name, condition))
+                lines.append('{}{} = {}{}'.format(indent, mask_name, parent, condition_name))
+                self._compile_statements(statement[2], mask_name, lines, depth)
+                if statement[3]:
+                    lines.append('{}{}e = {}~{}'.format(indent, mask_name, parent, condition_name))
+                    self._compile_statements(statement[3], mask_name + 'e', lines, depth)
+
+    def _compile_assign(self, target, op, value, mask, lines, indent):
+        dependencies = self._get_dependencies(value) | self._mask_dependencies[mask]
+        if op != '=' or mask is not None:
+            dependencies.update(self._get_dependencies(target))
+
+        code, value_type = self._compile_expression(value)
+        if op != '=':
+            old_code, old_type = self._compile_expression(target)
+            code, value_type = self._compile_binary(op[0], old_code, old_type, code, value_type)
+            self.cost += OPERATION_COST
+
+        if target[0] == 'var':
+            var = target[1]
+            self._add_variable(var)
+            if var in self.int_variables and value_type != 'int':
+                code = 'np.trunc({})'.format(code)
+            name = 'v_' + var
+            # flow insensitive: the dependencies of all the assignments of the variable
+            self._variable_dependencies.setdefault(var, set()).update(dependencies)
+        else:
+            plug = target[1]
+            if plug not in self.outputs:
+                self.outputs.append(plug)
+            self.output_dependencies.setdefault(plug, set()).update(dependencies)
+            old = "_out[{!r}]".format(plug) if plug in self._written else "_in.get({!r}, 0.)".format(plug)
+            self._written.add(plug)
+            if mask is not None:
+                code = 'np.where({}, {}, {})'.format(mask, code, old)
+            lines.append('{}_out[{!r}] = {}'.format(indent, plug, code))
+            return
+
+        if mask is not None:
+            code = 'np.where({}, {}, {})'.format(mask, code, name)
+        lines.append('{}{} = {}'.format(indent, name, code))
+
+    def _compile_binary(self, op, a, a_type, b, b_type):
+        result_type = 'int' if a_type == 'int' and b_type == 'int' else 'float'
+        if op == '/' and result_type == 'int':
+            return 'np.trunc(np.true_divide({}, {}))'.format(a, b), 'int'
+        if op == '%':
+            return 'np.fmod({}, {})'.format(a, b), result_type
+        if op in ('==', '!=', '<', '>', '<=', '>='):
+            return '(np.asarray({} {} {}) * 1)'.format(a, op, b), 'int'
+        if op == '&&':
+            return '(((np.asarray({}) != 0) & (np.asarray({}) != 0)) * 1)'.format(a, b), 'int'
+        if op == '||':
+            return '(((np.asarray({}) != 0) | (np.asarray({}) != 0)) * 1)'.format(a, b), 'int'
+        return '({} {} {})'.format(a, op, b), result_type
+
+    def _compile_expression(self, node):
+        """
+        Returns:
+            tuple of (str, str)
+                Python code, and type ('int' or 'float').
+        """
+        kind = node[0]
+
+        if kind == 'num':
+            return repr(node[1]), node[2]
+
+        if kind == 'var':
+            var = node[1]
+            if var not in self.variables:
+                # MEL would fail, the variable is 0 here
+                self._add_variable(var)
+                if var not in self.undefined_variables:
+                    self.undefined_variables.append(var)
+            return 'v_' + var, 'int' if var in self.int_variables else 'float'
+
+        if kind == 'plug':
+            plug = node[1]
+            if plug in self._written:
+                return '_out[{!r}]'.format(plug), 'float'
+            if plug not in self.inputs:
+                self.inputs.append(plug)
+            return '_in[{!r}]'.format(plug), 'float'
+
+        if kind == 'input':
+            if node[1] not in self.inputs:
+                self.inputs.append(node[1])
+            return '_in[{!r}]'.format(node[1]), 'float'
+
+        if kind == 'call':
+            self.cost += FUNCTION_COST
+            args = [self._compile_expression(arg)[0] for arg in node[2]]
+            return '{}({})'.format(FUNCTIONS[node[1]][0], ', '.join(args)), 'float'
+
+        if kind == 'unary':
+            self.cost += OPERATION_COST
+            code, value_type = self._compile_expression(node[2])
+            if node[1] == '!':
+                return '((np.asarray({}) == 0) * 1)'.format(code), 'int'
+            return '({}{})'.format(node[1], code), value_type
+
+        if kind == 'binary':
+            self.cost += OPERATION_COST
+            a, a_type = self._compile_expression(node[2])
+            b, b_type = self._compile_expression(node[3])
+            return self._compile_binary(node[1], a, a_type, b, b_type)
+
+        if kind == 'ternary':
+            self.cost += OPERATION_COST
+            condition, _ = self._compile_expression(node[1])
+            a, a_type = self._compile_expression(node[2])
+            b, b_type = self._compile_expression(node[3])
+            value_type = 'int' if a_type == 'int' and b_type == 'int' else 'float'
+            return 'np.where(np.asarray({}) != 0, {}, {})'.format(condition, a, b), value_type
+
+        raise MelSyntaxError('unknown node: {}'.format(kind))
+
+    # ---------------------------------------------------------------- evaluation
+
+    def evaluate(self, inputs, num_frames=None):
+        """
+        Evaluate the expression for all frames.
+
+        Args:
+            inputs: dict
+                (k=plug name (see canonical_plug_name()), 'time' or 'frame', v=np.ndarray of shape (num_frames, ) or float).
+            num_frames: int or None
+                Number of frames, default: length of the input arrays.
+
+        Returns:
+            OrderedDict
+                (k=output plug name, v=np.ndarray of shape (num_frames, ), float64).
+        """
+        if np is None:
+            raise ImportError('MelExpression.evaluate() requires NumPy')
+
+        missing = [plug for plug in self.inputs if plug not in inputs]
+        if missing:
+            raise KeyError('missing inputs of expression {}: {}'.format(self.name, missing))
+
+        if num_frames is None:
+            num_frames = get_num_frames(inputs)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            outputs = self._function(inputs, num_frames)
+
+        for plug, value in outputs.items():
+            outputs[plug] = np.broadcast_to(np.asarray(value, dtype=np.float64), (num_frames, )).copy()
+
+        return outputs
+
+
+def get_num_frames(values):
+    num_frames = 1
+    for value in values.values():
+        if np.ndim(value) > 0:
+            num_frames = max(num_frames, len(value))
+
+    return num_frames
+
+
+def load_expressions(export_dir, scene_name):
+    """
+    Load and compile the expressions exported by export_all_expressions(): {scene}.expression.{node}.txt
+
+    Returns:
+        list of MelExpression
+    """
+    prefix = osp.join(export_dir, '{}.expression.'.format(scene_name))
+    expressions = []
+    for filename in sorted(glob.glob(prefix + '*.txt')):
+        fp = open(filename, 'r')
+        text = fp.read()
+        fp.close()
+        expressions.append(MelExpression(text, filename[len(prefix):-len('.txt')]))
+
+    return expressions
+
+
+def evaluate_expressions(expressions, inputs, num_frames=None):
+    """
+    Evaluate expressions in order, the outputs of an expression are inputs of the following ones.
+
+    Args:
+        expressions: list of MelExpression
+        inputs: dict
+            (k=plug name, v=np.ndarray of shape (num_frames, ) or float), e.g. sampled controller values.
+        num_frames: int or None
+            Number of frames, default: length of the input arrays.
+
+    Returns:
+        OrderedDict
+            (k=plug name, v=np.ndarray of shape (num_frames, )), outputs of all the expressions.
+    """
+    if num_frames is None:
+        num_frames = get_num_frames(inputs)
+
+    values = dict(inputs)
+    outputs = OrderedDict()
+    for expression in expressions:
+        for plug, value in expression.evaluate(values, num_frames).items():
+            values[plug] = value
+            outputs[plug] = value
+
+    return outputs
+
+
+def get_expression_dependencies(expressions):
+    """
+    Get the expressions reading the outputs of other expressions.
+
+    Args:
+        expressions: list of MelExpression
+
+    Returns:
+        OrderedDict
+            (k=expression name, v=names of the expressions writing its inputs).
+    """
+    writers = {}
+    for expression in expressions:
+        for plug in expression.outputs:
+            writers.setdefault(plug, []).append(expression.name)
+
+    dependencies = OrderedDict()
+    for expression in expressions:
+        names = set()
+        for plug in expression.inputs:
+            names.update(writers.get(plug, []))
+        names.discard(expression.name)
+        dependencies[expression.name] = sorted(names)
+
+    return dependencies
+
+
+def get_expression_order(dependencies):
+    """
+    Topological order of expressions (Kahn's algorithm), expressions in cycles are appended by name.
+
+    Args:
+        dependencies: dict
+            (k=expression name, v=names of the expressions it depends on), see get_expression_dependencies().
+
+    Returns:
+        tuple of (list of str, list of str)
+            order: expression names; cycles: names of the expressions in (or after) dependency cycles.
+    """
+    num_dependencies = dict((name, len(deps)) for name, deps in dependencies.items())
+    dependents = dict((name, []) for name in dependencies)
+    for name, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(name)
+
+    ready = sorted(name for name, n in num_dependencies.items() if n == 0)
+    order = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for dependent in sorted(dependents[name]):
+            num_dependencies[dependent] -= 1
+            if num_dependencies[dependent] == 0:
+                ready.append(dependent)
+
+    ordered = set(order)
+    cycles = sorted(name for name in dependencies if name not in ordered)
+
+    return order + cycles, cycles
+
+
+def load_expression_archive(archive_filename):
+    """
+    Load the archive written by export_expression_archive() in maya_export_expressions.py.
+
+    Returns:
+        tuple of (list of MelExpression, dict)
+            The expressions which could be parsed, in topological order, and index.json.
+    """
+    archive = zipfile.ZipFile(archive_filename, 'r')
+    index = json.loads(archive.read('index.json').decode('utf-8'))
+
+    expressions = []
+    for name in index['order']:
+        item = index['expressions'][name]
+        if item.get('parse_error') is None:
+            expressions.append(MelExpression(archive.read(item['file']).decode('utf-8'), name))
+    archive.close()
+
+    return expressions, index
+
+
+def get_blendshape_weights(values, blendshape_node_name, blendshape_keys_list):
+    """
+    Stack the evaluated weights of a blendShape node into a (num_frames, num_blendshapes) matrix,
+    the weights not driven by the expressions are 0.
+
+    Args:
+        values: dict
+            (k=plug name, v=np.ndarray of shape (num_frames, )), e.g. returned by evaluate_expressions().
+        blendshape_node_name: str
+            Name of the blendShape node.
+        blendshape_keys_list: list of str
+            Blendshape keys (target names), columns of the matrix.
+
+    Returns:
+        np.ndarray of shape (num_frames, num_blendshapes), float32
+    """
+    num_frames = get_num_frames(values)
+    weights = np.zeros((num_frames, len(blendshape_keys_list)), dtype=np.float32)
+    for idx, key in enumerate(blendshape_keys_list):
+        plug = '{}.{}'.format(blendshape_node_name, key)
+        if plug in values:
+            weights[:, idx] = values[plug]
+
+    return weights
@@ -0,0 +1,301 @@
+# coding=utf-8
+# """
+# Point cache file: vertex positions of an animated mesh for all frames in one binary file.
+
+# File layout (little endian):
+#     header (64 bytes):
+#         magic: 8 bytes, b'MPCACHE1'
+#         header_size: uint32, 64
+#         num_verts: uint32
+#         num_frames: uint32, updated after each appended frame
+#         reserved: uint32
+#         start_frame: float64
+#         frame_step: float64
+#         padding: zeros up to header_size
+#     data:
+#         float32 array of shape (num_frames, num_verts, 3)
+
+# The topology (faces, uvs) is not in the cache, it is written once into an .obj file,
+# whose vertices are in the same order as the cache.
+# This module does not depend on Maya, the cache can be written in Maya (PointCacheWriter)
+# and read offline (load_point_cache(), needs NumPy).
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import sys
+import array
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    # writing a cache in Maya does not need NumPy
+    np = None
+
+
+POINT_CACHE_MAGIC = b'MPCACHE1'
+POINT_CACHE_HEADER_SIZE = 64
+
+# magic, header_size, num_verts, num_frames, reserved, start_frame, frame_step
+_HEADER_FORMAT = '<8sIIIIdd'
+_NUM_FRAMES_OFFSET = 16
+
+
+def pack_point_cache_header(num_verts, num_frames=0, start_frame=0, frame_step=1):
+    """
+    Pack the header of a point cache file.
+
+    Args:
+        num_verts: int
+            Number of vertices per frame.
+        num_frames: int
+            Number of frames in the file.
+        start_frame: int or float
+            Frame number of the first frame.
+        frame_step: int or float
+            Frame number step between two frames.
+
+    Returns:
+        bytes of length POINT_CACHE_HEADER_SIZE
+    """
+    header = struct.pack(_HEADER_FORMAT, POINT_CACHE_MAGIC, POINT_CACHE_HEADER_SIZE,
+                         num_verts, num_frames, 0, start_frame, frame_step)
+
+    return header + b'\0' * (POINT_CACHE_HEADER_SIZE - len(header))
+
+
+def read_point_cache_header(cache_filename):
+    """
+    Read the header of a point cache file.
+
+    Args:
+        cache_filename: str
+            Path to the point cache file.
+
+    Returns:
+        dict
+            With keys: header_size, num_verts, num_frames, start_frame, frame_step.
+    """
+    fp = open(cache_filename, 'rb')
+    header = fp.read(struct.calcsize(_HEADER_FORMAT))
+    fp.close()
+
+    if len(header) < struct.calcsize(_HEADER_FORMAT):
+        raise ValueError('{} is not a point cache file: file too short'.format(cache_filename))
+
+    magic, header_size, num_verts, num_frames, _, start_frame, frame_step = struct.unpack(
+        _HEADER_FORMAT, header)
+
+    if magic != POINT_CACHE_MAGIC:
+        raise ValueError('{} is not a point cache file: bad magic {!r}'.format(cache_filename, magic))
+
+    # frames appended after the last header update (e.g. an interrupted export) are ignored,
+    # and so is a partially written last frame
+    data_size = os.path.getsize(cache_filename) - header_size
+    num_frames = min(num_frames, data_size // (num_verts * 3 * 4)) if num_verts > 0 else num_frames
+
+    return {
+        'header_size': header_size,
+        'num_verts': num_verts,
+        'num_frames': num_frames,
+        'start_frame': start_frame,
+        'frame_step': frame_step
+    }
+
+
+class PointCacheWriter(object):
+    """
+    Append frames of vertex positions to a point cache file.
+    The frame count in the header is updated after each frame, so that the file can be
+    read (memory-mapped) while it is being written, and an interrupted export keeps
+    all the frames written so far.
+    """
+
+    def __init__(self, cache_filename, num_verts, start_frame=0, frame_step=1, append=False):
+        """
+        Args:
+            cache_filename: str
+                Path to the point cache file.
+            num_verts: int
+                Number of vertices per frame.
+            start_frame: int or float
+                Frame number of the first frame.
+            frame_step: int or float
+                Frame number step between two frames.
+            append: bool
+                If True and the file exists, append frames after the existing ones
+                (start_frame and frame_step of the existing file are kept).
+                Otherwise, the file is overwritten.
+        """
+        self.cache_filename = cache_filename
+        self.num_verts = num_verts
+
+        if append and osp.isfile(cache_filename):
+            header = read_point_cache_header(cache_filename)
+            if header['num_verts'] != num_verts:
+                raise ValueError('can not append {} verts/frame to {} with {} verts/frame'.format(
+                    num_verts, cache_filename, header['num_verts']))
+
+            self.num_frames = header['num_frames']
+            self.header_size = header['header_size']
+            self.fp = open(cache_filename, 'r+b')
+            # drop the trailing bytes of an interrupted frame, if any
+            self.fp.truncate(self.header_size + self.num_frames * self.frame_nbytes)
+        else:
+            self.num_frames = 0
+            self.header_size = POINT_CACHE_HEADER_SIZE
+            self.fp = open(cache_filename, 'wb')
+            self.fp.write(pack_point_cache_header(num_verts, 0, start_frame, frame_step))
+
+    @property
+    def frame_nbytes(self):
+        return self.num_verts * 3 * 4
+
+    def append_frame(self, points):
+        """
+        Append a frame.
+
+        Args:
+            points: list of (x, y, z), or flat list/array of x, y, z values, or np.ndarray
+                Vertex positions of all the vertices, num_verts * 3 values in total.
+
+        Returns:
+            None.
+        """
+        if np is not None and isinstance(points, np.ndarray):
+            data = np.ascontiguousarray(points, dtype='<f4').tobytes()
+        else:
+            if len(points) > 0 and isinstance(points[0], (tuple, list)):
+                points = [c for p in points for c in p]
+            values = array.array('f', points)
+            if sys.byteorder != 'little':
+                values.byteswap()
+            data = values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+        if len(data) != self.frame_nbytes:
+            raise ValueError('expect {} verts per frame, got {}'.format(
+                self.num_verts, len(data) // 12))
+
+        self.fp.seek(0, os.SEEK_END)
+        self.fp.write(data)
+        self.num_frames += 1
+
+        self.fp.seek(_NUM_FRAMES_OFFSET)
+        self.fp.write(struct.pack('<I', self.num_frames))
+        self.fp.flush()
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+def load_point_cache(cache_filename, mmap_mode='r'):
+    """
+    Load a point cache file as an array, memory-mapped by default, so that any frame
+    (or a slice of frames) can be read without loading the whole file.
+
+    Args:
+        cache_filename: str
+            Path to the point cache file.
+        mmap_mode: str or None
+            'r' (read-only), 'r+', 'c' (copy-on-write) as in np.memmap(), or None to read into memory.
+
+    Returns:
+        tuple of (np.ndarray, dict)
+            points: array of shape (num_frames, num_verts, 3), dtype float32;
+            header: see read_point_cache_header().
+    """
+    if np is None:
+        raise ImportError('load_point_cache() requires NumPy')
+
+    header = read_point_cache_header(cache_filename)
+    shape = (header['num_frames'], header['num_verts'], 3)
+
+    if mmap_mode is None or header['num_frames'] == 0:
+        fp = open(cache_filename, 'rb')
+        fp.seek(header['header_size'])
+        points = np.fromfile(fp, dtype='<f4', count=int(np.prod(shape))).reshape(shape)
+        fp.close()
+    else:
+        points = np.memmap(cache_filename, dtype='<f4', mode=mmap_mode,
+                           offset=header['header_size'], shape=shape)
+
+    return points, header
+
+
+def get_point_cache_frame_numbers(header):
+    """
+    Get the frame numbers of all the frames in a point cache.
+
+    Args:
+        header: dict
+            See read_point_cache_header().
+
+    Returns:
+        list of float
+    """
+    return [header['start_frame'] + i * header['frame_step'] for i in range(header['num_frames'])]
+
+
+def merge_point_caches(cache_filename_list, save_filename, chunk_frames=256):
+    """
+    Concatenate point cache files (e.g. written by shards of a frame range) into one file,
+    in the order of the input list. Frames are copied as raw bytes, NumPy is not needed.
+
+    Args:
+        cache_filename_list: list of str
+            Paths to the point cache files, in frame order.
+        save_filename: str
+            Path to the merged point cache file.
+        chunk_frames: int
+            Number of frames copied at a time.
+
+    Returns:
+        dict
+            Header of the merged file, see read_point_cache_header().
+    """
+    headers = [read_point_cache_header(fn) for fn in cache_filename_list]
+    if not headers:
+        raise ValueError('no point cache files to merge')
+
+    first = headers[0]
+    next_frame = first['start_frame']
+    for fn, header in zip(cache_filename_list, headers):
+        if header['num_verts'] != first['num_verts']:
+            raise ValueError('{} has {} verts/frame, expect {}'.format(
+                fn, header['num_verts'], first['num_verts']))
+        if header['num_frames'] > 0 and abs(header['start_frame'] - next_frame) > 1e-6:
+            raise ValueError('{} starts at frame {}, expect {}'.format(fn, header['start_frame'], next_frame))
+        next_frame += header['num_frames'] * header['frame_step']
+
+    frame_nbytes = first['num_verts'] * 3 * 4
+    num_frames = sum(header['num_frames'] for header in headers)
+
+    tmp_filename = save_filename + '.tmp'
+    fp = open(tmp_filename, 'wb')
+    fp.write(pack_point_cache_header(first['num_verts'], num_frames,
+                                     first['start_frame'], first['frame_step']))
+
+    for fn, header in zip(cache_filename_list, headers):
+        src_fp = open(fn, 'rb')
+        src_fp.seek(header['header_size'])
+        remaining = header['num_frames']
+        while remaining > 0:
+            n = min(remaining, chunk_frames)
+            fp.write(src_fp.read(n * frame_nbytes))
+            remaining -= n
+        src_fp.close()
+
+    fp.close()
+
+    if hasattr(os, 'replace'):
+        os.replace(tmp_filename, save_filename)
+    else:
+        if osp.isfile(save_filename):
+            os.remove(save_filename)
+        os.rename(tmp_filename, save_filename)
+
+    return read_point_cache_header(save_filename)
@@ -0,0 +1,486 @@
+# coding=utf-8
+# """
+# Offline rig controller evaluator and inverse solver (without Maya), from the controller-to-blendshape
+# data exported by maya_export_controller_to_bs_mapping_dict.py:
+#     .json: export_controller_to_bs_mapping(), a few samples of each controller (1, -1, 0.5, -0.5);
+#     .npz: export_controller_to_bs_response(), a dense grid of each controller (see controller_bs_response.py).
+
+# Forward: controller values (num_frames x num_controllers) -> blendshape weights (num_frames x num_blendshapes),
+# each controller drives its blendshapes piecewise-linearly, the responses of all the controllers are added up.
+
+# Inverse: blendshape weights (e.g. an ARKit-style stream) -> controller values, by bounded least squares
+#     min_x 0.5 * ||evaluate(x) - weights||^2 + 0.5 * regularization * ||x||^2,  min_c <= x_c <= max_c
+# with projected Newton steps on the piecewise-linear responses. The Newton systems are block diagonal
+# (controllers are coupled only through shared blendshapes), blocks of all the frames are solved together.
+# Controllers driving different blendshapes on the two sides of 0 are solved as split positive/negative
+# controllers first, so that a frame does not get stuck on the side tried first.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import json
+from pprint import pprint
+
+import numpy as np
+
+from controller_bs_response import ControllerBsResponse, get_controller_bs_response_arrays
+from keyframe_weight_matrix import load_weight_matrix
+
+
+def load_controller_bs_mapping_dict(json_filename):
+    """
+    Load the mapping dict exported by export_controller_to_bs_mapping() as response data.
+    The mapping only has the non-zero weights at a few controller values, weights are assumed
+    to be 0 with all the controllers at 0.
+
+    Args:
+        json_filename: str
+            Path to the {scene}.{blendshape node}.controller_to_bs_mapping_dict.json file.
+
+    Returns:
+        ControllerBsResponse
+    """
+    fp = open(json_filename, 'r')
+    mapping_dict = json.load(fp)
+    fp.close()
+
+    controllers = sorted(mapping_dict.keys())
+    blendshapes = set()
+    for controller in controllers:
+        for item in mapping_dict[controller]['mapping']:
+            blendshapes.update(item['driven_blendshapes'].keys())
+    blendshapes = sorted(blendshapes)
+    blendshape_index = dict((k, i) for i, k in enumerate(blendshapes))
+
+    ranges = []
+    grids = []
+    responses = []
+    for controller in controllers:
+        samples = {0.: {}}
+        for item in mapping_dict[controller]['mapping']:
+            samples[float(item['controller_value'])] = dict(
+                (blendshape_index[bs], w) for bs, w in item['driven_blendshapes'].items())
+
+        grid = sorted(samples.keys())
+        ranges.append(list(mapping_dict[controller]['range']))
+        grids.append(grid)
+        responses.append([samples[v] for v in grid])
+
+    header = {
+        'controllers': controllers,
+        'blendshapes': blendshapes,
+        'mapping_dict': json_filename
+    }
+    arrays, _ = get_controller_bs_response_arrays(header, ranges, [0.] * len(blendshapes), grids, responses)
+
+    return ControllerBsResponse(arrays)
+
+
+def split_controller_sides(response):
+    """
+    Split every controller with a two-sided range (e.g. [-1, 1], with 0 sampled) into a positive and
+    a negative controller, both in [0, max]: x = x_pos - x_neg. The split responses have no kink at 0,
+    the inverse solve of the split controllers does not get stuck on the side it tries first.
+
+    Args:
+        response: ControllerBsResponse
+
+    Returns:
+        tuple of (ControllerBsResponse, np.ndarray, np.ndarray)
+            split_response: response data of the split controllers;
+            split_ctrl: int array, the original controller of each split controller;
+            split_sign: float array, 1 for the positive (or one-sided) and -1 for the negative controllers.
+    """
+    responses = response.responses.tocsr()
+    max_grid_size = response.max_grid_size
+
+    split_controllers = []
+    split_ctrl = []
+    split_sign = []
+    ranges = []
+    grids = []
+    split_responses = []
+
+    for c, controller in enumerate(response.controllers):
+        n = int(response.grid_sizes[c])
+        grid = [float(v) for v in response.grid[c, :n]]
+        samples = []
+        for s in range(n):
+            row = responses.getrow(c * max_grid_size + s)
+            samples.append(dict(zip(row.indices.tolist(), row.data.tolist())))
+
+        lo = max(float(response.ranges[c, 0]), grid[0]) if n else 0.
+        hi = min(float(response.ranges[c, 1]), grid[-1]) if n else 0.
+
+        if n and lo < 0 < hi and 0. in grid:
+            zero = grid.index(0.)
+            split_controllers.extend([controller + '+', controller + '-'])
+            split_ctrl.extend([c, c])
+            split_sign.extend([1., -1.])
+            ranges.extend([[0., hi], [0., -lo]])
+            grids.extend([grid[zero:], [-v for v in reversed(grid[:zero + 1])]])
+            split_responses.extend([samples[zero:], list(reversed(samples[:zero + 1]))])
+        else:
+            split_controllers.append(controller)
+            split_ctrl.append(c)
+            split_sign.append(1.)
+            ranges.append([lo, hi])
+            grids.append(grid)
+            split_responses.append(samples)
+
+    header = {
+        'controllers': split_controllers,
+        'blendshapes': response.blendshapes
+    }
+    arrays, _ = get_controller_bs_response_arrays(header, ranges, response.baseline.tolist(), grids, split_responses)
+
+    return ControllerBsResponse(arrays), np.array(split_ctrl, dtype=np.int64), np.array(split_sign)
+
+
+class RigControllerSolver(object):
+    """
+    Evaluate controller values into blendshape weights, and solve controller values from blendshape weights,
+    for batches of frames.
+    """
+
+    def __init__(self, response, split_sides=True):
+        """
+        Args:
+            response: ControllerBsResponse
+                Response data, see load_controller_bs_mapping_dict() and ControllerBsResponse().
+            split_sides: bool
+                Whether to get the initial values of solve() from the split controllers,
+                see split_controller_sides().
+        """
+        self.response = response
+        self.controllers = response.controllers
+        self.blendshapes = response.blendshapes
+
+        num_controllers = len(self.controllers)
+        self.grid_sizes = response.grid_sizes.astype(np.int64)
+
+        # bounds: the stored ranges, within the sampled grid (responses are clamped out of it)
+        self.bounds = np.zeros((num_controllers, 2), dtype=np.float64)
+        for c in range(num_controllers):
+            n = self.grid_sizes[c]
+            if n == 0:
+                continue
+            grid = response.grid[c, :n].astype(np.float64)
+            lo = max(float(response.ranges[c, 0]), grid[0])
+            hi = min(float(response.ranges[c, 1]), grid[-1])
+            self.bounds[c] = [lo, hi] if lo <= hi else [0., 0.]
+
+        self.blocks = self._get_controller_blocks()
+
+        self.split_solver = None
+        if split_sides:
+            split_response, self.split_ctrl, self.split_sign = split_controller_sides(response)
+            if len(split_response.controllers) > num_controllers:
+                self.split_solver = RigControllerSolver(split_response, split_sides=False)
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        Create a solver from the .json mapping dict or the .npz response data.
+        """
+        if filename.endswith('.json'):
+            return cls(load_controller_bs_mapping_dict(filename))
+
+        return cls(ControllerBsResponse(filename))
+
+    def evaluate(self, controller_values):
+        """
+        Evaluate blendshape weights for a batch of controller vectors.
+
+        Args:
+            controller_values: np.ndarray of shape (num_frames, num_controllers) or (num_controllers, )
+                Columns in the order of self.controllers.
+
+        Returns:
+            np.ndarray of shape (num_frames, num_blendshapes) or (num_blendshapes, )
+        """
+        return self.response.evaluate(controller_values)
+
+    def _get_controller_blocks(self):
+        """
+        Group the controllers into blocks coupled by driven blendshapes (connected components),
+        the Newton systems of solve() are block diagonal. Blocks of the same size are stacked
+        to be solved together.
+
+        Returns:
+            list of tuple of (np.ndarray, np.ndarray)
+                ctrl_idx: int (num_blocks, block_size), controllers of each block;
+                bs_idx: int (num_blocks, max_num_bs), blendshapes driven by each block,
+                    padded with num_blendshapes (a dummy column of zero residuals).
+        """
+        import scipy.sparse as sp
+        from scipy.sparse.csgraph import connected_components
+
+        response = self.response
+        num_controllers = len(self.controllers)
+        num_blendshapes = len(self.blendshapes)
+
+        pattern = sp.csr_matrix(
+            (np.ones(len(response.pair_ctrl)), (response.pair_ctrl, response.pair_bs)),
+            shape=(num_controllers, num_blendshapes))
+        _, labels = connected_components(pattern.dot(pattern.T), directed=False)
+
+        blocks_of_size = {}
+        for label in np.unique(labels):
+            ctrl_idx = np.flatnonzero(labels == label)
+            bs_idx = np.unique(pattern[ctrl_idx].indices)
+            blocks_of_size.setdefault(len(ctrl_idx), []).append((ctrl_idx, bs_idx))
+
+        blocks = []
+        for size in sorted(blocks_of_size.keys()):
+            max_num_bs = max([len(bs_idx) for _, bs_idx in blocks_of_size[size]] + [1])
+            ctrl_idx = np.array([c for c, _ in blocks_of_size[size]], dtype=np.int64)
+            bs_idx = np.full((len(ctrl_idx), max_num_bs), num_blendshapes, dtype=np.int64)
+            for i, (_, bs) in enumerate(blocks_of_size[size]):
+                bs_idx[i, :len(bs)] = bs
+            blocks.append((ctrl_idx, bs_idx))
+
+        return blocks
+
+    def _get_segment_slopes(self, mask):
+        """
+        Get the slopes of the (masked) blendshape weights w.r.t. the controllers on every grid segment,
+        for each block of controllers (see _get_controller_blocks()).
+
+        Returns:
+            list of np.ndarray of shape (num_blocks, block_size, max_grid_size, max_num_bs)
+                Entry (g, k, s, m) is for controller ctrl_idx[g, k] on the segment between its grid points
+                s and s + 1, and blendshape bs_idx[g, m], zeros for s >= grid_sizes - 1.
+        """
+        response = self.response
+        max_grid_size = response.max_grid_size
+        num_controllers = len(self.controllers)
+        num_blendshapes = len(self.blendshapes)
+
+        responses = (response.responses.toarray() * mask).reshape(num_controllers, max_grid_size, num_blendshapes)
+        slopes = np.zeros((num_controllers, max_grid_size, num_blendshapes + 1), dtype=np.float64)
+        if max_grid_size >= 2:
+            grid = response.grid.astype(np.float64)
+            valid = np.arange(max_grid_size - 1)[np.newaxis, :] < (self.grid_sizes[:, np.newaxis] - 1)
+            steps = np.where(valid, grid[:, 1:] - grid[:, :-1], 1.)
+            slopes[:, :-1, :-1] = ((responses[:, 1:] - responses[:, :-1]) /
+                                   steps[:, :, np.newaxis] * valid[:, :, np.newaxis])
+
+        return [slopes[ctrl_idx[:, :, np.newaxis], :, bs_idx[:, np.newaxis, :]].transpose(0, 1, 3, 2)
+                for ctrl_idx, bs_idx in self.blocks]
+
+    def _get_objective(self, controller_values, weights, mask, regularization):
+        residuals = (self.response.evaluate(controller_values) - weights) * mask
+        objective = 0.5 * np.sum(residuals ** 2, axis=1)
+        if regularization > 0:
+            objective += 0.5 * regularization * np.sum(controller_values ** 2, axis=1)
+
+        return objective, residuals
+
+    def _get_segments(self, controller_values):
+        """
+        Get the grid segments of the controller values, on the right and on the left side
+        (different if a value is on a grid point).
+        """
+        grid = self.response.grid.astype(np.float64)[np.newaxis, :, 1:]
+        x = controller_values[:, :, np.newaxis]
+        max_seg = np.maximum(self.grid_sizes - 2, 0)
+
+        # NaN padding of the grid never compares true
+        seg_right = np.minimum(np.sum(grid <= x, axis=2), max_seg)
+        seg_left = np.minimum(np.sum(grid < x, axis=2), max_seg)
+
+        return seg_right, seg_left
+
+    def _get_newton_steps(self, controller_values, residuals, slopes, regularization):
+        """
+        Get the projected Newton steps of the piecewise-linear least squares problem.
+        Responses are not differentiable at the grid points, the segment going downhill is used there,
+        controllers with no way downhill (at a bound or at a kink) are fixed.
+        """
+        lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+        num_frames = controller_values.shape[0]
+
+        seg_right, seg_left = self._get_segments(controller_values)
+        residuals = np.concatenate([residuals, np.zeros((num_frames, 1))], axis=1)
+        steps = np.zeros_like(controller_values)
+
+        for (ctrl_idx, bs_idx), block_slopes in zip(self.blocks, slopes):
+            num_blocks, block_size = ctrl_idx.shape
+            block_idx = np.arange(num_blocks)[np.newaxis, :, np.newaxis]
+            member_idx = np.arange(block_size)[np.newaxis, np.newaxis, :]
+
+            x = controller_values[:, ctrl_idx]
+            r = residuals[:, bs_idx]
+            jac_right = block_slopes[block_idx, member_idx, seg_right[:, ctrl_idx]]
+            jac_left = block_slopes[block_idx, member_idx, seg_left[:, ctrl_idx]]
+            grad_right = np.einsum('fgkm,fgm->fgk', jac_right, r) + regularization * x
+            grad_left = np.einsum('fgkm,fgm->fgk', jac_left, r) + regularization * x
+
+            at_knot = seg_left[:, ctrl_idx] != seg_right[:, ctrl_idx]
+            go_right = (grad_right < 0) & (x < hi[ctrl_idx])
+            go_left = ~go_right & (grad_left > 0) & (x > lo[ctrl_idx])
+            # inside a segment: free unless pushed out of the bounds, on a knot: free if a side goes downhill
+            free = np.where(at_knot, go_right | go_left, go_right | go_left | (grad_right == 0))
+            free &= (self.grid_sizes[ctrl_idx] >= 2)
+
+            use_left = at_knot & go_left
+            jacobians = np.where(use_left[..., np.newaxis], jac_left, jac_right)
+            gradients = np.where(use_left, grad_left, grad_right) * free
+
+            # fixed controllers: identity rows/columns, zero gradients
+            hessians = np.matmul(jacobians, jacobians.swapaxes(-1, -2))
+            hessians *= free[..., :, np.newaxis] & free[..., np.newaxis, :]
+            hessians += np.eye(block_size) * (regularization + 1e-9 + ~free[..., np.newaxis])
+            steps[:, ctrl_idx] = -np.linalg.solve(hessians, gradients[..., np.newaxis])[..., 0]
+
+        return steps
+
+    def solve(self, weights, blendshapes=None, initial_values=None, regularization=0.,
+              max_iterations=100, tolerance=1e-6, batch_size=1024):
+        """
+        Solve controller values from blendshape weights by bounded least squares, for a batch of frames.
+
+        Args:
+            weights: np.ndarray of shape (num_frames, num_weights) or (num_weights, )
+                Blendshape weights.
+            blendshapes: list of str or None
+                Blendshape names of the weight columns, in the order of self.blendshapes if None.
+                Blendshapes of the rig not in the list are left free, names not in the rig are ignored.
+            initial_values: np.ndarray of shape (num_frames, num_controllers) or None
+                Initial controller values (clamped into the bounds), solved with the split controllers
+                (see split_controller_sides()) if None.
+            regularization: float
+                Weight of the L2 penalty on controller values, prefers small values when the
+                weights can be reached by different combinations of controllers.
+            max_iterations: int
+                Max number of iterations.
+            tolerance: float
+                A frame is converged when no controller value changes by more than tolerance.
+            batch_size: int
+                Number of frames solved together, bounds the memory of the Newton systems.
+
+        Returns:
+            tuple of (np.ndarray, np.ndarray)
+                controller_values: shape (num_frames, num_controllers) or (num_controllers, ),
+                    columns in the order of self.controllers;
+                errors: shape (num_frames, ) or (), max abs error of the fitted blendshape weights.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        single = weights.ndim == 1
+        if single:
+            weights = weights[np.newaxis, :]
+
+        num_frames = weights.shape[0]
+        num_blendshapes = len(self.blendshapes)
+
+        mask = np.ones(num_blendshapes, dtype=np.float64)
+        if blendshapes is not None:
+            if len(blendshapes) != weights.shape[1]:
+                raise ValueError('expect {} weight columns, got {}'.format(len(blendshapes), weights.shape[1]))
+
+            blendshape_index = self.response.blendshape_index
+            unknown = [bs for bs in blendshapes if bs not in blendshape_index]
+            if unknown:
+                pprint('---> {} blendshapes not driven by the rig are ignored: {}'.format(len(unknown), unknown))
+
+            known_cols = [i for i, bs in enumerate(blendshapes) if bs in blendshape_index]
+            target = np.zeros((num_frames, num_blendshapes), dtype=np.float64)
+            mask[:] = 0.
+            for i in known_cols:
+                b = blendshape_index[blendshapes[i]]
+                target[:, b] = weights[:, i]
+                mask[b] = 1.
+            weights = target
+        elif weights.shape[1] != num_blendshapes:
+            raise ValueError('expect {} weight columns, got {}'.format(num_blendshapes, weights.shape[1]))
+
+        if initial_values is not None:
+            initial_values = np.array(initial_values, dtype=np.float64).reshape(num_frames, -1)
+
+        controller_values = np.zeros((num_frames, len(self.controllers)), dtype=np.float64)
+        for start in range(0, num_frames, batch_size):
+            end = min(start + batch_size, num_frames)
+
+            if initial_values is not None:
+                batch_values = initial_values[start:end]
+            elif self.split_solver is not None:
+                split_values = self.split_solver._solve(
+                    weights[start:end], mask, None, regularization, max_iterations, tolerance)
+                # both sides of a controller may be used by the split solution, keep the larger one
+                batch_values = np.zeros((end - start, len(self.controllers)), dtype=np.float64)
+                for i, (c, sign) in enumerate(zip(self.split_ctrl, self.split_sign)):
+                    larger = split_values[:, i] > np.abs(batch_values[:, c])
+                    batch_values[:, c] = np.where(larger, sign * split_values[:, i], batch_values[:, c])
+            else:
+                batch_values = None
+
+            controller_values[start:end] = self._solve(
+                weights[start:end], mask, batch_values, regularization, max_iterations, tolerance)
+
+        errors = np.max(np.abs((self.evaluate(controller_values) - weights) * mask), axis=1)
+
+        if single:
+            return controller_values[0], errors[0]
+        return controller_values, errors
+
+    def _solve(self, weights, mask, controller_values, regularization, max_iterations, tolerance):
+        """
+        Projected Newton iterations of solve() on the piecewise-linear responses, the Newton systems
+        of all the frames are solved together, converged frames are dropped from the batch.
+        """
+        num_frames = weights.shape[0]
+        num_controllers = len(self.controllers)
+        lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+        if controller_values is None:
+            controller_values = np.zeros((num_frames, num_controllers), dtype=np.float64)
+        controller_values = np.clip(controller_values, lo, hi)
+
+        slopes = self._get_segment_slopes(mask)
+        objective, residuals = self._get_objective(controller_values, weights, mask, regularization)
+        active = np.arange(num_frames)
+
+        for _ in range(max_iterations):
+            if len(active) == 0 or num_controllers == 0:
+                break
+
+            x = controller_values[active]
+            steps = self._get_newton_steps(x, residuals[active], slopes, regularization)
+
+            # backtracking on each frame: the linearization only holds inside the current segments
+            accepted = np.zeros(len(active), dtype=bool)
+            x_new = x.copy()
+            scale = 1.
+            for _ in range(20):
+                pending = np.flatnonzero(~accepted)
+                candidate = np.clip(x[pending] + scale * steps[pending], lo, hi)
+                candidate_objective, candidate_residuals = self._get_objective(
+                    candidate, weights[active[pending]], mask, regularization)
+
+                better = candidate_objective <= objective[active[pending]]
+                idx = pending[better]
+                x_new[idx] = candidate[better]
+                accepted[idx] = True
+                objective[active[idx]] = candidate_objective[better]
+                residuals[active[idx]] = candidate_residuals[better]
+
+                if accepted.all():
+                    break
+                scale *= 0.5
+
+            change = np.max(np.abs(x_new - x), axis=1)
+            controller_values[active] = x_new
+            active = active[(change > tolerance) & accepted]
+
+        return controller_values
+
+
+if __name__ == '__main__':
+    mapping_filename = r'D:/zhaoyafei/maya_exports/head.head_lod0_mesh_blendShape.controller_to_bs_response.npz'
+    weights_filename = r'D:/zhaoyafei/maya_exports/arkit_take01.keyframe.blendShape1.weights.f32'
+
+    solver = RigControllerSolver.from_file(mapping_filename)
+    arkit_weights, header = load_weight_matrix(weights_filename)
+
+    controller_values, errors = solver.solve(np.asarray(arkit_weights), header['keys'])
+    print('===> solved controller values: ', controller_values.shape)
+    print('===> max error: ', errors.max())
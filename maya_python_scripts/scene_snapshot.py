@@ -0,0 +1,526 @@
+# coding=utf-8
+# """
+# Canonical snapshots of the files exported from a scene, and the diff of two snapshots (e.g. two rig versions),
+# offline without Maya.
+
+# A snapshot is a text file of sorted (kind, key, value) entries, one per line: kind<TAB>key<TAB>value.
+# Kinds and the exported files they are read from:
+#     node: long node name -> node type, from {scene}.nodes_inventory.json (export_nodes_list())
+#           or {scene}.all_nodes.txt (names and types on alternate lines);
+#     blendshape_target: {blendShape node}.{target} -> '', from {scene}.blendshape.{node}.txt (export_blendshape_keys());
+#     connection: {source plug}>{destination plug} -> '', the connections of the blendshape weights made settable
+#           by the blendshape exporters, from {scene}.blendshape.restore_info.txt (make_blendshape_keys_settable());
+#     attribute: {node}.{attribute} -> '', from {scene}.{node}.attributes.txt (export_attributes_list());
+#     attribute_value: {node}.{attribute} -> value, from {scene}.{node}.attributes_dict.json (export_attributes_list())
+#           and {scene}.attributes_table.json (export_attributes_table());
+#     controller_range: {blendShape node}.{controller} -> 'min,max',
+#     controller_mapping: {blendShape node}.{controller}>{target} -> 'value:weight;...',
+#           from {scene}.{node}.controller_to_bs_mapping_dict.json (export_controller_to_bs_mapping()),
+#           or from {scene}.{node}.controller_to_bs_response.npz (needs NumPy).
+# More kinds can be added with SnapshotBuilder.add().
+
+# The header lists the kinds (sections) with their number of entries, MD5 digest and byte offset,
+# sections with the same digest in both snapshots are skipped, the others are diffed by a sorted merge
+# of the two files (streamed, the memory only holds the differences).
+# Renamed blendshape targets are detected among the removed/added targets of a blendShape node,
+# by identical controller mappings, or else by similar names.
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+import os
+import os.path as osp
+import glob
+import json
+import hashlib
+import difflib
+import argparse
+from collections import OrderedDict
+from pprint import pprint
+
+
+SNAPSHOT_VERSION = 1
+
+# min ratio of difflib.SequenceMatcher to pair a removed target with an added one by name
+RENAME_NAME_RATIO = 0.75
+
+
+def format_float(value):
+    """
+    Canonical text of a float value (6 significant digits, no negative zero).
+    """
+    text = '{:.6g}'.format(float(value))
+
+    return '0' if text == '-0' else text
+
+
+def format_value(value):
+    """
+    Canonical text of an attribute value: format_float() for floats, else json (lists, strings, bools, ...).
+    """
+    if isinstance(value, float):
+        return format_float(value)
+
+    return json.dumps(value, sort_keys=True)
+
+
+class SnapshotBuilder(object):
+    """
+    Collect (kind, key, value) entries, and write them sorted into a snapshot file.
+    """
+
+    def __init__(self):
+        self.sections = {}
+
+    def add(self, kind, key, value=''):
+        for text in (kind, key, value):
+            if '\t' in text or '\n' in text:
+                raise ValueError('tabs and newlines are not allowed in snapshot entries: {!r}'.format(text))
+
+        self.sections.setdefault(kind, {})[key] = value
+
+    def add_nodes_inventory(self, inventory_filename):
+        fp = open(inventory_filename, 'r')
+        inventory = json.load(fp)
+        fp.close()
+
+        node_types = inventory['node_types']
+        for node, type_idx in zip(inventory['nodes'], inventory['types']):
+            self.add('node', node, node_types[type_idx])
+
+    def add_nodes_list(self, nodes_list_filename):
+        lines = read_lines(nodes_list_filename)
+        for node, node_type in zip(lines[0::2], lines[1::2]):
+            self.add('node', node, node_type)
+
+    def add_blendshape_keys(self, blendshape_node_name, blendshape_keys_filename):
+        for target in read_lines(blendshape_keys_filename):
+            self.add('blendshape_target', '{}.{}'.format(blendshape_node_name, target))
+
+    def add_restore_info(self, restore_info_filename):
+        fp = open(restore_info_filename, 'r')
+        restore_info_list = json.load(fp)
+        fp.close()
+
+        for restore_info_dict in restore_info_list:
+            key_name = restore_info_dict['key_name']
+            for src_plug in restore_info_dict.get('connections_from') or []:
+                self.add('connection', '{}>{}'.format(src_plug, key_name))
+            for dst_plug in restore_info_dict.get('connections_to') or []:
+                self.add('connection', '{}>{}'.format(key_name, dst_plug))
+
+    def add_attributes_list(self, node_name, attributes_filename):
+        for attribute in read_lines(attributes_filename):
+            self.add('attribute', '{}.{}'.format(node_name, attribute))
+
+    def add_attribute_value(self, node_name, attribute, value):
+        self.add('attribute_value', '{}.{}'.format(node_name, attribute), format_value(value))
+
+    def add_attributes_dict(self, node_name, attributes_dict_filename):
+        fp = open(attributes_dict_filename, 'r')
+        attributes_dict = json.load(fp)
+        fp.close()
+
+        for attribute, value in attributes_dict.items():
+            self.add_attribute_value(node_name, attribute, value)
+
+    def add_attributes_table(self, table_filename):
+        fp = open(table_filename, 'r')
+        table = json.load(fp)
+        fp.close()
+
+        nodes = table['nodes']
+        for attribute, column in table['columns'].items():
+            for node_idx, value in zip(column['nodes'], column['values']):
+                self.add_attribute_value(nodes[node_idx], attribute, value)
+
+    def add_controller_mapping(self, blendshape_node_name, mapping_filename):
+        fp = open(mapping_filename, 'r')
+        mapping_dict = json.load(fp)
+        fp.close()
+
+        for controller, item in mapping_dict.items():
+            key = '{}.{}'.format(blendshape_node_name, controller)
+            self.add('controller_range', key, ','.join(format_float(v) for v in item['range']))
+
+            curves = {}
+            for sample in item['mapping']:
+                for target, weight in sample['driven_blendshapes'].items():
+                    curves.setdefault(target, []).append((float(sample['controller_value']), weight))
+
+            for target, curve in curves.items():
+                self.add('controller_mapping', '{}>{}'.format(key, target),
+                         ';'.join('{}:{}'.format(format_float(x), format_float(y)) for x, y in sorted(curve)))
+
+    def add_controller_response(self, blendshape_node_name, npz_filename):
+        from controller_bs_response import ControllerBsResponse
+
+        response = ControllerBsResponse(npz_filename)
+        for controller in response.controllers:
+            key = '{}.{}'.format(blendshape_node_name, controller)
+            c = response.controller_index[controller]
+            self.add('controller_range', key, ','.join(format_float(v) for v in response.ranges[c]))
+
+            for target in response.get_driven_blendshapes(controller):
+                knot_x, knot_y = response.get_response_curve(controller, target)
+                self.add('controller_mapping', '{}>{}'.format(key, target),
+                         ';'.join('{}:{}'.format(format_float(x), format_float(y)) for x, y in zip(knot_x, knot_y)))
+
+    def write(self, snapshot_filename, info=None):
+        """
+        Write the snapshot file: the header (json lines starting with '#'), then the sorted sections.
+
+        Args:
+            snapshot_filename: str
+                Path to the snapshot file.
+            info: dict or None
+                Other (json serializable) items saved into the header, e.g. the scene name.
+
+        Returns:
+            None.
+        """
+        sections = []
+        offset = 0
+        for kind in sorted(self.sections):
+            entries = self.sections[kind]
+            data = ''.join('{}\t{}\t{}\n'.format(kind, key, entries[key]) for key in sorted(entries)).encode('utf-8')
+            sections.append((kind, len(entries), data))
+
+        header = OrderedDict()
+        header['version'] = SNAPSHOT_VERSION
+        header['info'] = info or {}
+        header['sections'] = OrderedDict()
+        for kind, count, data in sections:
+            header['sections'][kind] = OrderedDict([
+                ('count', count), ('md5', hashlib.md5(data).hexdigest()), ('offset', offset), ('size', len(data))])
+            offset += len(data)
+
+        save_dir = osp.dirname(snapshot_filename)
+        if save_dir and not osp.exists(save_dir):
+            os.makedirs(save_dir)
+
+        fp = open(snapshot_filename, 'wb')
+        fp.write(('# ' + json.dumps(header) + '\n').encode('utf-8'))
+        for kind, count, data in sections:
+            fp.write(data)
+        fp.close()
+
+
+def read_lines(filename):
+    fp = open(filename, 'r')
+    lines = [line.strip() for line in fp]
+    fp.close()
+
+    return [line for line in lines if line]
+
+
+def build_snapshot(export_dir, scene_name, snapshot_filename=None):
+    """
+    Build the snapshot of the files exported from a scene, see the module docstring.
+
+    Args:
+        export_dir: str
+            Directory of the exported files.
+        scene_name: str
+            Scene name, prefix of the exported files.
+        snapshot_filename: str or None
+            Path to the snapshot file, default: {export_dir}/{scene}.snapshot.tsv
+
+    Returns:
+        str
+            Path to the snapshot file.
+    """
+    if snapshot_filename is None:
+        snapshot_filename = osp.join(export_dir, '{}.snapshot.tsv'.format(scene_name))
+
+    prefix = osp.join(export_dir, scene_name + '.')
+    builder = SnapshotBuilder()
+
+    def get_files(suffix):
+        # (name between the scene name and the suffix, filename)
+        filenames = sorted(glob.glob(glob.escape(prefix) + '*' + suffix) if hasattr(glob, 'escape')
+                           else glob.glob(prefix + '*' + suffix))
+        return [(f[len(prefix):len(f) - len(suffix)], f) for f in filenames]
+
+    pprint('===> build snapshot of {} in {}'.format(scene_name, export_dir))
+
+    if osp.isfile(prefix + 'nodes_inventory.json'):
+        builder.add_nodes_inventory(prefix + 'nodes_inventory.json')
+    elif osp.isfile(prefix + 'all_nodes.txt'):
+        builder.add_nodes_list(prefix + 'all_nodes.txt')
+
+    for name, filename in get_files('.txt'):
+        # blendshape.{node}.txt only, node names have no dots (e.g. not blendshape.restore_info.txt)
+        if name.startswith('blendshape.') and '.' not in name[len('blendshape.'):] and \
+                name != 'blendshape.restore_info':
+            builder.add_blendshape_keys(name[len('blendshape.'):], filename)
+    if osp.isfile(prefix + 'blendshape.restore_info.txt'):
+        builder.add_restore_info(prefix + 'blendshape.restore_info.txt')
+    for name, filename in get_files('.attributes.txt'):
+        builder.add_attributes_list(name, filename)
+    for name, filename in get_files('.attributes_dict.json'):
+        builder.add_attributes_dict(name, filename)
+    if osp.isfile(prefix + 'attributes_table.json'):
+        builder.add_attributes_table(prefix + 'attributes_table.json')
+
+    mapping_nodes = set()
+    for name, filename in get_files('.controller_to_bs_mapping_dict.json'):
+        builder.add_controller_mapping(name, filename)
+        mapping_nodes.add(name)
+    for name, filename in get_files('.controller_to_bs_response.npz'):
+        if name not in mapping_nodes:
+            builder.add_controller_response(name, filename)
+
+    for kind in sorted(builder.sections):
+        pprint('---> {}: {} entries'.format(kind, len(builder.sections[kind])))
+
+    builder.write(snapshot_filename, info={'scene_name': scene_name, 'export_dir': osp.abspath(export_dir)})
+    pprint('===> save snapshot into file: ')
+    pprint(snapshot_filename)
+
+    return snapshot_filename
+
+
+def read_snapshot_header(fp):
+    line = fp.readline().decode('utf-8')
+    if not line.startswith('# '):
+        raise ValueError('not a snapshot file: {}'.format(fp.name))
+
+    header = json.loads(line[2:])
+    if header['version'] != SNAPSHOT_VERSION:
+        raise ValueError('unsupported snapshot version: {}'.format(header['version']))
+    header['data_start'] = fp.tell()
+
+    return header
+
+
+def iter_section(fp, header, kind):
+    """
+    Iterate the (key, value) entries of a section of a snapshot file.
+    """
+    section = header['sections'].get(kind)
+    if section is None:
+        return
+
+    fp.seek(header['data_start'] + section['offset'])
+    remaining = section['size']
+    while remaining > 0:
+        line = fp.readline()
+        remaining -= len(line)
+        _, key, value = line.decode('utf-8').rstrip('\n').split('\t', 2)
+        yield key, value
+
+
+def merge_sections(old_entries, new_entries):
+    """
+    Sorted merge of two sorted (key, value) iterators.
+
+    Returns:
+        tuple of (list, list, list)
+            added: list of (key, value); removed: list of (key, value); changed: list of (key, old value, new value).
+    """
+    added = []
+    removed = []
+    changed = []
+
+    old_iter = iter(old_entries)
+    new_iter = iter(new_entries)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            removed.append(old)
+            old = next(old_iter, None)
+        elif old is None or new[0] < old[0]:
+            added.append(new)
+            new = next(new_iter, None)
+        else:
+            if old[1] != new[1]:
+                changed.append((old[0], old[1], new[1]))
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+    return added, removed, changed
+
+
+def get_target_renames(target_diff, mapping_diff):
+    """
+    Pair removed and added blendshape targets of the same blendShape node as renames:
+    first by identical (non-empty) controller mappings, then by the most similar names.
+
+    Returns:
+        list of (old key, new key)
+    """
+
+    def split_target(key):
+        node, _, target = key.rpartition('.')
+        return node, target
+
+    def get_signatures(entries):
+        # (k={blendShape node}.{target}, v=sorted (controller, curve) driving it)
+        signatures = {}
+        for key, value in entries:
+            controller_key, _, target = key.rpartition('>')
+            node, _, controller = controller_key.rpartition('.')
+            signatures.setdefault('{}.{}'.format(node, target), []).append((controller, value))
+        return dict((k, tuple(sorted(v))) for k, v in signatures.items())
+
+    removed_signatures = get_signatures(mapping_diff['removed'])
+    added_signatures = get_signatures(mapping_diff['added'])
+
+    removed_by_node = {}
+    added_by_node = {}
+    for key, _ in target_diff['removed']:
+        removed_by_node.setdefault(split_target(key)[0], []).append(key)
+    for key, _ in target_diff['added']:
+        added_by_node.setdefault(split_target(key)[0], []).append(key)
+
+    renames = []
+    for node in sorted(set(removed_by_node) & set(added_by_node)):
+        removed = removed_by_node[node]
+        added = added_by_node[node]
+
+        added_by_signature = {}
+        for key in added:
+            if key in added_signatures:
+                added_by_signature.setdefault(added_signatures[key], []).append(key)
+
+        for key in list(removed):
+            candidates = added_by_signature.get(removed_signatures.get(key), [])
+            if len(candidates) == 1 and candidates[0] in added:
+                renames.append((key, candidates[0]))
+                removed.remove(key)
+                added.remove(candidates[0])
+
+        # mutual best matches by name
+        ratios = {}
+        for old_key in removed:
+            for new_key in added:
+                ratios[old_key, new_key] = difflib.SequenceMatcher(
+                    None, split_target(old_key)[1], split_target(new_key)[1]).ratio()
+
+        for old_key in list(removed):
+            if not added:
+                break
+            new_key = max(added, key=lambda k: ratios[old_key, k])
+            best_old_key = max(removed, key=lambda k: ratios[k, new_key])
+            if best_old_key == old_key and ratios[old_key, new_key] >= RENAME_NAME_RATIO:
+                renames.append((old_key, new_key))
+                removed.remove(old_key)
+                added.remove(new_key)
+
+    return renames
+
+
+def diff_snapshots(old_snapshot_filename, new_snapshot_filename):
+    """
+    Diff two snapshot files.
+
+    Args:
+        old_snapshot_filename: str
+            Path to the snapshot of the old version.
+        new_snapshot_filename: str
+            Path to the snapshot of the new version.
+
+    Returns:
+        OrderedDict
+            (k=kind, v=OrderedDict of 'added'/'removed' (lists of [key, value]),
+            'changed' (list of [key, old value, new value]) and 'renamed' (list of [old key, new key]),
+            the renamed entries are not in added/removed.
+            Unchanged kinds are not included.
+    """
+    old_fp = open(old_snapshot_filename, 'rb')
+    new_fp = open(new_snapshot_filename, 'rb')
+    old_header = read_snapshot_header(old_fp)
+    new_header = read_snapshot_header(new_fp)
+
+    diff = OrderedDict()
+    for kind in sorted(set(old_header['sections']) | set(new_header['sections'])):
+        old_section = old_header['sections'].get(kind)
+        new_section = new_header['sections'].get(kind)
+        if old_section is not None and new_section is not None and old_section['md5'] == new_section['md5']:
+            continue
+
+        added, removed, changed = merge_sections(
+            iter_section(old_fp, old_header, kind), iter_section(new_fp, new_header, kind))
+        diff[kind] = OrderedDict([('added', added), ('removed', removed), ('changed', changed), ('renamed', [])])
+
+    old_fp.close()
+    new_fp.close()
+
+    empty = OrderedDict([('added', []), ('removed', []), ('changed', []), ('renamed', [])])
+    target_diff = diff.get('blendshape_target', empty)
+    mapping_diff = diff.get('controller_mapping', empty)
+    renames = get_target_renames(target_diff, mapping_diff)
+
+    if renames:
+        renamed = dict(renames)
+        target_diff['renamed'] = renames
+        target_diff['removed'] = [e for e in target_diff['removed'] if e[0] not in renamed]
+        added_keys = set(renamed.values())
+        target_diff['added'] = [e for e in target_diff['added'] if e[0] not in added_keys]
+
+        # the mappings of a renamed target are renamed too, or changed
+        renamed_mappings = {}
+        for key, value in mapping_diff['removed']:
+            controller_key, _, target = key.rpartition('>')
+            node = controller_key.rpartition('.')[0]
+            old_target_key = '{}.{}'.format(node, target)
+            if old_target_key in renamed:
+                new_key = '{}>{}'.format(controller_key, renamed[old_target_key].rpartition('.')[2])
+                renamed_mappings[new_key] = (key, value)
+
+        added = []
+        for key, value in mapping_diff['added']:
+            if key in renamed_mappings:
+                old_key, old_value = renamed_mappings.pop(key)
+                mapping_diff['renamed'].append((old_key, key))
+                if old_value != value:
+                    mapping_diff['changed'].append((key, old_value, value))
+            else:
+                added.append((key, value))
+        mapping_diff['added'] = added
+        renamed_keys = set(old_key for old_key, _ in mapping_diff['renamed'])
+        mapping_diff['removed'] = [e for e in mapping_diff['removed'] if e[0] not in renamed_keys]
+
+    return diff
+
+
+def save_diff_report(diff, report_filename):
+    """
+    Save the diff into a json file, and print the counts.
+
+    Returns:
+        None.
+    """
+    for kind, kind_diff in diff.items():
+        pprint('---> {}: {}'.format(kind, ', '.join(
+            '{} {}'.format(len(entries), name) for name, entries in kind_diff.items())))
+
+    pprint('===> save diff report into file: ')
+    pprint(report_filename)
+    fp = open(report_filename, 'w')
+    json.dump(diff, fp, indent=2)
+    fp.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build snapshots of exported scene files, and diff two snapshots.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    build_parser = subparsers.add_parser('build', help='build the snapshot of an export directory')
+    build_parser.add_argument('export_dir')
+    build_parser.add_argument('scene_name')
+    build_parser.add_argument('-o', '--output', default=None, help='snapshot file')
+
+    diff_parser = subparsers.add_parser('diff', help='diff two snapshots')
+    diff_parser.add_argument('old_snapshot')
+    diff_parser.add_argument('new_snapshot')
+    diff_parser.add_argument('-o', '--output', default='./snapshot_diff.json', help='diff report file')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_snapshot(args.export_dir, args.scene_name, args.output)
+    elif args.command == 'diff':
+        save_diff_report(diff_snapshots(args.old_snapshot, args.new_snapshot), args.output)
+    else:
+        parser.print_help()
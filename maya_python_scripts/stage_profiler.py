@@ -0,0 +1,354 @@
+# coding=utf-8
+# """
+# Stage-level profiling of the batch converters: wall time, CPU time, Maya command counts and memory
+# of every stage (load, keyframe_range, export_fbx, export_video, reset, ...) of every clip.
+
+# Usage (in Maya):
+#     profiler = StageProfiler('{save_dir}/clip_profile.jsonl')
+#     profiler.instrument(__name__, 'maya_scene_reset')  # count the cmds/mel calls made by these modules
+#     for clip in clips:
+#         profiler.start_clip(clip)
+#         with profiler.stage('load'):
+#             name_space = load_animation_from_fbx(clip)
+#         ...
+#         profiler.end_clip(num_nodes=len(cmds.ls()))
+#     print_profile_report(summarize_profile([profiler.log_filename]))
+
+# Maya commands are counted by replacing the module globals 'cmds' and 'mel' of the instrumented modules
+# with counting proxies (mel.eval() calls are counted by MEL command name, e.g. 'mel:FBXExport').
+# Memory is the resident set size of the process with psutil, or else its peak resident set size (resource).
+
+# Every clip is one json line of the log:
+#     {"clip": ..., "wall": seconds, "cpu": seconds, "memory_mb": ..., "stages": {"load": {"wall", "cpu", "calls",
+#      "commands": {command: count}, "memory_mb", "memory_delta_mb"[, "error"]}, ...}, <extra fields>}
+
+# Report (outside Maya):
+#     python stage_profiler.py ./maya_exports/clip_profile*.jsonl --top 20 -o ./maya_exports/profile_report.json
+
+# Author: Zhao Yafei (zhaoyafei0210@gmail.com)
+# """
+from __future__ import print_function
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def get_memory_mb():
+    """
+    Get the memory of the current process, in MB.
+
+    Returns:
+        float or None
+            Resident set size with psutil, else peak resident set size, None if neither is available (Windows
+            without psutil).
+    """
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss / 1048576.0
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KB on Linux
+        return max_rss / (1048576.0 if sys.platform == 'darwin' else 1024.0)
+
+    return None
+
+
+def get_cpu_time():
+    times = os.times()
+
+    return times[0] + times[1]
+
+
+class CommandCounter(object):
+    """
+    Proxy of a module (maya.cmds or maya.mel), counting the calls of its functions.
+    """
+
+    def __init__(self, module, prefix, profiler):
+        self._module = module
+        self._prefix = prefix
+        self._profiler = profiler
+        self._functions = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        if not callable(attr):
+            return attr
+
+        if name not in self._functions:
+            key = self._prefix + name
+
+            def counted(*args, **kwargs):
+                if name == 'eval' and self._prefix == 'mel.' and args:
+                    self._profiler.count('mel:' + (args[0].split() or [''])[0].rstrip(';'))
+                else:
+                    self._profiler.count(key)
+                return attr(*args, **kwargs)
+
+            self._functions[name] = counted
+
+        return self._functions[name]
+
+
+class StageProfiler(object):
+    """
+    Record the stages of every clip into a JSON-lines log, see the module docstring.
+    """
+
+    def __init__(self, log_filename=None):
+        """
+        Args:
+            log_filename: str or None
+                JSON-lines log, the records are appended. None to keep the records in memory only (self.records).
+        """
+        self.log_filename = log_filename
+        self.records = []
+        self.record = None
+        self.commands = None
+        self.clip_start = None
+
+    def instrument(self, *module_names):
+        """
+        Count the cmds/mel calls made by the functions of the modules, e.g. instrument(__name__, 'maya_scene_reset').
+        """
+        for module_name in module_names:
+            module = sys.modules[module_name]
+            for attr, prefix in (('cmds', 'cmds.'), ('mel', 'mel.')):
+                target = getattr(module, attr, None)
+                if target is not None and not isinstance(target, CommandCounter):
+                    setattr(module, attr, CommandCounter(target, prefix, self))
+
+    def count(self, command):
+        # calls outside a stage are not counted
+        if self.commands is not None:
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+    def start_clip(self, clip):
+        self.record = OrderedDict()
+        self.record['clip'] = clip
+        self.record['stages'] = OrderedDict()
+        self.clip_start = (time.time(), get_cpu_time())
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Profile a stage of the current clip (a stage run twice is accumulated).
+        """
+        memory_start = get_memory_mb()
+        self.commands = {}
+        wall_start = time.time()
+        cpu_start = get_cpu_time()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)[:500]
+            raise
+        finally:
+            wall = time.time() - wall_start
+            cpu = get_cpu_time() - cpu_start
+            memory = get_memory_mb()
+
+            stage = self.record['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'commands': {}})
+            stage['wall'] += wall
+            stage['cpu'] += cpu
+            stage['calls'] += sum(self.commands.values())
+            for command, num_calls in self.commands.items():
+                stage['commands'][command] = stage['commands'].get(command, 0) + num_calls
+            stage['memory_mb'] = memory
+            if memory is not None and memory_start is not None:
+                stage['memory_delta_mb'] = stage.get('memory_delta_mb', 0.0) + memory - memory_start
+            if error is not None:
+                stage['error'] = error
+            self.commands = None
+
+    def end_clip(self, **extra):
+        """
+        Write the record of the current clip into the log.
+
+        Args:
+            extra:
+                Other fields of the record, e.g. status='done', num_nodes=...
+
+        Returns:
+            dict
+                Record of the clip.
+        """
+        record = self.record
+        record['wall'] = time.time() - self.clip_start[0]
+        record['cpu'] = get_cpu_time() - self.clip_start[1]
+        record['memory_mb'] = get_memory_mb()
+        record.update(extra)
+
+        self.records.append(record)
+        if self.log_filename:
+            fp = open(self.log_filename, 'a')
+            fp.write(json.dumps(record) + '\n')
+            fp.close()
+
+        self.record = None
+
+        return record
+
+
+def read_profile_logs(log_filenames):
+    """
+    Read the records of JSON-lines logs (glob patterns are expanded, e.g. one log per worker).
+
+    Returns:
+        list of dict
+    """
+    records = []
+    for pattern in log_filenames:
+        for log_filename in sorted(glob.glob(pattern)):
+            fp = open(log_filename, 'r')
+            for line in fp:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # incomplete last line of an interrupted run
+                    continue
+            fp.close()
+
+    return records
+
+
+def get_percentile(sorted_values, percentile):
+    # nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+
+    return sorted_values[rank]
+
+
+def summarize_profile(log_filenames, top=10):
+    """
+    Summarize profile logs.
+
+    Args:
+        log_filenames: list of str
+            Logs written by StageProfiler, or glob patterns.
+        top: int
+            Number of slowest clips to report.
+
+    Returns:
+        dict
+            'num_clips', 'total_wall', 'clips_per_hour',
+            'stages': {stage: {count, total_wall, share, mean_wall, mean_cpu, p50/p90/p99/max_wall, mean_calls,
+                               errors, commands (top 10 by count)}},
+            'slowest_clips': [{clip, wall, slowest_stage, stage_wall}],
+            'memory_mb': {first, last, max} over the clips.
+    """
+    records = read_profile_logs(log_filenames)
+    total_wall = sum(r['wall'] for r in records)
+
+    stage_walls = OrderedDict()
+    stage_info = {}
+    for record in records:
+        for name, stage in record['stages'].items():
+            stage_walls.setdefault(name, []).append(stage['wall'])
+            info = stage_info.setdefault(name, {'cpu': 0.0, 'calls': 0, 'errors': 0, 'commands': {}})
+            info['cpu'] += stage['cpu']
+            info['calls'] += stage['calls']
+            info['errors'] += 'error' in stage
+            for command, num_calls in stage['commands'].items():
+                info['commands'][command] = info['commands'].get(command, 0) + num_calls
+
+    stages = OrderedDict()
+    for name, walls in stage_walls.items():
+        walls = sorted(walls)
+        info = stage_info[name]
+        summary = OrderedDict()
+        summary['count'] = len(walls)
+        summary['total_wall'] = sum(walls)
+        summary['share'] = sum(walls) / total_wall if total_wall else 0
+        summary['mean_wall'] = sum(walls) / len(walls)
+        summary['mean_cpu'] = info['cpu'] / len(walls)
+        for percentile in PERCENTILES:
+            summary['p{}_wall'.format(percentile)] = get_percentile(walls, percentile)
+        summary['max_wall'] = walls[-1]
+        summary['mean_calls'] = float(info['calls']) / len(walls)
+        summary['errors'] = info['errors']
+        summary['commands'] = OrderedDict(sorted(info['commands'].items(), key=lambda x: -x[1])[:10])
+        stages[name] = summary
+
+    slowest_clips = []
+    for record in sorted(records, key=lambda r: -r['wall'])[:top]:
+        slowest_stage = max(record['stages'].items(), key=lambda x: x[1]['wall']) if record['stages'] else (None, {})
+        slowest_clips.append(OrderedDict([
+            ('clip', record['clip']),
+            ('wall', record['wall']),
+            ('slowest_stage', slowest_stage[0]),
+            ('stage_wall', slowest_stage[1].get('wall'))
+        ]))
+
+    memory = [r['memory_mb'] for r in records if r.get('memory_mb') is not None]
+
+    report = OrderedDict()
+    report['num_clips'] = len(records)
+    report['total_wall'] = total_wall
+    report['clips_per_hour'] = len(records) * 3600.0 / total_wall if total_wall else None
+    report['stages'] = stages
+    report['slowest_clips'] = slowest_clips
+    report['memory_mb'] = {'first': memory[0], 'last': memory[-1], 'max': max(memory)} if memory else None
+
+    return report
+
+
+def print_profile_report(report):
+    print('===> {} clips, {:.1f} seconds in total ({} clips per hour)'.format(
+        report['num_clips'], report['total_wall'],
+        '{:.1f}'.format(report['clips_per_hour']) if report['clips_per_hour'] else '-'))
+
+    print('{:<16s} {:>6s} {:>7s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s} {:>6s}'.format(
+        'stage', 'count', 'share', 'mean', 'cpu', 'p50', 'p90', 'p99', 'max', 'calls'))
+    for name, stage in report['stages'].items():
+        print('{:<16s} {:>6d} {:>6.1f}% {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>6.0f}'.format(
+            name, stage['count'], stage['share'] * 100, stage['mean_wall'], stage['mean_cpu'],
+            stage['p50_wall'], stage['p90_wall'], stage['p99_wall'], stage['max_wall'], stage['mean_calls']))
+
+    print('===> slowest clips:')
+    for clip in report['slowest_clips']:
+        print('    {:9.3f}s  {} (slowest stage: {}, {:.3f}s)'.format(
+            clip['wall'], clip['clip'], clip['slowest_stage'], clip['stage_wall'] or 0))
+
+    if report['memory_mb']:
+        print('===> memory (MB): first clip {first:.0f}, last clip {last:.0f}, max {max:.0f}'.format(
+            **report['memory_mb']))
+
+
+def save_profile_report(report, report_filename):
+    fp = open(report_filename, 'w')
+    json.dump(report, fp, indent=2)
+    fp.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize the stage profile logs of the batch converters.')
+    parser.add_argument('log_filenames', nargs='+', help='JSON-lines logs, or glob patterns')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest clips')
+    parser.add_argument('-o', '--output', default=None, help='save the report into a .json file')
+    args = parser.parse_args()
+
+    report = summarize_profile(args.log_filenames, args.top)
+    print_profile_report(report)
+    if args.output:
+        save_profile_report(report, args.output)